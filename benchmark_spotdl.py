@@ -0,0 +1,79 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "spotspot"))
+
+from services.config_service import ConfigService
+from services.download_progress import DownloadProgress
+from services.spotdl_worker import SpotdlWorkerPool
+
+
+def run_subprocess_job(url, cwd):
+    progress = DownloadProgress({"type": "track"})
+    proc = subprocess.Popen(["spotdl", "--output", ".", url], cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    for line in proc.stdout:
+        progress.handle_line(line)
+    return proc.wait(), progress
+
+
+def run_inprocess_job(pool, url, cwd):
+    progress = DownloadProgress({"type": "track"})
+    worker = pool.acquire()
+    try:
+        for line in worker.start_job([url], cwd, None).stdout:
+            progress.handle_line(line)
+        return worker.wait(), progress
+    finally:
+        pool.release(worker)
+
+
+def benchmark(mode, urls, runs, job_runner):
+    latencies = []
+    for run_number in range(runs):
+        for url in urls:
+            # Fresh folder per job so nothing is skipped as already downloaded
+            with tempfile.TemporaryDirectory() as cwd:
+                started = time.perf_counter()
+                returncode, progress = job_runner(url, cwd)
+                elapsed = time.perf_counter() - started
+            tracks = max(1, progress.completed)
+            latencies.append(elapsed / tracks)
+            print(f"{mode:<10} run {run_number + 1} exit {returncode} {tracks} track(s) {elapsed:.2f}s ({elapsed / tracks:.2f}s per track) {url}")
+    return latencies
+
+
+def print_summary(mode, latencies):
+    if not latencies:
+        return
+    print(f"{mode:<10} per track: mean {statistics.mean(latencies):.2f}s, median {statistics.median(latencies):.2f}s, min {min(latencies):.2f}s, max {max(latencies):.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-track latency of the spotDL subprocess and inprocess modes")
+    parser.add_argument("urls", nargs="+", help="Spotify track URLs to download")
+    parser.add_argument("--runs", type=int, default=3, help="Times each URL is downloaded per mode")
+    args = parser.parse_args()
+
+    config = ConfigService().replace(spotdl_worker_processes=1)
+
+    subprocess_latencies = benchmark("subprocess", args.urls, args.runs, run_subprocess_job)
+
+    pool_started = time.perf_counter()
+    pool = SpotdlWorkerPool(config)
+    # The first job pays the worker's import and Spotify auth, report it apart from the warm runs
+    warmup_latencies = benchmark("warmup", args.urls[:1], 1, lambda url, cwd: run_inprocess_job(pool, url, cwd))
+    print(f"Worker start plus first job: {time.perf_counter() - pool_started:.2f}s")
+    inprocess_latencies = benchmark("inprocess", args.urls, args.runs, lambda url, cwd: run_inprocess_job(pool, url, cwd))
+
+    print_summary("subprocess", subprocess_latencies)
+    print_summary("warmup", warmup_latencies)
+    print_summary("inprocess", inprocess_latencies)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import os
+import time
+import shutil
+import logging
+import threading
+from services import metrics
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+
+class AdmissionController:
+    def __init__(self, config, socketio):
+        self.config = config
+        self.socketio = socketio
+        self.lock = threading.Lock()
+        self.sample_lock = threading.Lock()
+        self.pause_reason = None
+        self.last_sample = None
+        self.throughput = 0.0
+        metrics.registry.gauge("spotspot_downloads_paused", "1 while new downloads wait for disk space or bandwidth", (), lambda: {(): int(self.pause_reason is not None)})
+
+    def get_free_bytes(self, path):
+        # A folder that does not exist yet lives on the volume of its closest existing parent
+        path = os.path.abspath(path)
+        while not os.path.exists(path) and os.path.dirname(path) != path:
+            path = os.path.dirname(path)
+        return shutil.disk_usage(path).free
+
+    def _read_received_bytes(self):
+        try:
+            with open("/proc/net/dev") as net_dev:
+                interface_lines = net_dev.readlines()[2:]
+        except OSError:
+            return None
+        received = 0
+        for line in interface_lines:
+            interface, counters = line.split(":", 1)
+            if interface.strip() != "lo":
+                received += int(counters.split()[0])
+        return received
+
+    def get_throughput(self):
+        # Bytes per second received by all interfaces since the previous sample, checks less than a second apart share a rate
+        with self.sample_lock:
+            now = time.monotonic()
+            if self.last_sample is not None and now - self.last_sample[0] < 1:
+                return self.throughput
+            received = self._read_received_bytes()
+            if received is None:
+                return None
+            last_sample = self.last_sample
+            self.last_sample = (now, received)
+            if last_sample is None:
+                # The first sample has nothing to compare with, the next check measures
+                return None
+            self.throughput = max(0, received - last_sample[1]) / (now - last_sample[0])
+            return self.throughput
+
+    def get_pause_reason(self, path):
+        if self.config.min_free_disk_mb:
+            free_mb = self.get_free_bytes(path) / 1024**2
+            if free_mb < self.config.min_free_disk_mb:
+                return f"Low disk space, {free_mb:.0f} MB free of {self.config.min_free_disk_mb} MB required"
+        if self.config.max_download_mbps:
+            throughput = self.get_throughput()
+            if throughput is not None and throughput / 1024**2 > self.config.max_download_mbps:
+                return f"Network busy, {throughput / 1024**2:.1f} MB/s of {self.config.max_download_mbps:g} MB/s allowed"
+        return None
+
+    def check_admission(self, path):
+        # Never blocks, a job that is not admitted goes back to the queue and is checked again later
+        try:
+            pause_reason = self.get_pause_reason(path)
+        except OSError as e:
+            logging.error(f"Admission check failed for {path}: {e}")
+            pause_reason = None
+        self._set_pause_reason(pause_reason)
+        return pause_reason is None
+
+    def _set_pause_reason(self, pause_reason):
+        with self.lock:
+            if pause_reason == self.pause_reason:
+                return
+            self.pause_reason = pause_reason
+        if pause_reason:
+            logging.warning(f"Downloads paused: {pause_reason}")
+        else:
+            logging.info("Downloads resumed")
+        self.socketio.emit("admission_status", self.get_status())
+
+    def get_status(self):
+        return {"paused": self.pause_reason is not None, "reason": self.pause_reason}
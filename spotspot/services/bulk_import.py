@@ -0,0 +1,156 @@
+import io
+import os
+import re
+import csv
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from services.library_index import parse_spotify_url
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+spotify_uri_pattern = re.compile(r"^spotify:(?P<type>track|album|playlist|artist):(?P<id>[A-Za-z0-9]{22})$")
+spotify_id_pattern = re.compile(r"^[A-Za-z0-9]{22}$")
+url_columns = ("url", "spotify url", "spotify_url", "uri", "spotify uri", "track uri", "track url")
+title_columns = ("title", "track name", "track", "name", "song")
+artist_columns = ("artist", "artist name(s)", "artist name", "artists")
+
+
+def parse_spotify_item(value):
+    value = value.strip()
+    uri_match = spotify_uri_pattern.match(value)
+    if uri_match:
+        return uri_match.group("type"), uri_match.group("id")
+    item_type, item_id = parse_spotify_url(value)
+    if item_id and spotify_id_pattern.match(item_id):
+        return item_type, item_id
+    return None, None
+
+
+def parse_entry(value):
+    # A Spotify link or URI, anything else is searched as "artist - title"
+    value = value.strip()
+    if not value:
+        return None
+    item_type, item_id = parse_spotify_item(value)
+    if item_id:
+        return {"type": item_type, "id": item_id, "source": value}
+    if "open.spotify.com" in value or value.startswith("spotify:"):
+        return {"invalid": value}
+    return {"query": " ".join(value.replace(" - ", " ").split()), "source": value}
+
+
+def parse_csv(text):
+    reader = csv.DictReader(io.StringIO(text))
+    columns = {(name or "").strip().lower(): name for name in reader.fieldnames or []}
+    url_column = next((columns[name] for name in url_columns if name in columns), None)
+    title_column = next((columns[name] for name in title_columns if name in columns), None)
+    artist_column = next((columns[name] for name in artist_columns if name in columns), None)
+    entries = []
+    for row in reader:
+        if url_column and (row.get(url_column) or "").strip():
+            entries.append(parse_entry(row[url_column]))
+        elif title_column and (row.get(title_column) or "").strip():
+            # Exportify style lists several artists separated by commas, the first one is enough to search
+            artist = (row.get(artist_column) or "").split(",")[0].strip() if artist_column else ""
+            entries.append(parse_entry(f"{artist} - {row[title_column]}" if artist else row[title_column]))
+    return [entry for entry in entries if entry]
+
+
+def parse_lines(text):
+    # Plain lists and M3U files, an #EXTINF title is searched when the entry itself is a local file path
+    entries = []
+    extinf_title = None
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line == "#EXTM3U":
+            continue
+        if line.startswith("#EXTINF:"):
+            extinf_title = line.split(",", 1)[1].strip() if "," in line else None
+            continue
+        if line.startswith("#"):
+            continue
+        is_spotify_link = "open.spotify.com" in line or line.startswith("spotify:")
+        if not is_spotify_link and (extinf_title or "/" in line or "\\" in line):
+            line = extinf_title or os.path.splitext(re.split(r"[\\/]", line)[-1])[0]
+        extinf_title = None
+        entries.append(parse_entry(line))
+    return [entry for entry in entries if entry]
+
+
+def parse_bulk_text(text, file_name=None):
+    text = text.lstrip("\ufeff")
+    first_line = text.split("\n", 1)[0].lower()
+    if (file_name or "").lower().endswith(".csv") or any(f'"{name}"' in first_line or first_line.startswith(f"{name},") for name in url_columns + title_columns):
+        return parse_csv(text)
+    return parse_lines(text)
+
+
+class BulkImporter:
+    def __init__(self, config, spotify_service, download_service):
+        self.config = config
+        self.spotify_service = spotify_service
+        self.download_service = download_service
+
+    def import_text(self, text, file_name=None, requester=None, priority=None):
+        return self.import_entries(parse_bulk_text(text, file_name), requester, priority)
+
+    def import_values(self, values, requester=None, priority=None):
+        return self.import_entries([entry for entry in (parse_entry(str(value)) for value in values) if entry], requester, priority)
+
+    def import_entries(self, entries, requester=None, priority=None):
+        invalid = [entry["invalid"] for entry in entries if "invalid" in entry]
+        entries = [entry for entry in entries if "invalid" not in entry]
+        skipped = entries[self.config.bulk_import_limit :]
+        entries = entries[: self.config.bulk_import_limit]
+        logging.info(f"Bulk download requested: {len(entries)} entries, {len(invalid)} invalid, {len(skipped)} over the limit")
+
+        resolved_items, unresolved = self._resolve(entries)
+        for item in resolved_items:
+            item["priority"] = priority
+        jobs = self.download_service.add_items_to_queue(resolved_items, requester)
+        # Repeated entries and ones joining a running download share a job
+        distinct_jobs = list({job["id"]: job for job in jobs}.values())
+        already_downloaded = sum(1 for job in distinct_jobs if job["status"] == "Already Downloaded")
+        return {
+            "requested": len(entries) + len(invalid) + len(skipped),
+            "queued": len(distinct_jobs) - already_downloaded,
+            "already_downloaded": already_downloaded,
+            "unresolved": unresolved,
+            "invalid": invalid,
+            "over_limit": len(skipped),
+        }
+
+    def _resolve(self, entries):
+        # Links are checked with the several-items endpoints, text lines need one search each
+        ids_by_type = {}
+        for entry in entries:
+            if "id" in entry:
+                ids_by_type.setdefault(entry["type"], []).append(entry["id"])
+        items_by_type = {}
+        for item_type, item_ids in ids_by_type.items():
+            try:
+                items_by_type[item_type] = self.spotify_service.get_items(item_type, list(dict.fromkeys(item_ids)))
+            except Exception as e:
+                logging.error(f"Bulk {item_type} lookup failed: {e}")
+                items_by_type[item_type] = {}
+
+        queries = list(dict.fromkeys(entry["query"] for entry in entries if "query" in entry))
+        with ThreadPoolExecutor(max_workers=self.config.search_workers, thread_name_prefix="bulk-search") as executor:
+            found_tracks = dict(zip(queries, executor.map(self._find_track, queries)))
+
+        resolved_items = []
+        unresolved = []
+        for entry in entries:
+            item = items_by_type.get(entry.get("type"), {}).get(entry.get("id")) if "id" in entry else found_tracks.get(entry["query"])
+            if item is None:
+                unresolved.append(entry["source"])
+            else:
+                resolved_items.append(dict(item))
+        return resolved_items, unresolved
+
+    def _find_track(self, query):
+        try:
+            return self.spotify_service.find_track(query)
+        except Exception as e:
+            logging.error(f"Bulk search for '{query}' failed: {e}")
+            return None
@@ -1,307 +1,572 @@
 import os
+import copy
 import json
+import time
+import socket
+import hashlib
 import logging
 import platform
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
+# The container environment as it was at startup, the env file is layered over it on every load
+startup_environment = dict(os.environ)
+
 
 class ConfigService:
     def __init__(self):
+        self.load()
+
+    def __setattr__(self, name, value):
+        # Settings are shared by every service and thread, they only change through reload()
+        if self.__dict__.get("frozen"):
+            raise AttributeError(f"Config is read-only, use replace() or reload() to change {name}")
+        super().__setattr__(name, value)
+
+    def load(self):
+        load_started = time.perf_counter()
+        self.__dict__["frozen"] = False
         self.get_vars()
         self.get_spotdl_vars()
+        self.spotdl_config_hash = hashlib.sha256(json.dumps(self.spotdl_config, indent=4).encode("utf-8")).hexdigest()
+        self.load_seconds = time.perf_counter() - load_started
+        self.frozen = True
+        logging.info(self.get_summary())
         self.create_config_file()
 
+    def get_summary(self):
+        return (
+            f"Config loaded in {self.load_seconds * 1000:.1f} ms: "
+            f"output={self.track_output}, format={self.format}, spotdl_mode={self.spotdl_mode}, "
+            f"downloads={self.max_concurrent_downloads} (track {self.max_track_downloads}, album {self.max_album_downloads}, playlist {self.max_playlist_downloads}), "
+            f"jellyfin={self.trigger_jellyfin_scan}, plex={self.trigger_plex_scan}, m3u={self.generate_m3u_playlist}, "
+            f"database={self.database_path}, spotdl_config={self.spotdl_config_hash[:12]}"
+        )
+
+    def replace(self, **changes):
+        # A shallow copy shares every unchanged value, the original stays untouched
+        config_copy = copy.copy(self)
+        config_copy.__dict__.update(changes)
+        return config_copy
+
+    def reload(self):
+        fresh_config = ConfigService.__new__(ConfigService)
+        fresh_config.load()
+        changed_settings = sorted(name for name, value in fresh_config.__dict__.items() if name not in ("load_seconds", "environment") and self.__dict__.get(name) != value)
+        # Services hold on to this instance, so the new values are swapped into it
+        self.__dict__.update(fresh_config.__dict__)
+        logging.info(f"Config reloaded, changed settings: {', '.join(changed_settings) or 'none'}")
+        return changed_settings
+
+    def getenv(self, key, default=None):
+        return self.environment.get(key, default)
+
+    def _load_env_file(self, env_file_path):
+        # KEY=VALUE lines that override the container environment, re-read on every reload
+        env_values = {}
+        try:
+            with open(env_file_path, "r", encoding="utf-8") as env_file:
+                for line in env_file:
+                    line = line.strip()
+                    if not line or line.startswith("#") or "=" not in line:
+                        continue
+                    key, value = line.split("=", 1)
+                    env_values[key.strip()] = value.strip().strip('"').strip("'")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.error(f"Failed to read config env file {env_file_path}: {e}")
+        return env_values
+
     def get_vars(self):
-        logging.info("Loading Environmental Variables...")
+        logging.debug("Loading Environmental Variables...")
 
         os_system = platform.system()
-        logging.info(f"OS: {os_system}")
+        logging.debug(f"OS: {os_system}")
+
+        self.environment = startup_environment
+        self.config_env_file = self.getenv("CONFIG_ENV_FILE", "D:\\spotspot.env" if os_system == "Windows" else "/config/spotspot.env")
+        # A key removed from the file falls back to the container environment, os.environ itself is never changed
+        self.environment = {**startup_environment, **self._load_env_file(self.config_env_file)}
+        logging.debug(f"Config Env File: {self.config_env_file}")
 
         self.config_path = "D:\\config.json" if os_system == "Windows" else "/home/appuser/.spotdl/config.json"
-        logging.info(f"Config file path: {self.config_path}")
+        logging.debug(f"Config file path: {self.config_path}")
 
         self.ffmpeg_location = "D:\\" if os_system == "Windows" else "/usr/bin/ffmpeg"
-        logging.info(f"FFmpeg location set to: {self.ffmpeg_location}")
+        logging.debug(f"FFmpeg location set to: {self.ffmpeg_location}")
+
+        self.track_output = self.getenv("TRACK_OUTPUT", "/data/media/music/singles/{artist} - {title}.{output-ext}")
+        logging.debug(f"Track Output: {self.track_output}")
+
+        self.album_output = self.getenv("ALBUM_OUTPUT", "/data/media/music/{artist}/{album} - ({year})/{artist} - {title}.{output-ext}")
+        logging.debug(f"Album Output: {self.album_output}")
 
-        self.track_output = os.getenv("TRACK_OUTPUT", "/data/media/music/singles/{artist} - {title}.{output-ext}")
-        logging.info(f"Track Output: {self.track_output}")
+        self.playlist_output = self.getenv("PLAYLIST_OUTPUT", "/data/media/music/{list-name}/{artist} - {title}.{output-ext}")
+        logging.debug(f"Playlist Output: {self.playlist_output}")
 
-        self.album_output = os.getenv("ALBUM_OUTPUT", "/data/media/music/{artist}/{album} - ({year})/{artist} - {title}.{output-ext}")
-        logging.info(f"Album Output: {self.album_output}")
+        self.artist_output = self.getenv("ARTIST_OUTPUT", "/data/media/music/{artist}/{album} - ({year})/{artist} - {title}.{output-ext}")
+        logging.debug(f"Artist Output: {self.artist_output}")
 
-        self.playlist_output = os.getenv("PLAYLIST_OUTPUT", "/data/media/music/{list-name}/{artist} - {title}.{output-ext}")
-        logging.info(f"Playlist Output: {self.playlist_output}")
+        self.trigger_jellyfin_scan = self.getenv("TRIGGER_JELLYFIN_SCAN", "True")
+        logging.debug(f"Trigger Jellyfin Scan: {self.trigger_jellyfin_scan}")
 
-        self.artist_output = os.getenv("ARTIST_OUTPUT", "/data/media/music/{artist}/{album} - ({year})/{artist} - {title}.{output-ext}")
-        logging.info(f"Artist Output: {self.artist_output}")
+        self.trigger_plex_scan = self.getenv("TRIGGER_PLEX_SCAN", "True")
+        logging.debug(f"Trigger Plex Scan: {self.trigger_plex_scan}")
 
-        self.trigger_jellyfin_scan = os.getenv("TRIGGER_JELLYFIN_SCAN", "True")
-        logging.info(f"Trigger Jellyfin Scan: {self.trigger_jellyfin_scan}")
+        self.jellyfin_address = self.getenv("JELLYFIN_ADDRESS", "http://192.168.1.123:8096")
+        logging.debug(f"Jellyfin Address: {self.jellyfin_address}")
 
-        self.trigger_plex_scan = os.getenv("TRIGGER_PLEX_SCAN", "True")
-        logging.info(f"Trigger Plex Scan: {self.trigger_plex_scan}")
+        self.jellyfin_api_key = self.getenv("JELLYFIN_API_KEY", "")
+        logging.debug(f"Jellyfin API Key entered: {self.jellyfin_api_key != ''}")
 
-        self.jellyfin_address = os.getenv("JELLYFIN_ADDRESS", "http://192.168.1.123:8096")
-        logging.info(f"Jellyfin Address: {self.jellyfin_address}")
+        self.plex_address = self.getenv("PLEX_ADDRESS", "http://192.168.1.123:32400")
+        logging.debug(f"Plex Address: {self.plex_address}")
 
-        self.jellyfin_api_key = os.getenv("JELLYFIN_API_KEY", "")
-        logging.info(f"Jellyfin API Key entered: {self.jellyfin_api_key != ''}")
+        self.plex_token = self.getenv("PLEX_TOKEN", "")
+        logging.debug(f"Plex Token entered: {self.plex_token != ''}")
 
-        self.plex_address = os.getenv("PLEX_ADDRESS", "http://192.168.1.123:32400")
-        logging.info(f"Plex Address: {self.plex_address}")
+        self.plex_library_section_id = int(self.getenv("PLEX_LIBRARY_SECTION_ID", "1"))
+        logging.debug(f"Plex Library Section ID: {self.plex_library_section_id}")
 
-        self.plex_token = os.getenv("PLEX_TOKEN", "")
-        logging.info(f"Plex Token entered: {self.plex_token != ''}")
+        self.plex_library_name = self.getenv("PLEX_LIBRARY_NAME", "Music")
+        logging.debug(f"Plex Library Name: {self.plex_library_name}")
 
-        self.plex_library_section_id = int(os.getenv("PLEX_LIBRARY_SECTION_ID", "1"))
-        logging.info(f"Plex Library Section ID: {self.plex_library_section_id}")
+        self.plex_playlist_import_delay = float(self.getenv("PLEX_PLAYLIST_IMPORT_DELAY", "180"))
+        logging.debug(f"Plex Playlist Import Delay: {self.plex_playlist_import_delay}")
 
-        self.plex_library_name = os.getenv("PLEX_LIBRARY_NAME", "Music")
-        logging.info(f"Plex Library Name: {self.plex_library_name}")
+        self.media_refresh_quiet_window = float(self.getenv("MEDIA_REFRESH_QUIET_WINDOW", "30"))
+        logging.debug(f"Media Refresh Quiet Window: {self.media_refresh_quiet_window}")
 
-        self.plex_playlist_import_delay = float(os.getenv("PLEX_PLAYLIST_IMPORT_DELAY", "180"))
-        logging.info(f"Plex Playlist Import Delay: {self.plex_playlist_import_delay}")
+        self.media_refresh_max_wait = float(self.getenv("MEDIA_REFRESH_MAX_WAIT", "300"))
+        logging.debug(f"Media Refresh Max Wait: {self.media_refresh_max_wait}")
 
-        self.generate_m3u_playlist = os.getenv("GENERATE_M3U_PLAYLIST", "True")
-        logging.info(f"Generate M3U Playlist: {self.generate_m3u_playlist}")
+        self.media_refresh_retries = int(self.getenv("MEDIA_REFRESH_RETRIES", "3"))
+        logging.debug(f"Media Refresh Retries: {self.media_refresh_retries}")
 
-        self.m3u_playlist_name = os.getenv("M3U_PLAYLIST_NAME", "spotify_singles")
-        logging.info(f"Playlist Name: {self.m3u_playlist_name}")
+        self.media_refresh_backoff = float(self.getenv("MEDIA_REFRESH_BACKOFF", "2"))
+        logging.debug(f"Media Refresh Backoff: {self.media_refresh_backoff}")
 
-        self.m3u_playlist_path = os.getenv("M3U_PLAYLIST_PATH", "/data/media/music/playlists")
-        logging.info(f"Playlist Path: {self.m3u_playlist_path}")
+        self.generate_m3u_playlist = self.getenv("GENERATE_M3U_PLAYLIST", "True")
+        logging.debug(f"Generate M3U Playlist: {self.generate_m3u_playlist}")
 
-        self.m3u_playlist_sort_order = os.getenv("M3U_PLAYLIST_SORT_ORDER", "date_desc")
-        logging.info(f"Playlist Sort Order: {self.m3u_playlist_sort_order}")
+        self.m3u_playlist_name = self.getenv("M3U_PLAYLIST_NAME", "spotify_singles")
+        logging.debug(f"Playlist Name: {self.m3u_playlist_name}")
 
-        self.absolute_server_path = os.getenv("ABSOLUTE_SERVER_PATH", "/data/media/music/singles")
-        logging.info(f"Absolute Server Path: {self.absolute_server_path}")
+        self.m3u_playlist_path = self.getenv("M3U_PLAYLIST_PATH", "/data/media/music/playlists")
+        logging.debug(f"Playlist Path: {self.m3u_playlist_path}")
+
+        self.m3u_playlist_sort_order = self.getenv("M3U_PLAYLIST_SORT_ORDER", "date_desc")
+        logging.debug(f"Playlist Sort Order: {self.m3u_playlist_sort_order}")
+
+        self.absolute_server_path = self.getenv("ABSOLUTE_SERVER_PATH", "/data/media/music/singles")
+        logging.debug(f"Absolute Server Path: {self.absolute_server_path}")
+
+        self.playlist_index_path = self.getenv("PLAYLIST_INDEX_PATH", "D:\\playlist_index.json" if os_system == "Windows" else "/config/playlist_index.json")
+        logging.debug(f"Playlist Index Path: {self.playlist_index_path}")
+
+        self.library_index_path = self.getenv("LIBRARY_INDEX_PATH", "D:\\library_index.db" if os_system == "Windows" else "/config/library_index.db")
+        logging.debug(f"Library Index Path: {self.library_index_path}")
+
+        self.library_scan_interval = float(self.getenv("LIBRARY_SCAN_INTERVAL", "3600"))
+        logging.debug(f"Library Scan Interval: {self.library_scan_interval}")
+
+        self.skip_existing_tracks = self.getenv("SKIP_EXISTING_TRACKS", "True").lower() == "true"
+        logging.debug(f"Skip Existing Tracks: {self.skip_existing_tracks}")
 
         self.supported_formats = {".mp3", ".flac", ".wav", ".aac", ".ogg", ".m4a", ".opus"}
-        logging.info(f"Supported Formats: {self.supported_formats}")
+        logging.debug(f"Supported Formats: {self.supported_formats}")
+
+        self.extra_logging = self.getenv("EXTRA_LOGGING", "False")
+        logging.debug(f"Extra Logging: {self.extra_logging}")
+
+        self.search_limit = int(self.getenv("SEARCH_LIMIT", "10"))
+        logging.debug(f"Spotify Search Limit: {self.search_limit}")
+
+        self.search_cache_size = int(self.getenv("SEARCH_CACHE_SIZE", "256"))
+        logging.debug(f"Search Cache Size: {self.search_cache_size}")
+
+        self.search_cache_ttl = float(self.getenv("SEARCH_CACHE_TTL", "600"))
+        logging.debug(f"Search Cache TTL: {self.search_cache_ttl}")
+
+        self.spotify_pool_size = max(1, int(self.getenv("SPOTIFY_POOL_SIZE", "10")))
+        logging.debug(f"Spotify Connection Pool Size: {self.spotify_pool_size}")
+
+        self.search_workers = max(1, int(self.getenv("SEARCH_WORKERS", "4")))
+        logging.debug(f"Search Workers: {self.search_workers}")
+
+        self.search_timeout = float(self.getenv("SEARCH_TIMEOUT", "10"))
+        logging.debug(f"Search Timeout: {self.search_timeout}")
+
+        self.search_prefetch = self.getenv("SEARCH_PREFETCH", "True").lower() == "true"
+        logging.debug(f"Search Prefetch: {self.search_prefetch}")
+
+        self.suggest_index_path = self.getenv("SUGGEST_INDEX_PATH", "D:\\suggest_index.db" if os_system == "Windows" else "/config/suggest_index.db")
+        logging.debug(f"Suggest Index Path: {self.suggest_index_path}")
+
+        self.suggest_index_size = max(1, int(self.getenv("SUGGEST_INDEX_SIZE", "20000")))
+        logging.debug(f"Suggest Index Size: {self.suggest_index_size}")
+
+        self.suggest_min_results = max(0, int(self.getenv("SUGGEST_MIN_RESULTS", "3")))
+        logging.debug(f"Suggest Min Results: {self.suggest_min_results}")
+
+        self.suggest_min_query_length = max(1, int(self.getenv("SUGGEST_MIN_QUERY_LENGTH", "3")))
+        logging.debug(f"Suggest Min Query Length: {self.suggest_min_query_length}")
+
+        self.image_cache_path = self.getenv("IMAGE_CACHE_PATH", "D:\\image_cache" if os_system == "Windows" else "/config/image_cache")
+        logging.debug(f"Image Cache Path: {self.image_cache_path}")
+
+        self.image_cache_size_mb = max(1, int(self.getenv("IMAGE_CACHE_SIZE_MB", "200")))
+        logging.debug(f"Image Cache Size MB: {self.image_cache_size_mb}")
+
+        self.image_cdn_url = self.getenv("IMAGE_CDN_URL", "https://i.scdn.co/image/")
+        logging.debug(f"Image CDN URL: {self.image_cdn_url}")
+
+        self.thumbnail_size = max(1, int(self.getenv("THUMBNAIL_SIZE", "300")))
+        logging.debug(f"Thumbnail Size: {self.thumbnail_size}")
+
+        self.image_pool_size = max(1, int(self.getenv("IMAGE_POOL_SIZE", "8")))
+        logging.debug(f"Image Pool Size: {self.image_pool_size}")
+
+        self.image_fetch_timeout = float(self.getenv("IMAGE_FETCH_TIMEOUT", "10"))
+        logging.debug(f"Image Fetch Timeout: {self.image_fetch_timeout}")
+
+        self.bulk_import_limit = max(1, int(self.getenv("BULK_IMPORT_LIMIT", "5000")))
+        logging.debug(f"Bulk Import Limit: {self.bulk_import_limit}")
+
+        self.max_concurrent_downloads = max(1, int(self.getenv("MAX_CONCURRENT_DOWNLOADS", "3")))
+        logging.debug(f"Max Concurrent Downloads: {self.max_concurrent_downloads}")
+
+        self.max_track_downloads = max(1, int(self.getenv("MAX_TRACK_DOWNLOADS", "3")))
+        logging.debug(f"Max Track Downloads: {self.max_track_downloads}")
+
+        self.max_album_downloads = max(1, int(self.getenv("MAX_ALBUM_DOWNLOADS", "1")))
+        logging.debug(f"Max Album/Artist Downloads: {self.max_album_downloads}")
+
+        self.max_playlist_downloads = max(1, int(self.getenv("MAX_PLAYLIST_DOWNLOADS", "1")))
+        logging.debug(f"Max Playlist Downloads: {self.max_playlist_downloads}")
+
+        self.track_priority = int(self.getenv("TRACK_PRIORITY", "1"))
+        logging.debug(f"Track Priority: {self.track_priority}")
+
+        self.collection_priority = int(self.getenv("COLLECTION_PRIORITY", "0"))
+        logging.debug(f"Collection Priority: {self.collection_priority}")
+
+        self.scheduler_aging_seconds = max(1, float(self.getenv("SCHEDULER_AGING_SECONDS", "300")))
+        logging.debug(f"Scheduler Aging Seconds: {self.scheduler_aging_seconds}")
+
+        self.scheduler_wait_samples = max(1, int(self.getenv("SCHEDULER_WAIT_SAMPLES", "1000")))
+        logging.debug(f"Scheduler Wait Samples: {self.scheduler_wait_samples}")
+
+        self.cancel_grace_period = float(self.getenv("CANCEL_GRACE_PERIOD", "5"))
+        logging.debug(f"Cancel Grace Period: {self.cancel_grace_period}")
+
+        # TRACK_RETRIES is the older name from when only tracks of collections were retried
+        self.download_retries = max(0, int(self.getenv("DOWNLOAD_RETRIES", self.getenv("TRACK_RETRIES", "3"))))
+        logging.debug(f"Download Retries: {self.download_retries}")
+
+        self.retry_base_delay = max(1.0, float(self.getenv("RETRY_BASE_DELAY", "30")))
+        logging.debug(f"Retry Base Delay: {self.retry_base_delay}")
+
+        self.retry_max_delay = max(self.retry_base_delay, float(self.getenv("RETRY_MAX_DELAY", "1800")))
+        logging.debug(f"Retry Max Delay: {self.retry_max_delay}")
+
+        self.rate_limit_cooldown = max(1.0, float(self.getenv("RATE_LIMIT_COOLDOWN", "300")))
+        logging.debug(f"Rate Limit Cooldown: {self.rate_limit_cooldown}")
+
+        self.min_free_disk_mb = max(0, int(self.getenv("MIN_FREE_DISK_MB", "1024")))
+        logging.debug(f"Min Free Disk MB: {self.min_free_disk_mb}")
+
+        self.max_download_mbps = max(0.0, float(self.getenv("MAX_DOWNLOAD_MBPS", "0")))
+        logging.debug(f"Max Download MB/s: {self.max_download_mbps}")
+
+        self.admission_check_interval = max(1.0, float(self.getenv("ADMISSION_CHECK_INTERVAL", "15")))
+        logging.debug(f"Admission Check Interval: {self.admission_check_interval}")
+
+        self.spotdl_mode = self.getenv("SPOTDL_MODE", "subprocess").lower()
+        logging.debug(f"SpotDL Mode: {self.spotdl_mode}")
+
+        self.spotdl_worker_processes = max(1, int(self.getenv("SPOTDL_WORKER_PROCESSES", str(self.max_concurrent_downloads))))
+        logging.debug(f"SpotDL Worker Processes: {self.spotdl_worker_processes}")
+
+        self.postprocess = self.getenv("POSTPROCESS", "False").lower() == "true"
+        logging.debug(f"Post-process: {self.postprocess}")
+
+        self.postprocess_workers = max(1, int(self.getenv("POSTPROCESS_WORKERS", str(os.cpu_count() or 1))))
+        logging.debug(f"Post-process Workers: {self.postprocess_workers}")
+
+        self.normalize_loudness = self.getenv("NORMALIZE_LOUDNESS", "False").lower() == "true"
+        logging.debug(f"Normalize Loudness: {self.normalize_loudness}")
+
+        self.loudness_target = float(self.getenv("LOUDNESS_TARGET", "-14"))
+        logging.debug(f"Loudness Target: {self.loudness_target}")
+
+        self.watch_sync_interval = max(60, int(self.getenv("WATCH_SYNC_INTERVAL", "21600")))
+        logging.debug(f"Watch Sync Interval: {self.watch_sync_interval}")
+
+        self.watch_check_interval = max(1, int(self.getenv("WATCH_CHECK_INTERVAL", "60")))
+        logging.debug(f"Watch Check Interval: {self.watch_check_interval}")
+
+        self.database_path = self.getenv("DATABASE_PATH", "D:\\spotspot.db" if os_system == "Windows" else "/config/spotspot.db")
+        logging.debug(f"Database Path: {self.database_path}")
+
+        self.history_memory_limit = max(1, int(self.getenv("HISTORY_MEMORY_LIMIT", "500")))
+        logging.debug(f"History Memory Limit: {self.history_memory_limit}")
+
+        self.status_emit_interval = float(self.getenv("STATUS_EMIT_INTERVAL", "0.25"))
+        logging.debug(f"Status Emit Interval: {self.status_emit_interval}")
+
+        self.status_page_size = max(1, int(self.getenv("STATUS_PAGE_SIZE", "100")))
+        logging.debug(f"Status Page Size: {self.status_page_size}")
+
+        self.progress_emit_interval = float(self.getenv("PROGRESS_EMIT_INTERVAL", "0.5"))
+        logging.debug(f"Progress Emit Interval: {self.progress_emit_interval}")
+
+        self.spotspot_role = self.getenv("SPOTSPOT_ROLE", "all").lower()
+        logging.debug(f"SpotSpot Role: {self.spotspot_role}")
+
+        self.node_id = self.getenv("NODE_ID", socket.gethostname())
+        logging.debug(f"Node ID: {self.node_id}")
+
+        self.broker_url = self.getenv("BROKER_URL", "")
+        logging.debug(f"Broker URL: {self.broker_url}")
+
+        self.broker_path = self.getenv("BROKER_PATH", "D:\\broker.db" if os_system == "Windows" else "/config/broker.db")
+        logging.debug(f"Broker Path: {self.broker_path}")
+
+        self.broker_poll_interval = max(0.01, float(self.getenv("BROKER_POLL_INTERVAL", "0.2")))
+        logging.debug(f"Broker Poll Interval: {self.broker_poll_interval}")
+
+        self.broker_call_timeout = float(self.getenv("BROKER_CALL_TIMEOUT", "10"))
+        logging.debug(f"Broker Call Timeout: {self.broker_call_timeout}")
+
+        self.broker_event_retention = float(self.getenv("BROKER_EVENT_RETENTION", "300"))
+        logging.debug(f"Broker Event Retention: {self.broker_event_retention}")
+
+        self.broker_state_interval = max(0.1, float(self.getenv("BROKER_STATE_INTERVAL", "2")))
+        logging.debug(f"Broker State Interval: {self.broker_state_interval}")
 
-        self.extra_logging = os.getenv("EXTRA_LOGGING", "False")
-        logging.info(f"Extra Logging: {self.extra_logging}")
+        self.socketio_message_queue = self.getenv("SOCKETIO_MESSAGE_QUEUE", "")
+        logging.debug(f"Socket.IO Message Queue: {self.socketio_message_queue}")
 
-        self.search_limit = int(os.getenv("SEARCH_LIMIT", "10"))
-        logging.info(f"Spotify Search Limit: {self.search_limit}")
+        self.resume_unfinished_jobs = self.getenv("RESUME_UNFINISHED_JOBS", "True").lower() == "true"
+        logging.debug(f"Resume Unfinished Jobs: {self.resume_unfinished_jobs}")
 
     def get_spotdl_vars(self):
-        logging.info("Loading SpotDL Environmental Variables...")
+        logging.debug("Loading SpotDL Environmental Variables...")
 
-        self.client_id = os.getenv("CLIENT_ID", "5f573c9620494bae87890c0f08a60293")
-        logging.info(f"Client ID entered: {self.client_id != ''}")
+        self.client_id = self.getenv("CLIENT_ID", "5f573c9620494bae87890c0f08a60293")
+        logging.debug(f"Client ID entered: {self.client_id != ''}")
 
-        self.client_secret = os.getenv("CLIENT_SECRET", "212476d9b0f3472eaa762d90b19b0ba8")
-        logging.info(f"Client Secret entered: {self.client_secret != ''}")
+        self.client_secret = self.getenv("CLIENT_SECRET", "212476d9b0f3472eaa762d90b19b0ba8")
+        logging.debug(f"Client Secret entered: {self.client_secret != ''}")
 
-        self.auth_token = os.getenv("AUTH_TOKEN", None)
-        logging.info(f"Auth Token: {self.auth_token}")
+        self.auth_token = self.getenv("AUTH_TOKEN", None)
+        logging.debug(f"Auth Token: {self.auth_token}")
 
-        self.user_auth = os.getenv("USER_AUTH", "False").lower() == "true"
-        logging.info(f"User Auth: {self.user_auth}")
+        self.user_auth = self.getenv("USER_AUTH", "False").lower() == "true"
+        logging.debug(f"User Auth: {self.user_auth}")
 
-        self.headless = os.getenv("HEADLESS", "False").lower() == "true"
-        logging.info(f"Headless Mode: {self.headless}")
+        self.headless = self.getenv("HEADLESS", "False").lower() == "true"
+        logging.debug(f"Headless Mode: {self.headless}")
 
-        self.cache_path = os.getenv("CACHE_PATH", "/home/appuser/.spotdl/.spotipy")
-        logging.info(f"Cache Path: {self.cache_path}")
+        self.cache_path = self.getenv("CACHE_PATH", "/home/appuser/.spotdl/.spotipy")
+        logging.debug(f"Cache Path: {self.cache_path}")
 
-        self.no_cache = os.getenv("NO_CACHE", "True").lower() == "true"
-        logging.info(f"No Cache: {self.no_cache}")
+        self.no_cache = self.getenv("NO_CACHE", "True").lower() == "true"
+        logging.debug(f"No Cache: {self.no_cache}")
 
-        self.output = os.getenv("OUTPUT", "{artists} - {title}.{output-ext}")
-        logging.info(f"Output: {self.output}")
+        self.output = self.getenv("OUTPUT", "{artists} - {title}.{output-ext}")
+        logging.debug(f"Output: {self.output}")
 
-        self.format = os.getenv("FORMAT", "mp3")
-        logging.info(f"Format: {self.format}")
+        self.format = self.getenv("FORMAT", "mp3")
+        logging.debug(f"Format: {self.format}")
 
-        self.preload = os.getenv("PRELOAD", "False").lower() == "true"
-        logging.info(f"Preload: {self.preload}")
+        self.preload = self.getenv("PRELOAD", "False").lower() == "true"
+        logging.debug(f"Preload: {self.preload}")
 
-        self.port = int(os.getenv("PORT", 8800))
-        logging.info(f"Port: {self.port}")
+        self.port = int(self.getenv("PORT", 8800))
+        logging.debug(f"Port: {self.port}")
 
-        self.host = os.getenv("HOST", "localhost")
-        logging.info(f"Host: {self.host}")
+        self.host = self.getenv("HOST", "localhost")
+        logging.debug(f"Host: {self.host}")
 
-        self.keep_alive = os.getenv("KEEP_ALIVE", "False").lower() == "true"
-        logging.info(f"Keep Alive: {self.keep_alive}")
+        self.keep_alive = self.getenv("KEEP_ALIVE", "False").lower() == "true"
+        logging.debug(f"Keep Alive: {self.keep_alive}")
 
-        self.enable_tls = os.getenv("ENABLE_TLS", "False").lower() == "true"
-        logging.info(f"Enable TLS: {self.enable_tls}")
+        self.enable_tls = self.getenv("ENABLE_TLS", "False").lower() == "true"
+        logging.debug(f"Enable TLS: {self.enable_tls}")
 
-        self.proxy = os.getenv("PROXY", None)
-        logging.info(f"Proxy: {self.proxy}")
+        self.proxy = self.getenv("PROXY", None)
+        logging.debug(f"Proxy: {self.proxy}")
 
-        self.skip_explicit = os.getenv("SKIP_EXPLICIT", "False").lower() == "true"
-        logging.info(f"Skip Explicit: {self.skip_explicit}")
+        self.skip_explicit = self.getenv("SKIP_EXPLICIT", "False").lower() == "true"
+        logging.debug(f"Skip Explicit: {self.skip_explicit}")
 
-        self.log_level = os.getenv("LOG_LEVEL", "DEBUG")
-        logging.info(f"Log Level: {self.log_level}")
+        self.log_level = self.getenv("LOG_LEVEL", "DEBUG")
+        logging.debug(f"Log Level: {self.log_level}")
 
-        self.restrict_mode = os.getenv("RESTRICT_MODE", "none")
-        logging.info(f"Restrict Mode: {self.restrict_mode}")
+        self.restrict_mode = self.getenv("RESTRICT_MODE", "none")
+        logging.debug(f"Restrict Mode: {self.restrict_mode}")
 
-        self.max_retries = int(os.getenv("MAX_RETRIES", 3))
-        logging.info(f"Max Retries: {self.max_retries}")
+        self.max_retries = int(self.getenv("MAX_RETRIES", 3))
+        logging.debug(f"Max Retries: {self.max_retries}")
 
-        self.use_cache_file = os.getenv("USE_CACHE_FILE", "False").lower() == "true"
-        logging.info(f"Use Cache File: {self.use_cache_file}")
+        self.use_cache_file = self.getenv("USE_CACHE_FILE", "False").lower() == "true"
+        logging.debug(f"Use Cache File: {self.use_cache_file}")
 
-        self.audio_providers = os.getenv("AUDIO_PROVIDERS", "youtube-music").split(",")
-        logging.info(f"Audio Providers: {self.audio_providers}")
+        self.audio_providers = self.getenv("AUDIO_PROVIDERS", "youtube-music").split(",")
+        logging.debug(f"Audio Providers: {self.audio_providers}")
 
-        self.lyrics_providers = os.getenv("LYRICS_PROVIDERS", "genius,azlyrics,musixmatch").split(",")
-        logging.info(f"Lyrics Providers: {self.lyrics_providers}")
+        self.lyrics_providers = self.getenv("LYRICS_PROVIDERS", "genius,azlyrics,musixmatch").split(",")
+        logging.debug(f"Lyrics Providers: {self.lyrics_providers}")
 
-        self.genious_token = os.getenv("GENIOUS_TOKEN", "alXXDbPZtK1m2RrZ8I4k2Hn8Ahsd0Gh_o076HYvcdlBvmc0ULL1H8Z8xRlew5qaG")
-        logging.info(f"Genius Token Entered: {self.genious_token!=""}")
+        self.genious_token = self.getenv("GENIOUS_TOKEN", "alXXDbPZtK1m2RrZ8I4k2Hn8Ahsd0Gh_o076HYvcdlBvmc0ULL1H8Z8xRlew5qaG")
+        logging.debug(f"Genius Token Entered: {self.genious_token!=""}")
 
-        self.playlist_numbering = os.getenv("PLAYLIST_NUMBERING", "False").lower() == "true"
-        logging.info(f"Playlist Numbering: {self.playlist_numbering}")
+        self.playlist_numbering = self.getenv("PLAYLIST_NUMBERING", "False").lower() == "true"
+        logging.debug(f"Playlist Numbering: {self.playlist_numbering}")
 
-        self.playlist_retain_track_cover = os.getenv("PLAYLIST_RETAIN_TRACK_COVER", "False").lower() == "true"
-        logging.info(f"Playlist Retain Track Cover: {self.playlist_retain_track_cover}")
+        self.playlist_retain_track_cover = self.getenv("PLAYLIST_RETAIN_TRACK_COVER", "False").lower() == "true"
+        logging.debug(f"Playlist Retain Track Cover: {self.playlist_retain_track_cover}")
 
-        self.scan_for_songs = os.getenv("SCAN_FOR_SONGS", "False").lower() == "true"
-        logging.info(f"Scan for Songs: {self.scan_for_songs}")
+        self.scan_for_songs = self.getenv("SCAN_FOR_SONGS", "False").lower() == "true"
+        logging.debug(f"Scan for Songs: {self.scan_for_songs}")
 
-        self.m3u = os.getenv("M3U", None)
-        logging.info(f"M3U: {self.m3u}")
+        self.m3u = self.getenv("M3U", None)
+        logging.debug(f"M3U: {self.m3u}")
 
-        self.overwrite = os.getenv("OVERWRITE", "skip")
-        logging.info(f"Overwrite: {self.overwrite}")
+        self.overwrite = self.getenv("OVERWRITE", "skip")
+        logging.debug(f"Overwrite: {self.overwrite}")
 
-        self.search_query = os.getenv("SEARCH_QUERY", None)
-        logging.info(f"Search Query: {self.search_query}")
+        self.search_query = self.getenv("SEARCH_QUERY", None)
+        logging.debug(f"Search Query: {self.search_query}")
 
-        self.ffmpeg = os.getenv("FFMPEG", "ffmpeg")
-        logging.info(f"FFmpeg: {self.ffmpeg}")
+        self.ffmpeg = self.getenv("FFMPEG", "ffmpeg")
+        logging.debug(f"FFmpeg: {self.ffmpeg}")
 
-        self.bitrate = os.getenv("BITRATE", None)
-        logging.info(f"Bitrate: {self.bitrate}")
+        self.bitrate = self.getenv("BITRATE", None)
+        logging.debug(f"Bitrate: {self.bitrate}")
 
-        self.ffmpeg_args = os.getenv("FFMPEG_ARGS", None)
-        logging.info(f"FFmpeg Args: {self.ffmpeg_args}")
+        self.ffmpeg_args = self.getenv("FFMPEG_ARGS", None)
+        logging.debug(f"FFmpeg Args: {self.ffmpeg_args}")
 
-        self.save_file = os.getenv("SAVE_FILE", None)
-        logging.info(f"Save File: {self.save_file}")
+        self.save_file = self.getenv("SAVE_FILE", None)
+        logging.debug(f"Save File: {self.save_file}")
 
-        self.filter_results = os.getenv("FILTER_RESULTS", "True").lower() == "true"
-        logging.info(f"Filter Results: {self.filter_results}")
+        self.filter_results = self.getenv("FILTER_RESULTS", "True").lower() == "true"
+        logging.debug(f"Filter Results: {self.filter_results}")
 
-        self.threads = int(os.getenv("THREADS", 4))
-        logging.info(f"Threads: {self.threads}")
+        self.threads = int(self.getenv("THREADS", 4))
+        logging.debug(f"Threads: {self.threads}")
 
-        self.cookie_file = os.getenv("COOKIE_FILE", None)
-        logging.info(f"Cookie File: {self.cookie_file}")
+        self.cookie_file = self.getenv("COOKIE_FILE", None)
+        logging.debug(f"Cookie File: {self.cookie_file}")
 
-        self.print_errors = os.getenv("PRINT_ERRORS", "False").lower() == "true"
-        logging.info(f"Print Errors: {self.print_errors}")
+        self.print_errors = self.getenv("PRINT_ERRORS", "False").lower() == "true"
+        logging.debug(f"Print Errors: {self.print_errors}")
 
-        self.sponsor_block = os.getenv("SPONSOR_BLOCK", "False").lower() == "true"
-        logging.info(f"Sponsor Block: {self.sponsor_block}")
+        self.sponsor_block = self.getenv("SPONSOR_BLOCK", "False").lower() == "true"
+        logging.debug(f"Sponsor Block: {self.sponsor_block}")
 
-        self.archive = os.getenv("ARCHIVE", None)
-        logging.info(f"Archive: {self.archive}")
+        self.archive = self.getenv("ARCHIVE", None)
+        logging.debug(f"Archive: {self.archive}")
 
-        self.load_config = os.getenv("LOAD_CONFIG", "True").lower() == "true"
-        logging.info(f"Load Config: {self.load_config}")
+        self.load_config = self.getenv("LOAD_CONFIG", "True").lower() == "true"
+        logging.debug(f"Load Config: {self.load_config}")
 
-        self.simple_tui = os.getenv("SIMPLE_TUI", "False").lower() == "true"
-        logging.info(f"Simple TUI: {self.simple_tui}")
+        self.simple_tui = self.getenv("SIMPLE_TUI", "False").lower() == "true"
+        logging.debug(f"Simple TUI: {self.simple_tui}")
 
-        self.fetch_albums = os.getenv("FETCH_ALBUMS", "False").lower() == "true"
-        logging.info(f"Fetch Albums: {self.fetch_albums}")
+        self.fetch_albums = self.getenv("FETCH_ALBUMS", "False").lower() == "true"
+        logging.debug(f"Fetch Albums: {self.fetch_albums}")
 
-        self.id3_separator = os.getenv("ID3_SEPARATOR", "/")
-        logging.info(f"ID3 Separator: {self.id3_separator}")
+        self.id3_separator = self.getenv("ID3_SEPARATOR", "/")
+        logging.debug(f"ID3 Separator: {self.id3_separator}")
 
-        self.album_type = os.getenv("ALBUM_TYPE", None)
-        logging.info(f"Album Type: {self.album_type}")
+        self.album_type = self.getenv("ALBUM_TYPE", None)
+        logging.debug(f"Album Type: {self.album_type}")
 
-        self.restrict = os.getenv("RESTRICT", None)
-        logging.info(f"Restrict: {self.restrict}")
+        self.restrict = self.getenv("RESTRICT", None)
+        logging.debug(f"Restrict: {self.restrict}")
 
-        self.ytm_data = os.getenv("YTM_DATA", "False").lower() == "true"
-        logging.info(f"YTM Data: {self.ytm_data}")
+        self.ytm_data = self.getenv("YTM_DATA", "False").lower() == "true"
+        logging.debug(f"YTM Data: {self.ytm_data}")
 
-        self.add_unavailable = os.getenv("ADD_UNAVAILABLE", "False").lower() == "true"
-        logging.info(f"Add Unavailable: {self.add_unavailable}")
+        self.add_unavailable = self.getenv("ADD_UNAVAILABLE", "False").lower() == "true"
+        logging.debug(f"Add Unavailable: {self.add_unavailable}")
 
-        self.generate_lrc = os.getenv("GENERATE_LRC", "False").lower() == "true"
-        logging.info(f"Generate LRC: {self.generate_lrc}")
+        self.generate_lrc = self.getenv("GENERATE_LRC", "False").lower() == "true"
+        logging.debug(f"Generate LRC: {self.generate_lrc}")
 
-        self.force_update_metadata = os.getenv("FORCE_UPDATE_METADATA", "False").lower() == "true"
-        logging.info(f"Force Update Metadata: {self.force_update_metadata}")
+        self.force_update_metadata = self.getenv("FORCE_UPDATE_METADATA", "False").lower() == "true"
+        logging.debug(f"Force Update Metadata: {self.force_update_metadata}")
 
-        self.only_verified_results = os.getenv("ONLY_VERIFIED_RESULTS", "False").lower() == "true"
-        logging.info(f"Only Verified Results: {self.only_verified_results}")
+        self.only_verified_results = self.getenv("ONLY_VERIFIED_RESULTS", "False").lower() == "true"
+        logging.debug(f"Only Verified Results: {self.only_verified_results}")
 
-        self.sync_without_deleting = os.getenv("SYNC_WITHOUT_DELETING", "False").lower() == "true"
-        logging.info(f"Sync Without Deleting: {self.sync_without_deleting}")
+        self.sync_without_deleting = self.getenv("SYNC_WITHOUT_DELETING", "False").lower() == "true"
+        logging.debug(f"Sync Without Deleting: {self.sync_without_deleting}")
 
-        self.max_filename_length = os.getenv("MAX_FILENAME_LENGTH", None)
-        logging.info(f"Max Filename Length: {self.max_filename_length}")
+        self.max_filename_length = self.getenv("MAX_FILENAME_LENGTH", None)
+        logging.debug(f"Max Filename Length: {self.max_filename_length}")
 
-        self.yt_dlp_args = os.getenv("YT_DLP_ARGS", None)
-        logging.info(f"YT-DLP Args: {self.yt_dlp_args}")
+        self.yt_dlp_args = self.getenv("YT_DLP_ARGS", None)
+        logging.debug(f"YT-DLP Args: {self.yt_dlp_args}")
 
-        self.detect_formats = os.getenv("DETECT_FORMATS", None)
-        logging.info(f"Detect Formats: {self.detect_formats}")
+        self.detect_formats = self.getenv("DETECT_FORMATS", None)
+        logging.debug(f"Detect Formats: {self.detect_formats}")
 
-        self.save_errors = os.getenv("SAVE_ERRORS", None)
-        logging.info(f"Save Errors: {self.save_errors}")
+        self.save_errors = self.getenv("SAVE_ERRORS", None)
+        logging.debug(f"Save Errors: {self.save_errors}")
 
-        self.ignore_albums = os.getenv("IGNORE_ALBUMS", None)
-        logging.info(f"Ignore Albums: {self.ignore_albums}")
+        self.ignore_albums = self.getenv("IGNORE_ALBUMS", None)
+        logging.debug(f"Ignore Albums: {self.ignore_albums}")
 
-        self.log_format = os.getenv("LOG_FORMAT", None)
-        logging.info(f"Log Format: {self.log_format}")
+        self.log_format = self.getenv("LOG_FORMAT", None)
+        logging.debug(f"Log Format: {self.log_format}")
 
-        self.redownload = os.getenv("REDOWNLOAD", "False").lower() == "true"
-        logging.info(f"Redownload: {self.redownload}")
+        self.redownload = self.getenv("REDOWNLOAD", "False").lower() == "true"
+        logging.debug(f"Redownload: {self.redownload}")
 
-        self.skip_album_art = os.getenv("SKIP_ALBUM_ART", "False").lower() == "true"
-        logging.info(f"Skip Album Art: {self.skip_album_art}")
+        self.skip_album_art = self.getenv("SKIP_ALBUM_ART", "False").lower() == "true"
+        logging.debug(f"Skip Album Art: {self.skip_album_art}")
 
-        self.create_skip_file = os.getenv("CREATE_SKIP_FILE", "False").lower() == "true"
-        logging.info(f"Create Skip File: {self.create_skip_file}")
+        self.create_skip_file = self.getenv("CREATE_SKIP_FILE", "False").lower() == "true"
+        logging.debug(f"Create Skip File: {self.create_skip_file}")
 
-        self.respect_skip_file = os.getenv("RESPECT_SKIP_FILE", "False").lower() == "true"
-        logging.info(f"Respect Skip File: {self.respect_skip_file}")
+        self.respect_skip_file = self.getenv("RESPECT_SKIP_FILE", "False").lower() == "true"
+        logging.debug(f"Respect Skip File: {self.respect_skip_file}")
 
-        self.sync_remove_lrc = os.getenv("SYNC_REMOVE_LRC", "False").lower() == "true"
-        logging.info(f"Sync Remove LRC: {self.sync_remove_lrc}")
+        self.sync_remove_lrc = self.getenv("SYNC_REMOVE_LRC", "False").lower() == "true"
+        logging.debug(f"Sync Remove LRC: {self.sync_remove_lrc}")
 
-        self.web_use_output_dir = os.getenv("WEB_USE_OUTPUT_DIR", "False").lower() == "true"
-        logging.info(f"Web Use Output Dir: {self.web_use_output_dir}")
+        self.web_use_output_dir = self.getenv("WEB_USE_OUTPUT_DIR", "False").lower() == "true"
+        logging.debug(f"Web Use Output Dir: {self.web_use_output_dir}")
 
-        self.key_file = os.getenv("KEY_FILE", None)
-        logging.info(f"Key File: {self.key_file}")
+        self.key_file = self.getenv("KEY_FILE", None)
+        logging.debug(f"Key File: {self.key_file}")
 
-        self.cert_file = os.getenv("CERT_FILE", None)
-        logging.info(f"Cert File: {self.cert_file}")
+        self.cert_file = self.getenv("CERT_FILE", None)
+        logging.debug(f"Cert File: {self.cert_file}")
 
-        self.ca_file = os.getenv("CA_FILE", None)
-        logging.info(f"CA File: {self.ca_file}")
+        self.ca_file = self.getenv("CA_FILE", None)
+        logging.debug(f"CA File: {self.ca_file}")
 
-        self.allowed_origins = os.getenv("ALLOWED_ORIGINS", None)
-        logging.info(f"Allowed Origins: {self.allowed_origins}")
+        self.allowed_origins = self.getenv("ALLOWED_ORIGINS", None)
+        logging.debug(f"Allowed Origins: {self.allowed_origins}")
 
-        self.keep_sessions = os.getenv("KEEP_SESSIONS", "False").lower() == "true"
-        logging.info(f"Keep Sessions: {self.keep_sessions}")
+        self.keep_sessions = self.getenv("KEEP_SESSIONS", "False").lower() == "true"
+        logging.debug(f"Keep Sessions: {self.keep_sessions}")
 
-        self.force_update_gui = os.getenv("FORCE_UPDATE_GUI", "False").lower() == "true"
-        logging.info(f"Force Update GUI: {self.force_update_gui}")
+        self.force_update_gui = self.getenv("FORCE_UPDATE_GUI", "False").lower() == "true"
+        logging.debug(f"Force Update GUI: {self.force_update_gui}")
 
-        self.web_gui_repo = os.getenv("WEB_GUI_REPO", None)
-        logging.info(f"Web GUI Repo: {self.web_gui_repo}")
+        self.web_gui_repo = self.getenv("WEB_GUI_REPO", None)
+        logging.debug(f"Web GUI Repo: {self.web_gui_repo}")
 
-        self.web_gui_location = os.getenv("WEB_GUI_LOCATION", None)
-        logging.info(f"Web GUI Location: {self.web_gui_location}")
+        self.web_gui_location = self.getenv("WEB_GUI_LOCATION", None)
+        logging.debug(f"Web GUI Location: {self.web_gui_location}")
 
         # Create the spotdl_config dictionary
         self.spotdl_config = {
@@ -379,9 +644,18 @@ class ConfigService:
 
     def create_config_file(self):
         try:
+            try:
+                with open(self.config_path, "rb") as config_file:
+                    if hashlib.sha256(config_file.read()).hexdigest() == self.spotdl_config_hash:
+                        logging.debug(f"Configuration unchanged at {self.config_path}")
+                        return False
+            except FileNotFoundError:
+                pass
             os.makedirs(os.path.dirname(self.config_path), exist_ok=True)
             with open(self.config_path, "w", encoding="utf-8") as config_file:
                 json.dump(self.spotdl_config, config_file, indent=4)
             logging.info(f"Configuration saved to {self.config_path}")
+            return True
         except Exception as e:
             logging.error(f"Failed to save config file: {e}")
+            return False
@@ -0,0 +1,244 @@
+import time
+import uuid
+import logging
+import threading
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+
+class BrokerEmitter:
+    # Stands in for SocketIO on a download node, the web tier relays the events to its clients
+    def __init__(self, job_broker):
+        self.job_broker = job_broker
+
+    def emit(self, event, data=None, **kwargs):
+        self.job_broker.publish("events", {"event": event, "data": data})
+
+    def start_background_task(self, target, *args, **kwargs):
+        task = threading.Thread(target=target, args=args, kwargs=kwargs, daemon=True)
+        task.start()
+        return task
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+
+def create_event_emitter(config, job_broker):
+    # With a Socket.IO message queue the node reaches the clients directly
+    if config.socketio_message_queue:
+        from flask_socketio import SocketIO
+
+        return SocketIO(message_queue=config.socketio_message_queue)
+    return BrokerEmitter(job_broker)
+
+
+def merge_scheduler_stats(node_stats):
+    groups = {}
+    for stats in node_stats:
+        for group, counts in stats["groups"].items():
+            merged_counts = groups.setdefault(group, {})
+            for key, value in counts.items():
+                merged_counts[key] = merged_counts.get(key, 0) + value
+    oldest_waits = [stats["oldest_wait_seconds"] for stats in node_stats if stats["oldest_wait_seconds"] is not None]
+    # Percentiles cannot be added up, the slowest node's are reported
+    wait_seconds = {"samples": sum(stats["wait_seconds"]["samples"] for stats in node_stats)}
+    for key in ("p50", "p90", "p99", "max"):
+        values = [stats["wait_seconds"][key] for stats in node_stats if stats["wait_seconds"][key] is not None]
+        wait_seconds[key] = max(values) if values else None
+    return {
+        "groups": groups,
+        "pending": sum(stats["pending"] for stats in node_stats),
+        "sessions": sum(stats["sessions"] for stats in node_stats),
+        "oldest_wait_seconds": max(oldest_waits) if oldest_waits else None,
+        "wait_seconds": wait_seconds,
+        "nodes": len(node_stats),
+    }
+
+
+class RemoteDownloadService:
+    # The web tier's handle on the download nodes, with the methods of DownloadService the routes use
+    def __init__(self, config, job_broker):
+        self.config = config
+        self.job_broker = job_broker
+        self.lock = threading.Lock()
+        # Node id -> (received at, state), every node publishes its own
+        self.node_states = {}
+        self.started = False
+
+    def start(self):
+        if self.started:
+            return
+        self.started = True
+        threading.Thread(target=self._follow_node_states, name="node-states", daemon=True).start()
+
+    def _follow_node_states(self):
+        subscription = self.job_broker.subscribe("node_state")
+        while True:
+            try:
+                _, state = subscription.get(timeout=30)
+            except Exception as e:
+                logging.error(f"Job broker error: {e}")
+                time.sleep(self.config.broker_poll_interval)
+                continue
+            if state is not None:
+                self.add_node_state(state)
+
+    def add_node_state(self, state):
+        with self.lock:
+            self.node_states[state["node"]] = (time.monotonic(), state)
+
+    def get_node_states(self):
+        # A node that missed a few updates is gone, its jobs no longer show
+        max_age = self.config.broker_state_interval * 3
+        now = time.monotonic()
+        with self.lock:
+            for node_id, (received_at, _) in list(self.node_states.items()):
+                if now - received_at > max_age:
+                    del self.node_states[node_id]
+            return [state for _, state in self.node_states.values()]
+
+    def _call(self, method, **kwargs):
+        reply_channel = f"reply:{uuid.uuid4().hex}"
+        # Subscribed before sending, a fast reply must not be missed
+        subscription = self.job_broker.subscribe(reply_channel)
+        try:
+            self.job_broker.put("commands", {"method": method, "kwargs": kwargs, "reply_to": reply_channel})
+            _, reply = subscription.get(timeout=self.config.broker_call_timeout)
+        finally:
+            subscription.close()
+        if reply is None:
+            raise TimeoutError(f"No download node answered {method} within {self.config.broker_call_timeout}s")
+        if "error" in reply:
+            raise RuntimeError(reply["error"])
+        return reply["result"]
+
+    def _broadcast(self, method, **kwargs):
+        self.job_broker.publish("control", {"method": method, "kwargs": kwargs})
+
+    def add_item_to_queue(self, data, requester=None):
+        logging.info(f"Download Requested: {data}")
+        return self.add_items_to_queue([data], requester)[0]
+
+    def add_items_to_queue(self, items, requester=None):
+        return self._call("add_items_to_queue", items=items, requester=requester)
+
+    def retry_failed_jobs(self, requester=None):
+        return self._call("retry_failed_jobs", requester=requester)
+
+    def cancel_active_download(self, job_id=None, requester=None):
+        # Any node may be running the job, every node drops the requester's references
+        self._broadcast("cancel_active_download", job_id=job_id, requester=requester)
+
+    def cancel_pending_downloads(self, requester=None):
+        self._broadcast("cancel_pending_downloads", requester=requester)
+
+    def get_active_progress(self):
+        return [progress for state in self.get_node_states() for progress in state["progress"]]
+
+    def get_scheduler_stats(self):
+        node_states = self.get_node_states()
+        if not node_states:
+            return {}
+        return merge_scheduler_stats([state["scheduler_stats"] for state in node_states])
+
+    def get_admission_status(self):
+        for state in self.get_node_states():
+            if state["admission"]["paused"]:
+                return state["admission"]
+        return {"paused": False, "reason": None}
+
+
+class DownloadNode:
+    command_methods = ("add_items_to_queue", "retry_failed_jobs")
+    control_methods = ("cancel_active_download", "cancel_pending_downloads", "attach_requester")
+
+    def __init__(self, config, job_broker, download_service):
+        self.config = config
+        self.job_broker = job_broker
+        self.download_service = download_service
+        self.node_id = self.config.node_id
+
+    def start(self):
+        for target, name in (
+            (self._serve_commands, "node-commands"),
+            (self._serve_control, "node-control"),
+            (self._publish_state, "node-state"),
+            (self.download_service.process_downloads, "node-downloads"),
+        ):
+            node_thread = threading.Thread(target=target, name=name, daemon=True)
+            node_thread.start()
+        logging.info(f"Download node {self.node_id} started")
+
+    def get_state(self):
+        return {
+            "node": self.node_id,
+            "progress": self.download_service.get_active_progress(),
+            "scheduler_stats": self.download_service.get_scheduler_stats(),
+            "admission": self.download_service.get_admission_status(),
+        }
+
+    def _publish_state(self):
+        # The status page shows every node, so each one reports its own state instead of answering queries
+        while True:
+            try:
+                self.job_broker.publish("node_state", self.get_state())
+            except Exception as e:
+                logging.error(f"Job broker error: {e}")
+            try:
+                # The heartbeat tells other nodes this one still runs its jobs, a stopped node's jobs are taken over
+                self.download_service.job_store.record_heartbeat()
+                if self.config.resume_unfinished_jobs:
+                    self.download_service.resume_unfinished_jobs(include_own=False)
+            except Exception as e:
+                logging.error(f"Job store error: {e}")
+            time.sleep(self.config.broker_state_interval)
+
+    def _serve_commands(self):
+        # Commands are shared between nodes, each one is taken by exactly one of them
+        while True:
+            try:
+                message = self.job_broker.get("commands", timeout=5)
+            except Exception as e:
+                logging.error(f"Job broker error: {e}")
+                time.sleep(self.config.broker_poll_interval)
+                continue
+            if message is not None:
+                self._handle(message, self.command_methods)
+
+    def _serve_control(self):
+        subscription = self.job_broker.subscribe("control")
+        while True:
+            try:
+                _, message = subscription.get(timeout=30)
+            except Exception as e:
+                logging.error(f"Job broker error: {e}")
+                time.sleep(self.config.broker_poll_interval)
+                continue
+            if message is not None:
+                self._handle(message, self.control_methods)
+
+    def _handle(self, message, allowed_methods):
+        method = message.get("method")
+        try:
+            if method not in allowed_methods:
+                raise ValueError(f"Unknown command: {method}")
+            result = getattr(self.download_service, method)(**message.get("kwargs", {}))
+            if method == "add_items_to_queue":
+                self._forward_joins(result, message.get("kwargs", {}).get("requester"))
+            reply = {"result": result}
+        except Exception as e:
+            logging.error(f"Command {method} failed: {e}")
+            reply = {"error": str(e)}
+        if message.get("reply_to"):
+            self.job_broker.publish(message["reply_to"], reply)
+
+    def _forward_joins(self, jobs, requester):
+        # Jobs another node runs, that node has to hold the request so a cancel by someone else leaves it running
+        if requester is None:
+            return
+        for download_info in jobs:
+            if download_info["status"] in self.download_service.job_store.unfinished_statuses and not self.download_service.coalescer.has_job(download_info["id"]):
+                self._broadcast_control("attach_requester", job_id=download_info["id"], requester=requester)
+
+    def _broadcast_control(self, method, **kwargs):
+        self.job_broker.publish("control", {"method": method, "kwargs": kwargs})
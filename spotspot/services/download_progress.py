@@ -0,0 +1,153 @@
+import re
+import time
+from collections import deque
+
+spotdl_line_patterns = (
+    ("found", re.compile(r"Found (?P<total>\d+) songs? in (?P<name>.+)")),
+    ("downloaded", re.compile(r'Downloaded "(?P<name>.+)":')),
+    ("skipped", re.compile(r"Skipping (?P<name>.+?) \((?P<reason>[^)]+)\)")),
+    ("started", re.compile(r'Downloading "?(?P<name>[^"]+?)"?(?: \(|$)')),
+    # spotDL logs a failed song as the bare exception, the --print-errors summary and tracebacks repeat it with a prefix
+    ("failed", re.compile(r"^(?P<error>[A-Z]\w*Error): (?P<message>.+)")),
+)
+
+
+def parse_spotdl_line(line):
+    line = line.strip()
+    for event_type, pattern in spotdl_line_patterns:
+        match = pattern.search(line)
+        if match:
+            return event_type, match.groupdict()
+    return None, None
+
+
+class DownloadProgress:
+    def __init__(self, download_info):
+        self.job_id = download_info.get("id")
+        self.parent_id = download_info.get("parent_id")
+        self.total = 1 if download_info.get("type") == "track" else None
+        self.downloaded = []
+        self.skipped = []
+        self.failed = []
+        # Recent output, read to classify a failed run
+        self.output_tail = deque(maxlen=40)
+        self.current = None
+        self.started_at = time.monotonic()
+        self.started_wall = time.time()
+        self.last_activity = self.started_at
+        self.last_track_done = self.started_at
+        self.track_seconds = []
+        self.last_emit = 0
+
+    @property
+    def completed(self):
+        return len(self.downloaded) + len(self.skipped) + len(self.failed)
+
+    def handle_line(self, line):
+        if line.strip():
+            self.output_tail.append(line.strip())
+        event_type, fields = parse_spotdl_line(line)
+        if event_type is None:
+            return None
+
+        now = time.monotonic()
+        self.last_activity = now
+        if event_type == "found":
+            self.total = int(fields["total"])
+        elif event_type == "started":
+            self.current = fields["name"]
+        else:
+            if event_type == "downloaded":
+                self.downloaded.append(fields["name"])
+                self.track_seconds.append(now - self.last_track_done)
+            elif event_type == "skipped":
+                self.skipped.append(fields["name"])
+            elif event_type == "failed":
+                self.failed.append(fields["message"])
+            self.last_track_done = now
+            self.current = None
+        return event_type
+
+    def should_emit(self, interval):
+        now = time.monotonic()
+        if now - self.last_emit < interval:
+            return False
+        self.last_emit = now
+        return True
+
+    def average_track_seconds(self):
+        if not self.track_seconds:
+            return None
+        return sum(self.track_seconds) / len(self.track_seconds)
+
+    def to_dict(self):
+        now = time.monotonic()
+        elapsed = now - self.started_at
+        completed = self.completed
+        tracks_per_minute = completed / elapsed * 60 if elapsed > 0 and completed else 0
+        eta_seconds = None
+        if self.total and completed:
+            eta_seconds = max(0, (self.total - completed) * elapsed / completed)
+        return {
+            "id": self.job_id,
+            "total": self.total,
+            "completed": completed,
+            "downloaded": len(self.downloaded),
+            "skipped": len(self.skipped),
+            "failed": len(self.failed),
+            "current": self.current,
+            "elapsed_seconds": round(elapsed, 1),
+            "idle_seconds": round(now - self.last_activity, 1),
+            "tracks_per_minute": round(tracks_per_minute, 2),
+            "eta_seconds": round(eta_seconds) if eta_seconds is not None else None,
+        }
+
+
+class CollectionProgress:
+    def __init__(self, parent_id):
+        self.job_id = parent_id
+        self.started_at = time.monotonic()
+        self.last_activity = self.started_at
+        self.initial_completed = None
+        self.total = 0
+        self.counts = {}
+        self.current = None
+
+    @property
+    def completed(self):
+        return self.total - self.counts.get("Pending...", 0) - self.counts.get("Downloading...", 0) - self.counts.get("Processing...", 0)
+
+    def update(self, child_jobs):
+        counts = {}
+        for child_job in child_jobs:
+            counts[child_job["status"]] = counts.get(child_job["status"], 0) + 1
+        running_names = [child_job["name"] for child_job in child_jobs if child_job["status"] == "Downloading..."]
+        if counts != self.counts:
+            self.last_activity = time.monotonic()
+        self.total = len(child_jobs)
+        self.counts = counts
+        self.current = running_names[0] if running_names else None
+        if self.initial_completed is None:
+            # Tracks already finished before this process started do not count towards the rate
+            self.initial_completed = self.completed
+
+    def to_dict(self):
+        now = time.monotonic()
+        elapsed = now - self.started_at
+        completed = self.completed
+        processed = completed - (self.initial_completed or 0)
+        tracks_per_minute = processed / elapsed * 60 if elapsed > 0 and processed else 0
+        eta_seconds = max(0, (self.total - completed) * elapsed / processed) if processed else None
+        return {
+            "id": self.job_id,
+            "total": self.total,
+            "completed": completed,
+            "downloaded": self.counts.get("Complete", 0),
+            "skipped": self.counts.get("Already Downloaded", 0),
+            "failed": self.counts.get("Failed", 0) + self.counts.get("Error", 0),
+            "current": self.current,
+            "elapsed_seconds": round(elapsed, 1),
+            "idle_seconds": round(now - self.last_activity, 1),
+            "tracks_per_minute": round(tracks_per_minute, 2),
+            "eta_seconds": round(eta_seconds) if eta_seconds is not None else None,
+        }
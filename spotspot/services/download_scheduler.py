@@ -0,0 +1,138 @@
+import time
+import heapq
+import logging
+import itertools
+import threading
+from collections import deque
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+
+def get_percentile(sorted_values, percentile):
+    if not sorted_values:
+        return None
+    position = min(len(sorted_values) - 1, int(round(percentile / 100 * (len(sorted_values) - 1))))
+    return round(sorted_values[position], 2)
+
+
+class DownloadScheduler:
+    def __init__(self, config):
+        self.config = config
+        self.condition = threading.Condition()
+        self.sequence = itertools.count()
+        self.dispatch_sequence = itertools.count()
+        # Artists are whole discographies, so they share the album slots
+        self.type_groups = {"track": "track", "album": "album", "artist": "album", "playlist": "playlist"}
+        self.type_limits = {
+            "track": self.config.max_track_downloads,
+            "album": self.config.max_album_downloads,
+            "playlist": self.config.max_playlist_downloads,
+        }
+        # One heap per client session and group, sessions take turns
+        self.pending = {}
+        self.session_last_served = {}
+        self.active = {group: 0 for group in self.type_limits}
+        self.wait_times = deque(maxlen=self.config.scheduler_wait_samples)
+
+    def get_group(self, download_info):
+        return self.type_groups.get(download_info.get("type"), "track")
+
+    def get_default_priority(self, download_info):
+        return self.config.track_priority if download_info.get("type") == "track" else self.config.collection_priority
+
+    def _get_sort_key(self, priority, enqueued_at):
+        # priority + waited / aging is the effective priority, subtracting the enqueue time keeps it constant per job
+        return -(priority - enqueued_at / self.config.scheduler_aging_seconds)
+
+    def submit(self, url, download_info, session=None):
+        group = self.get_group(download_info)
+        priority = download_info.get("priority")
+        if priority is None:
+            priority = self.get_default_priority(download_info)
+        enqueued_at = time.monotonic()
+        with self.condition:
+            # A session joins the end of the turn order and leaves it once its queue is empty
+            if session not in self.session_last_served:
+                self.session_last_served[session] = next(self.dispatch_sequence)
+            bucket = self.pending.setdefault((session, group), [])
+            heapq.heappush(bucket, (self._get_sort_key(priority, enqueued_at), next(self.sequence), enqueued_at, url, download_info))
+            self.condition.notify_all()
+
+    def next_job(self):
+        with self.condition:
+            while True:
+                bucket_key = self._select_bucket()
+                if bucket_key is not None:
+                    session, group = bucket_key
+                    _, _, enqueued_at, url, download_info = heapq.heappop(self.pending[bucket_key])
+                    self.active[group] += 1
+                    self.session_last_served[session] = next(self.dispatch_sequence)
+                    if not self.pending[bucket_key]:
+                        del self.pending[bucket_key]
+                        self._drop_idle_session(session)
+                    self.wait_times.append(time.monotonic() - enqueued_at)
+                    return group, url, download_info
+                self.condition.wait()
+
+    def release(self, group):
+        with self.condition:
+            self.active[group] -= 1
+            self.condition.notify_all()
+
+    def _select_bucket(self):
+        # The least recently served session goes next, within it the highest effective priority
+        selected_key = None
+        selected_rank = None
+        for (session, group), bucket in self.pending.items():
+            if self.active[group] >= self.type_limits[group]:
+                continue
+            rank = (self.session_last_served.get(session, -1), bucket[0][0], bucket[0][1])
+            if selected_rank is None or rank < selected_rank:
+                selected_key = (session, group)
+                selected_rank = rank
+        return selected_key
+
+    def clear_pending(self, job_ids=None):
+        with self.condition:
+            cleared = 0
+            for bucket_key, bucket in list(self.pending.items()):
+                kept_jobs = [job for job in bucket if job_ids is not None and job[4].get("id") not in job_ids]
+                cleared += len(bucket) - len(kept_jobs)
+                if kept_jobs:
+                    heapq.heapify(kept_jobs)
+                    self.pending[bucket_key] = kept_jobs
+                else:
+                    del self.pending[bucket_key]
+                    self._drop_idle_session(bucket_key[0])
+            return cleared
+
+    def _drop_idle_session(self, session):
+        if not any(pending_session == session for pending_session, group in self.pending):
+            self.session_last_served.pop(session, None)
+
+    def get_counts(self):
+        with self.condition:
+            pending_counts = {group: 0 for group in self.type_limits}
+            for (session, group), bucket in self.pending.items():
+                pending_counts[group] += len(bucket)
+            return {group: {"pending": pending_counts[group], "active": self.active[group]} for group in self.type_limits}
+
+    def get_stats(self):
+        with self.condition:
+            wait_times = sorted(self.wait_times)
+            oldest_enqueued = min((job[2] for bucket in self.pending.values() for job in bucket), default=None)
+            sessions = len({session for session, group in self.pending})
+        group_counts = self.get_counts()
+        return {
+            "groups": group_counts,
+            "pending": sum(counts["pending"] for counts in group_counts.values()),
+            "sessions": sessions,
+            "oldest_wait_seconds": round(time.monotonic() - oldest_enqueued, 1) if oldest_enqueued is not None else None,
+            "wait_seconds": {
+                "samples": len(wait_times),
+                "p50": get_percentile(wait_times, 50),
+                "p90": get_percentile(wait_times, 90),
+                "p99": get_percentile(wait_times, 99),
+                "max": round(wait_times[-1], 2) if wait_times else None,
+            },
+        }
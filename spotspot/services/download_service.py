@@ -1,31 +1,207 @@
 import os
+import re
+import time
+import signal
 import logging
 import subprocess
 import stat
+import threading
+from services import metrics
+from services.admission_controller import AdmissionController
+from services.download_scheduler import DownloadScheduler
+from services.retry_policy import RetryPolicy, classify_failure
+from services.job_coalescer import JobCoalescer
+from services.download_progress import DownloadProgress, CollectionProgress
+from services.spotdl_worker import SpotdlWorker, SpotdlWorkerPool
+from services.post_processor import PostProcessor
+from services.library_index import parse_spotify_url, read_track_tags
+from services.playlist_index import write_file_atomically
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
 class DownloadService:
-    def __init__(self, config, playlist_manager, socketio, download_queue, download_history):
+    def __init__(self, config, playlist_manager, socketio, download_queue, job_store, status_broadcaster, media_refresh_scheduler, spotify_service, library_index):
         self.config = config
         self.playlist_manager = playlist_manager
         self.socketio = socketio
         self.download_queue = download_queue
-        self.download_history = download_history
+        self.job_store = job_store
+        self.status_broadcaster = status_broadcaster
+        self.media_refresh_scheduler = media_refresh_scheduler
+        self.spotify_service = spotify_service
+        self.library_index = library_index
+        self.scheduler = DownloadScheduler(config)
+        self.coalescer = JobCoalescer()
+        self.admission_controller = AdmissionController(config, socketio)
+        self.retry_policy = RetryPolicy(config, lambda url, download_info: self.download_queue.put((url, download_info)))
+        self.post_processor = PostProcessor(config)
+        self.active_progress = {}
+        self.collection_progress = {}
+        self.parent_lock = threading.Lock()
+        self.retry_counts = {}
+        self.process_lock = threading.Lock()
+        self.running_jobs = {}
+        self.active_processes = {}
+        self.cancelled_jobs = set()
+        # Native files handed to the post-processing workers and not converted yet
+        self.processing_files = set()
+        self.spotdl_pool = None
+        metrics.registry.gauge("spotspot_queue_depth", "Jobs waiting for a download slot", ("group",), self._get_queue_depth)
+        metrics.registry.gauge("spotspot_jobs_in_flight", "Jobs holding a download slot", ("group",), self._get_jobs_in_flight)
 
-    def add_item_to_queue(self, data):
+    def _get_queue_depth(self):
+        return {(group,): counts["pending"] for group, counts in self.scheduler.get_counts().items()}
+
+    def _get_jobs_in_flight(self):
+        return {(group,): counts["active"] for group, counts in self.scheduler.get_counts().items()}
+
+    def add_item_to_queue(self, data, requester=None):
         logging.info(f"Download Requested: {data}")
-        spotify_url = data.get("url")
-        download_info = {
-            "url": spotify_url,
-            "type": data.get("type"),
-            "name": data.get("name"),
-            "artist": data.get("artist"),
-            "status": "Pending..."
-        }
-        self.download_queue.put((spotify_url, download_info))
-        self.download_history[spotify_url] = download_info
-        self._emit_update()
+        return self.add_items_to_queue([data], requester)[0]
+
+    def add_items_to_queue(self, items, requester=None):
+        # Returns the job serving each item, new jobs are stored in one transaction and announced in one delta
+        requested_jobs = []
+        new_jobs = []
+        batch_jobs = {}
+        followed_jobs = {}
+        for data in items:
+            spotify_url = data.get("url")
+            url_key = self.coalescer.get_url_key(spotify_url)
+            if url_key in batch_jobs:
+                requested_jobs.append(batch_jobs[url_key])
+                continue
+            existing_job = self.coalescer.find_active(spotify_url)
+            if existing_job is not None and not existing_job.get("parent_id"):
+                logging.info(f"Joined existing job {existing_job['id']} for {spotify_url}")
+                self.coalescer.attach(existing_job, requester)
+                requested_jobs.append(existing_job)
+                continue
+            download_info = {
+                "url": spotify_url,
+                "type": data.get("type"),
+                "name": data.get("name"),
+                "artist": data.get("artist"),
+                "status": "Pending...",
+                "priority": self._get_requested_priority(data),
+            }
+            existing_file = self._find_existing_track(download_info)
+            if existing_file:
+                logging.info(f"Already in library, not downloading again: {existing_file}")
+                download_info["status"] = "Already Downloaded"
+            elif existing_job is not None:
+                followed_jobs[url_key] = existing_job
+            batch_jobs[url_key] = download_info
+            new_jobs.append(download_info)
+            requested_jobs.append(download_info)
+
+        url_keys = [
+            self.coalescer.get_url_key(download_info["url"]) if download_info["status"] == "Pending..." and self.coalescer.get_url_key(download_info["url"]) not in followed_jobs else None
+            for download_info in new_jobs
+        ]
+        joined_jobs = {}
+        for download_info, stored_job in zip(new_jobs, self.job_store.add_claimed_jobs(new_jobs, url_keys)):
+            if stored_job is not download_info:
+                logging.info(f"Joined job {stored_job['id']} of another download node for {download_info['url']}")
+                joined_jobs[id(download_info)] = stored_job
+        new_jobs = [download_info for download_info in new_jobs if id(download_info) not in joined_jobs]
+        for download_info in new_jobs:
+            if download_info["status"] != "Pending...":
+                continue
+            self.coalescer.register(download_info, requester)
+            existing_job = followed_jobs.get(self.coalescer.get_url_key(download_info["url"]))
+            if existing_job is not None:
+                # The track is already being fetched for a collection, this entry follows that job
+                logging.info(f"Following track {existing_job['id']} of collection {existing_job['parent_id']} for {download_info['url']}")
+                self.coalescer.add_follower(existing_job, download_info)
+            else:
+                self.download_queue.put((download_info["url"], download_info))
+        self.status_broadcaster.jobs_changed(new_jobs)
+        return [joined_jobs.get(id(download_info), download_info) for download_info in requested_jobs]
+
+    def attach_requester(self, job_id, requester=None):
+        # A request another node joined on behalf of a client, only the node running the job holds it
+        return self.coalescer.attach_id(job_id, requester)
+
+    def _get_requested_priority(self, data):
+        try:
+            return max(-10, min(10, int(data["priority"])))
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    def _sync_followers(self, download_info, follower_jobs):
+        for follower_info in follower_jobs:
+            if self._is_cancelled(follower_info):
+                self.coalescer.finish(follower_info)
+                continue
+            follower_info["status"] = download_info["status"]
+            follower_info["file_path"] = download_info.get("file_path")
+            follower_info["error"] = download_info.get("error")
+            self.job_store.update_job(follower_info)
+            self._emit_update(follower_info)
+            if follower_info["status"] not in self.job_store.unfinished_statuses:
+                self.coalescer.finish(follower_info)
+                self._update_parent(follower_info.get("parent_id"))
+
+    def _drop_unwanted_followers(self, download_info):
+        for follower_info in self.coalescer.get_followers(download_info):
+            if self.coalescer.is_wanted(follower_info):
+                continue
+            self.coalescer.remove_follower(download_info, follower_info)
+            self.coalescer.finish(follower_info)
+            follower_info["status"] = "Cancelled"
+            self.job_store.update_job(follower_info)
+            self._emit_update(follower_info)
+            self._update_parent(follower_info.get("parent_id"))
+
+    def _get_request_ids(self, download_info):
+        # Every job whose requests keep this one alive
+        request_ids = [download_info["id"], download_info.get("parent_id")]
+        request_ids.extend(follower_info["id"] for follower_info in self.coalescer.get_followers(download_info))
+        return request_ids
+
+    def _library_check_enabled(self):
+        # REDOWNLOAD and OVERWRITE=force ask spotDL to fetch existing files again
+        return self.config.skip_existing_tracks and not self.config.redownload and self.config.overwrite != "force"
+
+    def _find_existing_track(self, download_info):
+        url_type, track_id = parse_spotify_url(download_info["url"])
+        if url_type != "track" or not self._library_check_enabled():
+            return None
+        return self.library_index.find_track(track_id)
+
+    def _get_collection_tracks(self, download_info):
+        collection_type, collection_id = parse_spotify_url(download_info["url"])
+        if collection_type not in ("album", "playlist"):
+            return None
+        try:
+            return self._match_library_tracks(self.spotify_service.get_collection_tracks(collection_type, collection_id))
+        except Exception as e:
+            logging.warning(f"Could not expand {download_info['url']}, downloading it in one SpotDL run: {e}")
+            return None
+
+    def _match_library_tracks(self, tracks):
+        library_check_enabled = self._library_check_enabled()
+        for track in tracks:
+            track["path"] = self.library_index.find_track(track["id"], track["isrc"]) if library_check_enabled else None
+        # Files from another release of the same recording only match by ISRC
+        unmatched_tracks = [track for track in tracks if library_check_enabled and not track["path"] and not track["isrc"]]
+        if unmatched_tracks:
+            self.spotify_service.fill_track_isrcs(unmatched_tracks)
+            for track in unmatched_tracks:
+                track["path"] = self.library_index.find_track(track["id"], track["isrc"])
+        return tracks
+
+    def _write_playlist_m3u(self, download_path, download_info, child_jobs):
+        lines = ["#EXTM3U"]
+        for child_job in child_jobs:
+            file_path = child_job.get("file_path")
+            # A file moved or renamed since the track finished is looked up again
+            if not file_path or not os.path.isfile(file_path):
+                file_path = self.library_index.find_track(parse_spotify_url(child_job["url"])[1])
+            if file_path:
+                lines.append(os.path.relpath(file_path, download_path))
+        write_file_atomically(os.path.join(download_path, self._get_m3u_name(download_info)), "\n".join(lines) + "\n")
 
     def _ensure_writable(self, path):
         try:
@@ -34,8 +210,8 @@ class DownloadService:
         except Exception as e:
             logging.warning(f"Could not chmod {path}: {e}")
 
-    def _emit_update(self):
-        self.socketio.emit("update_status", {"history": list(self.download_history.values())})
+    def _emit_update(self, download_info):
+        self.status_broadcaster.job_changed(download_info)
 
     def _prepare_download_path(self, download_info):
         try:
@@ -48,65 +224,608 @@ class DownloadService:
         self._ensure_writable(parent)
         return path
 
+    def _get_m3u_name(self, download_info):
+        if download_info.get("type") != "playlist":
+            return None
+        return download_info.get("name", "playlist").strip().replace("/", "-") + ".m3u"
+
+    def _get_format_arguments(self):
+        if not self.post_processor.is_enabled():
+            return []
+        # spotDL only fetches and tags the native stream, converting is left to the post-processing workers
+        download_format = self.post_processor.get_download_format()
+        return ["--format", download_format, "--bitrate", "disable", "--ffmpeg-args", "", "--detect-formats", self.config.format, download_format]
+
     def _build_spotdl_command(self, url, download_info):
         if download_info.get("type") == "playlist":
-            playlist_name = (
-                download_info.get("name", "playlist").strip().replace("/", "-") + ".m3u"
-            )
+            playlist_name = self._get_m3u_name(download_info)
             return [
                 "spotdl", "--output", ".",
                 "--m3u", playlist_name,
                 "--log-level", self.config.log_level,
                 "--print-errors", url
-            ]
+            ] + self._get_format_arguments()
         else:
-            return ["spotdl", "--output", ".", url]
+            return ["spotdl", "--output", ".", url] + self._get_format_arguments()
+
+    def _emit_progress(self, progress):
+        # Tracks of a collection are reported through the progress of their parent
+        if progress.parent_id is None:
+            self.socketio.emit("download_progress", progress.to_dict())
+
+    def get_active_progress(self):
+        track_progress = [progress.to_dict() for progress in list(self.active_progress.values()) if progress.parent_id is None]
+        return track_progress + [progress.to_dict() for progress in list(self.collection_progress.values())]
+
+    def get_scheduler_stats(self):
+        return self.scheduler.get_stats()
+
+    def get_admission_status(self):
+        return self.admission_controller.get_status()
+
+    def _start_spotdl(self, command, cwd, download_info):
+        if self.spotdl_pool is not None:
+            worker = self.spotdl_pool.acquire()
+            return worker.start_job([download_info["url"]], cwd, self._get_m3u_name(download_info), download_info["id"])
 
-    def _execute_download(self, command, cwd):
-        proc = subprocess.Popen(
+        # Own process group so spotDL, ffmpeg and yt-dlp can be killed together
+        return subprocess.Popen(
             command,
             cwd=cwd,
             stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,
-            text=True
+            text=True,
+            start_new_session=os.name == "posix"
         )
-        for line in proc.stdout:
-            logging.info(line.rstrip())
-        return proc.wait()
 
-    def process_downloads(self):
+    def _execute_download(self, command, cwd, download_info):
+        progress = DownloadProgress(download_info)
+        self.active_progress[progress.job_id] = progress
+        proc = None
         try:
-            self.config.get_spotdl_vars()
-            self.config.create_config_file()
-        except Exception:
-            logging.warning("Proceeding without writing SpotDL config file.")
+            proc = self._start_spotdl(command, cwd, download_info)
+            with self.process_lock:
+                self.active_processes[progress.job_id] = proc
+                cancelled = progress.job_id in self.cancelled_jobs
+            if cancelled:
+                self._terminate_process(proc, progress.job_id)
+            for line in proc.stdout:
+                logging.info(line.rstrip())
+                event_type = progress.handle_line(line)
+                if event_type and progress.should_emit(self.config.progress_emit_interval):
+                    self._emit_progress(progress)
+            returncode = proc.wait()
+            metrics.spotdl_exit_total.inc(code=returncode)
+        finally:
+            del self.active_progress[progress.job_id]
+            with self.process_lock:
+                self.active_processes.pop(progress.job_id, None)
+            if self.spotdl_pool is not None and proc is not None:
+                self.spotdl_pool.release(proc)
+        self._emit_progress(progress)
+        if progress.average_track_seconds() is not None:
+            logging.info(f"Job {progress.job_id}: {progress.completed} tracks, {progress.average_track_seconds():.1f}s per downloaded track")
+        return returncode, progress
 
-        while True:
-            url, download_info = self.download_queue.get()
-            if download_info.get("status") == "Cancelled":
-                self.download_queue.task_done()
+    def _signal_process(self, proc, job_id, force=False):
+        if isinstance(proc, SpotdlWorker):
+            # A pooled worker may already run the next job, it checks the job itself
+            return proc.signal_job(job_id, force)
+        if os.name == "posix":
+            os.killpg(proc.pid, signal.SIGKILL if force else signal.SIGTERM)
+        elif force:
+            proc.kill()
+        else:
+            proc.terminate()
+        return True
+
+    def _terminate_process(self, proc, job_id):
+        try:
+            if not self._signal_process(proc, job_id):
+                return
+            proc.wait(timeout=self.config.cancel_grace_period)
+        except subprocess.TimeoutExpired:
+            logging.warning(f"SpotDL process {proc.pid} ignored SIGTERM, killing it")
+            self._signal_process(proc, job_id, force=True)
+        except ProcessLookupError:
+            pass
+        except Exception as e:
+            logging.error(f"Failed to stop SpotDL process {proc.pid}: {e}")
+
+    def _cleanup_partial_files(self, cwd, download_info, progress):
+        partial_suffixes = (".part", ".ytdl", ".temp", ".tmp")
+        download_format = self.post_processor.get_download_format()
+        with self.process_lock:
+            other_jobs_running = any(job_id != download_info["id"] for job_id in self.running_jobs)
+            processing_files = set(self.processing_files)
+        # spotDL names its files differently from its log, the words of the song's title are all that can be matched
+        current_words = re.findall(r"\w+", progress.current.split(" - ", 1)[-1].lower()) if progress.current else []
+        try:
+            with os.scandir(cwd) as entries:
+                for entry in entries:
+                    is_partial = entry.name.endswith(partial_suffixes) or ".temp." in entry.name
+                    if not (is_partial or entry.name.endswith(f".{download_format}")) or entry.path in processing_files or not entry.is_file():
+                        continue
+                    # Only touch files written while this job was running, file timestamps are coarser than time.time()
+                    if max(entry.stat().st_mtime, entry.stat().st_ctime) < progress.started_wall - 1:
+                        continue
+                    if not is_partial:
+                        # spotDL tags a song once it is complete, an untagged one was cut off
+                        if self._read_track_id(entry.path) is not None:
+                            continue
+                        # Another job may be writing its own song into the shared folder
+                        if other_jobs_running and not (current_words and all(word in entry.name.lower() for word in current_words)):
+                            continue
+                    os.remove(entry.path)
+                    logging.info(f"Removed partial file: {entry.path}")
+        except Exception as e:
+            logging.warning(f"Partial file cleanup failed in {cwd}: {e}")
+
+    def cancel_active_download(self, job_id=None, requester=None):
+        with self.process_lock:
+            job_ids = [job_id] if job_id is not None else list(self.running_jobs)
+            running_jobs = [self.running_jobs[running_job_id] for running_job_id in job_ids if running_job_id in self.running_jobs]
+        if requester is not None:
+            for download_info in running_jobs:
+                self.coalescer.release(requester, self._get_request_ids(download_info))
+                self._drop_unwanted_followers(download_info)
+
+        processes = []
+        cancelled_ids = []
+        abandoned_parents = set()
+        with self.process_lock:
+            for download_info in running_jobs:
+                # Only the last request holding a job may stop it
+                if requester is not None and self.coalescer.is_wanted(download_info):
+                    logging.info(f"Job {download_info['id']} is still requested by another client, keeping it")
+                    continue
+                self.cancelled_jobs.add(download_info["id"])
+                cancelled_ids.append(download_info["id"])
+                if requester is not None and download_info.get("parent_id"):
+                    abandoned_parents.add(download_info["parent_id"])
+                if download_info["id"] in self.active_processes:
+                    processes.append((self.active_processes[download_info["id"]], download_info["id"]))
+        for proc, running_job_id in processes:
+            logging.info(f"Stopping SpotDL process group {proc.pid}")
+            threading.Thread(target=self._terminate_process, args=(proc, running_job_id), daemon=True).start()
+
+        # Nobody wants the rest of a collection whose running track was cancelled
+        for parent_id in abandoned_parents:
+            pending_ids = {child_info["id"] for child_info in self.job_store.get_children(parent_id) if child_info["status"] == "Pending..." and not self.coalescer.is_wanted(child_info)}
+            self._cancel_pending_jobs(pending_ids)
+        return len(cancelled_ids)
+
+    def cancel_pending_downloads(self, requester=None):
+        job_ids = None
+        if requester is not None:
+            # Only the jobs the client held can lose their last request, with the tracks and the jobs they joined
+            released_ids = set(self.coalescer.release(requester))
+            related_ids = released_ids | set(self.coalescer.get_primary_ids(released_ids))
+            job_ids = {download_info["id"] for download_info in self.job_store.get_pending_jobs(related_ids) if not self.coalescer.is_wanted(download_info)}
+        return self._cancel_pending_jobs(job_ids)
+
+    def _cancel_pending_jobs(self, job_ids=None):
+        # Queued entries are skipped when dequeued, nothing has to be drained here
+        self.scheduler.clear_pending(job_ids)
+        cancelled_jobs = self.job_store.cancel_pending_jobs(job_ids)
+        logging.info(f"Cancelled {len(cancelled_jobs)} pending downloads")
+        for download_info in cancelled_jobs:
+            self._emit_update(download_info)
+            self._sync_followers(download_info, self.coalescer.finish(download_info))
+        for parent_id in {download_info.get("parent_id") for download_info in cancelled_jobs}:
+            self._update_parent(parent_id)
+        return len(cancelled_jobs)
+
+    def _is_cancelled(self, download_info):
+        if download_info.get("status") == "Cancelled":
+            return True
+        stored_job = self.job_store.get_job(download_info["id"])
+        return stored_job is not None and stored_job.get("status") == "Cancelled"
+
+    def resume_unfinished_jobs(self, include_own=True):
+        for download_info in self.job_store.claim_unfinished_jobs(include_own):
+            logging.info(f"Resuming Download: {download_info['url']} (was {download_info['status']})")
+            download_info["status"] = "Pending..."
+            self.job_store.update_job(download_info)
+            self._emit_update(download_info)
+            existing_job = self.coalescer.find_active(download_info["url"])
+            if existing_job is not None:
+                self.coalescer.add_follower(existing_job, download_info)
                 continue
+            self.coalescer.register(download_info)
+            self.download_queue.put((download_info["url"], download_info))
+
+    def retry_failed_jobs(self, requester=None):
+        # Failed tracks of a collection reopen it, other failed jobs run again as a whole
+        failed_jobs = self.job_store.get_failed_jobs()
+        parent_ids = {download_info["parent_id"] for download_info in failed_jobs if download_info.get("parent_id")}
+        retried_jobs = [download_info for download_info in failed_jobs if download_info["id"] not in parent_ids]
+        reopened_parents = []
+        for parent_id in parent_ids:
+            parent_info = self.job_store.get_job(parent_id)
+            if parent_info is not None and parent_info["status"] not in self.job_store.unfinished_statuses:
+                parent_info["status"] = "Downloading..."
+                reopened_parents.append(parent_info)
+        for download_info in retried_jobs:
+            download_info["status"] = "Pending..."
+            download_info["error"] = None
+            self.retry_counts.pop(download_info["id"], None)
+        self.job_store.update_jobs(reopened_parents + retried_jobs)
+        logging.info(f"Retrying {len(retried_jobs)} failed downloads, {len(reopened_parents)} collections reopened")
 
-            download_path = self._prepare_download_path(download_info)
+        for parent_info in reopened_parents:
+            self.coalescer.register(parent_info, requester)
+        for download_info in retried_jobs:
+            existing_job = self.coalescer.find_active(download_info["url"])
+            self.coalescer.register(download_info, requester)
+            if existing_job is not None:
+                self.coalescer.add_follower(existing_job, download_info)
+            else:
+                self.download_queue.put((download_info["url"], download_info))
+        self.status_broadcaster.jobs_changed(reopened_parents + retried_jobs)
+        for parent_info in reopened_parents:
+            self._update_parent(parent_info["id"])
+        return len(retried_jobs)
 
-            download_info["status"] = "Downloading..."
-            self.download_history[url] = download_info
-            self._emit_update()
+    def start_workers(self):
+        if self.config.spotdl_mode == "inprocess":
+            self.spotdl_pool = SpotdlWorkerPool(self.config)
+        self.retry_policy.start()
+        logging.info(f"Starting {self.config.max_concurrent_downloads} download workers")
+        for worker_number in range(self.config.max_concurrent_downloads):
+            worker_thread = threading.Thread(target=self._download_worker, name=f"download-worker-{worker_number}", daemon=True)
+            worker_thread.start()
 
+    def _download_worker(self):
+        while True:
+            group, url, download_info = self.scheduler.next_job()
             try:
-                logging.info(f"Downloading: {url}")
-                command = self._build_spotdl_command(url, download_info)
-                logging.info(f"SpotDL command: {command} (cwd={download_path})")
-                returncode = self._execute_download(command, cwd=download_path)
-                if returncode != 0:
-                    logging.error(f"SpotDL exit code {returncode}")
-                    download_info["status"] = "Failed"
-                else:
-                    download_info["status"] = "Complete"
+                self._process_download(url, download_info)
             except Exception as e:
-                logging.error(f"Process Downloads Error: {e}")
-                download_info["status"] = "Error"
+                # A job that breaks outside spotDL must not take its worker thread with it
+                logging.error(f"Download worker error for {url}: {e}")
+                self._fail_job(download_info, e)
+            finally:
+                self.scheduler.release(group)
+
+    def _fail_job(self, download_info, error):
+        try:
+            with self.process_lock:
+                self.running_jobs.pop(download_info["id"], None)
+                self.cancelled_jobs.discard(download_info["id"])
+            metrics.download_failures_total.inc(kind="transient")
+            download_info["status"] = "Error"
+            download_info["error"] = f"transient: {error}"
+            self.job_store.update_job(download_info)
+            self._emit_update(download_info)
+            self._sync_followers(download_info, self.coalescer.finish(download_info))
+            self._update_parent(download_info.get("parent_id"))
+        except Exception as e:
+            logging.error(f"Could not mark job {download_info.get('id')} as failed: {e}")
+
+    def _fan_out(self, download_info):
+        child_jobs = self.job_store.get_children(download_info["id"])
+        # A resumed collection already has its children, they are resumed on their own
+        if not child_jobs:
+            collection_tracks = self._get_collection_tracks(download_info)
+            if not collection_tracks:
+                return False
+            child_jobs = self._add_child_jobs(download_info, collection_tracks)
+            pending_count = sum(1 for child_job in child_jobs if child_job["status"] == "Pending...")
+            logging.info(f"Expanded {download_info['url']} into {len(child_jobs)} tracks, {len(child_jobs) - pending_count} already downloaded")
+
+        download_info["status"] = "Downloading..."
+        self.job_store.update_job(download_info)
+        self._emit_update(download_info)
+        self._update_parent(download_info["id"])
+        return True
+
+    def _add_child_jobs(self, download_info, tracks):
+        child_jobs = self.job_store.add_jobs(
+            [
+                {
+                    "url": track["url"],
+                    "type": "track",
+                    "name": track["name"],
+                    "artist": track["artist"],
+                    "status": "Already Downloaded" if track["path"] else "Pending...",
+                    "parent_id": download_info["id"],
+                    "file_path": track["path"],
+                    "priority": download_info.get("priority") if download_info.get("priority") is not None else self.scheduler.get_default_priority(download_info),
+                }
+                for track in tracks
+            ]
+        )
+        for child_job in child_jobs:
+            if child_job["status"] != "Pending...":
+                continue
+            existing_job = self.coalescer.find_active(child_job["url"])
+            if existing_job is not None:
+                self.coalescer.add_follower(existing_job, child_job)
+                continue
+            self.coalescer.register(child_job)
+            self.download_queue.put((child_job["url"], child_job))
+        return child_jobs
 
-            self.download_history[url] = download_info
-            self._emit_update()
+    def add_playlist_update(self, data, tracks, requester=None):
+        # A changed watched playlist, only tracks missing from the library are fetched and the rest keep their place in the M3U
+        existing_job = self.coalescer.find_active(data["url"])
+        if existing_job is not None:
+            logging.info(f"Playlist {data['url']} is already being downloaded in job {existing_job['id']}")
+            return None
+        # Compared against the library rather than the last snapshot, so a track that failed before is tried again
+        self._match_library_tracks(tracks)
+        download_info = {
+            "url": data["url"],
+            "type": "playlist",
+            "name": data.get("name"),
+            "artist": data.get("artist"),
+            "status": "Downloading...",
+            "priority": self._get_requested_priority(data),
+        }
+        self.job_store.add_jobs([download_info])
+        self.coalescer.register(download_info, requester)
+        child_jobs = self._add_child_jobs(download_info, tracks)
+        pending_count = sum(1 for child_job in child_jobs if child_job["status"] == "Pending...")
+        logging.info(f"Updating playlist {data['url']}: {pending_count} missing tracks to download, {len(child_jobs) - pending_count} in the library")
+        self.status_broadcaster.jobs_changed([download_info])
+        # Writes the M3U once the new tracks are done, or right away when all of them were already there
+        self._update_parent(download_info["id"])
+        return download_info
+
+    def _get_collection_status(self, status_counts):
+        if status_counts.get("Cancelled"):
+            return "Cancelled"
+        if status_counts.get("Failed") or status_counts.get("Error"):
+            return "Failed"
+        if status_counts.get("Complete"):
+            return "Complete"
+        return "Already Downloaded"
+
+    def _update_parent(self, parent_id):
+        if parent_id is None:
+            return
+        with self.parent_lock:
+            parent_info = self.job_store.get_job(parent_id)
+            if parent_info is None or parent_info["status"] not in self.job_store.unfinished_statuses:
+                return
+            child_jobs = self.job_store.get_children(parent_id)
+            progress = self.collection_progress.setdefault(parent_id, CollectionProgress(parent_id))
+            progress.update(child_jobs)
+            self.socketio.emit("download_progress", progress.to_dict())
+            if progress.completed < progress.total:
+                return
+
+            del self.collection_progress[parent_id]
+            parent_info["status"] = self._get_collection_status(progress.counts)
+            logging.info(f"Collection finished: {parent_info['url']} ({progress.counts})")
+            if parent_info["type"] == "playlist" and parent_info["status"] != "Cancelled":
+                try:
+                    self._write_playlist_m3u(self._prepare_download_path(parent_info), parent_info, child_jobs)
+                except Exception as e:
+                    logging.error(f"Failed to write playlist M3U for {parent_info['url']}: {e}")
+            self.job_store.update_job(parent_info)
+            self._emit_update(parent_info)
+        self._sync_followers(parent_info, self.coalescer.finish(parent_info))
+
+    def _should_retry(self, download_info, failure_class):
+        # A song without a match fails the same way every time, only network errors and throttling are retried
+        if download_info["status"] not in self.job_store.failed_statuses or failure_class == "permanent":
+            self.retry_counts.pop(download_info["id"], None)
+            return False
+        attempts = self.retry_counts.get(download_info["id"], 0)
+        if attempts >= self.config.download_retries:
+            self.retry_counts.pop(download_info["id"], None)
+            return False
+        self.retry_counts[download_info["id"]] = attempts + 1
+        return True
+
+    def _process_download(self, url, download_info):
+        if self._is_cancelled(download_info):
+            self._finish_cancelled(download_info)
+            return
+
+        download_path = self._prepare_download_path(download_info)
+
+        if download_info.get("type") in ("album", "playlist") and self._fan_out(download_info):
+            return
+
+        # Starting spotDL on a full volume only produces failed runs, the job frees its slot and is checked again later
+        if not self.admission_controller.check_admission(download_path):
+            self.retry_policy.schedule(url, download_info, self.config.admission_check_interval)
+            return
+
+        # While the provider throttles us, jobs wait outside the worker slots
+        cooldown_delay = self.retry_policy.get_cooldown_delay()
+        if cooldown_delay:
+            logging.info(f"Rate limit cooldown, starting {url} in {cooldown_delay:.0f}s")
+            self.retry_policy.schedule(url, download_info, cooldown_delay)
+            return
+
+        download_info["status"] = "Downloading..."
+        download_info["error"] = None
+        self.job_store.update_job(download_info)
+        self._emit_update(download_info)
+        self._sync_followers(download_info, self.coalescer.get_followers(download_info))
+        with self.process_lock:
+            self.running_jobs[download_info["id"]] = download_info
+
+        started = time.monotonic()
+        failure_class = None
+        native_files = []
+        try:
+            logging.info(f"Downloading: {url}")
+            command = self._build_spotdl_command(url, download_info)
+            logging.info(f"SpotDL command: {command} (cwd={download_path})")
+            returncode, progress = self._execute_download(command, download_path, download_info)
+            if download_info["id"] in self.cancelled_jobs:
+                logging.info(f"Download cancelled: {url}")
+                download_info["status"] = "Cancelled"
+                self._cleanup_partial_files(download_path, download_info, progress)
+            elif returncode != 0 or (download_info["type"] == "track" and progress.failed and not progress.downloaded and not progress.skipped):
+                # spotDL can exit 0 after failing every song it was given
+                failure_class, failure_reason = classify_failure(returncode, list(progress.output_tail))
+                logging.error(f"SpotDL failed with exit code {returncode} ({failure_class}): {failure_reason}")
+                download_info["status"] = "Failed"
+                download_info["error"] = f"{failure_class}: {failure_reason}"
+            else:
+                if self.post_processor.is_enabled() and self.post_processor.needs_processing():
+                    native_files = self._get_native_files(download_path, download_info, progress)
+                if not native_files:
+                    download_info["status"] = "Complete"
+                    download_format = self.post_processor.get_download_format()
+                    self._complete_download(url, download_info, self._find_written_files(download_path, download_info, download_format, progress.started_wall - 1))
+        except Exception as e:
+            logging.error(f"Process Downloads Error: {e}")
+            download_info["status"] = "Error"
+            failure_class = "transient"
+            download_info["error"] = f"{failure_class}: {e}"
+        finally:
+            with self.process_lock:
+                self.running_jobs.pop(download_info["id"], None)
+                self.cancelled_jobs.discard(download_info["id"])
+
+        if native_files:
+            # ffmpeg runs without the download slot, the next download starts while these files are converted
+            download_info["status"] = "Processing..."
+            self.job_store.update_job(download_info)
+            self._emit_update(download_info)
+            self._sync_followers(download_info, self.coalescer.get_followers(download_info))
+            self.retry_policy.record_success()
+            with self.process_lock:
+                self.processing_files.update(native_files)
+            self.post_processor.submit(native_files, lambda results: self._finish_post_processing(url, download_path, download_info, started, results))
+            return
+        self._finish_download(url, download_info, started, failure_class)
+
+    def _get_native_files(self, download_path, download_info, progress):
+        # Native files left behind by a restart are converted as well, unless they share a container with the final files
+        download_format = self.post_processor.get_download_format()
+        since = progress.started_wall - 1 if download_format == self.config.format else None
+        return self._find_written_files(download_path, download_info, download_format, since)
+
+    def _read_track_id(self, file_path):
+        try:
+            return read_track_tags(file_path)[0]
+        except Exception:
+            return None
+
+    def _find_written_files(self, download_path, download_info, extension, since=None):
+        # spotDL's log names songs by their first artist, its files use all of them and are sanitized, so they are found by their tags
+        track_id = parse_spotify_url(download_info["url"])[1] if download_info.get("type") == "track" else None
+        with self.process_lock:
+            other_ids = {parse_spotify_url(running_info["url"])[1] for job_id, running_info in self.running_jobs.items() if job_id != download_info.get("id")}
+            processing_files = set(self.processing_files)
+        written_files = []
+        try:
+            with os.scandir(download_path) as entries:
+                for entry in entries:
+                    if not entry.name.endswith(f".{extension}") or ".temp." in entry.name or entry.path in processing_files or not entry.is_file():
+                        continue
+                    # Moving a file into place keeps yt-dlp's mtime, the change time is always that of the move
+                    if since is not None and max(entry.stat().st_mtime, entry.stat().st_ctime) < since:
+                        continue
+                    file_track_id = self._read_track_id(entry.path)
+                    # Jobs share the output folder, a collection leaves the songs of other running jobs alone
+                    if file_track_id is None or (file_track_id != track_id if track_id else file_track_id in other_ids):
+                        continue
+                    written_files.append(entry.path)
+        except OSError as e:
+            logging.warning(f"Could not list downloaded files in {download_path}: {e}")
+        return sorted(written_files)
+
+    def _complete_download(self, url, download_info, downloaded_files):
+        self.playlist_manager.add_downloaded_files(downloaded_files)
+        self.library_index.add_files(downloaded_files)
+        self.spotify_service.suggest_index.add_download(download_info)
+        self._record_bytes_written(download_info, downloaded_files)
+        if download_info["type"] == "track" and downloaded_files:
+            download_info["file_path"] = downloaded_files[0]
+        self.media_refresh_scheduler.mark_dirty(url)
+
+    def _finish_post_processing(self, url, download_path, download_info, started, results):
+        failure_class = None
+        with self.process_lock:
+            self.processing_files.difference_update(source_path for source_path, target_path, error in results)
+        try:
+            processed_files = [target_path for source_path, target_path, error in results if target_path]
+            errors = [error for source_path, target_path, error in results if error]
+            if errors:
+                failure_class = "transient"
+                download_info["status"] = "Failed"
+                download_info["error"] = f"{failure_class}: post-processing failed: {errors[0]}"
+            else:
+                download_info["status"] = "Complete"
+            if processed_files:
+                self._complete_download(url, download_info, processed_files)
+            if download_info["type"] == "playlist":
+                self._rewrite_playlist_m3u(download_path, download_info)
+        except Exception as e:
+            logging.error(f"Post-processing Error: {e}")
+            download_info["status"] = "Error"
+            failure_class = "transient"
+            download_info["error"] = f"{failure_class}: {e}"
+        self._finish_download(url, download_info, started, failure_class)
+
+    def _rewrite_playlist_m3u(self, download_path, download_info):
+        # spotDL listed the native files in the playlist it wrote
+        m3u_path = os.path.join(download_path, self._get_m3u_name(download_info))
+        if not os.path.isfile(m3u_path):
+            return
+        with open(m3u_path, encoding="utf-8") as m3u_file:
+            lines = m3u_file.read().splitlines()
+        native_suffix = f".{self.post_processor.get_download_format()}"
+        lines = [line[: -len(native_suffix)] + f".{self.config.format}" if line.endswith(native_suffix) else line for line in lines]
+        write_file_atomically(m3u_path, "\n".join(lines) + "\n")
+
+    def _finish_download(self, url, download_info, started, failure_class):
+        metrics.job_duration_seconds.observe(time.monotonic() - started, type=download_info["type"], status=download_info["status"])
+
+        if failure_class is not None:
+            metrics.download_failures_total.inc(kind=failure_class)
+        if failure_class == "rate_limited":
+            self.retry_policy.start_cooldown()
+        elif download_info["status"] == "Complete":
+            self.retry_policy.record_success()
+
+        if self._should_retry(download_info, failure_class):
+            attempt = self.retry_counts[download_info["id"]]
+            delay = max(self.retry_policy.get_delay(attempt - 1), self.retry_policy.get_cooldown_delay())
+            logging.info(f"Retrying {url} in {delay:.0f}s (attempt {attempt + 1})")
+            download_info["status"] = "Pending..."
+            self.job_store.update_job(download_info)
+            self._emit_update(download_info)
+            self._sync_followers(download_info, self.coalescer.get_followers(download_info))
+            # The worker slot is free for other jobs during the backoff
+            self.retry_policy.schedule(url, download_info, delay)
+            return
+
+        self.job_store.update_job(download_info)
+        self._emit_update(download_info)
+        self._sync_followers(download_info, self.coalescer.finish(download_info))
+        self._update_parent(download_info.get("parent_id"))
+
+    def _finish_cancelled(self, download_info):
+        self._sync_followers(download_info, self.coalescer.finish(download_info))
+        self._update_parent(download_info.get("parent_id"))
+
+    def _record_bytes_written(self, download_info, downloaded_files):
+        written = 0
+        for file_path in downloaded_files:
+            try:
+                written += os.path.getsize(file_path)
+            except OSError:
+                pass
+        metrics.job_bytes.observe(written, type=download_info["type"])
+        metrics.bytes_written_total.inc(written)
+
+    def process_downloads(self):
+        if self.config.resume_unfinished_jobs:
+            self.resume_unfinished_jobs()
+        self.start_workers()
+
+        while True:
+            url, download_info = self.download_queue.get()
+            if not self._is_cancelled(download_info):
+                self.scheduler.submit(url, download_info, session=self.coalescer.get_owner(download_info))
             self.download_queue.task_done()
@@ -0,0 +1,163 @@
+import os
+import re
+import logging
+import requests
+import threading
+from flask import Response
+from collections import OrderedDict
+from requests.adapters import HTTPAdapter
+from services import metrics
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+image_id_pattern = re.compile(r"^[A-Za-z0-9]{16,64}$")
+image_signatures = ((b"\xff\xd8\xff", "image/jpeg"), (b"\x89PNG", "image/png"), (b"GIF8", "image/gif"))
+
+
+def get_image_type(data):
+    for signature, content_type in image_signatures:
+        if data.startswith(signature):
+            return content_type
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+def select_image(images, min_width):
+    # Spotify lists each picture in several sizes, the smallest that still fills a card is enough
+    sized_images = [image for image in images if image.get("url")]
+    if not sized_images:
+        return None
+    large_enough = [image for image in sized_images if (image.get("width") or 0) >= min_width]
+    if large_enough:
+        return min(large_enough, key=lambda image: image["width"])["url"]
+    return max(sized_images, key=lambda image: image.get("width") or 0)["url"]
+
+
+class ImageCache:
+    def __init__(self, config):
+        self.config = config
+        self.lock = threading.Lock()
+        # Image id -> file size, least recently served first
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.fetches = {}
+        self.session = None
+        os.makedirs(self.config.image_cache_path, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        cached_files = []
+        with os.scandir(self.config.image_cache_path) as entries:
+            for entry in entries:
+                if entry.is_file() and image_id_pattern.match(entry.name):
+                    file_stat = entry.stat()
+                    cached_files.append((file_stat.st_mtime, entry.name, file_stat.st_size))
+        for _, image_id, size in sorted(cached_files):
+            self.entries[image_id] = size
+            self.total_bytes += size
+        logging.info(f"Loaded image cache with {len(self.entries)} images, {self.total_bytes // 1024} KiB")
+
+    def get_session(self):
+        with self.lock:
+            if self.session is None:
+                self.session = requests.Session()
+                self.session.mount("https://", HTTPAdapter(pool_maxsize=self.config.image_pool_size))
+                self.session.mount("http://", HTTPAdapter(pool_maxsize=self.config.image_pool_size))
+            return self.session
+
+    def get_proxy_url(self, image_url):
+        # Only Spotify CDN pictures are proxied, their last path segment is a content hash
+        if not image_url or not image_url.startswith(self.config.image_cdn_url):
+            return image_url
+        image_id = image_url[len(self.config.image_cdn_url) :]
+        if not image_id_pattern.match(image_id):
+            return image_url
+        return f"/img/{image_id}"
+
+    def get_path(self, image_id):
+        return os.path.join(self.config.image_cache_path, image_id)
+
+    def get_response(self, image_id, if_none_match):
+        # The id is a hash of the picture, so it never changes and the browser may keep it for good
+        if if_none_match.contains(image_id):
+            response = Response(status=304)
+        else:
+            data = self.get(image_id)
+            if data is None:
+                return Response(status=404)
+            response = Response(data, mimetype=get_image_type(data))
+        response.set_etag(image_id)
+        response.cache_control.public = True
+        response.cache_control.max_age = 31536000
+        response.cache_control.immutable = True
+        return response
+
+    def get(self, image_id):
+        if not image_id_pattern.match(image_id):
+            return None
+        with self.lock:
+            cached = image_id in self.entries
+            if cached:
+                self.entries.move_to_end(image_id)
+        if cached:
+            try:
+                with open(self.get_path(image_id), "rb") as image_file:
+                    data = image_file.read()
+                # The file time keeps the serve order across restarts
+                os.utime(self.get_path(image_id))
+                metrics.image_cache_total.inc(result="hit")
+                return data
+            except OSError:
+                self._forget(image_id)
+        return self._fetch(image_id)
+
+    def _fetch(self, image_id):
+        # Browsers ask for the same picture from every open tab at once, one download serves them all
+        with self.lock:
+            fetch = self.fetches.get(image_id)
+            owner = fetch is None
+            if owner:
+                fetch = self.fetches[image_id] = {"done": threading.Event(), "data": None}
+        if not owner:
+            fetch["done"].wait(self.config.image_fetch_timeout)
+            return fetch["data"]
+        try:
+            response = self.get_session().get(self.config.image_cdn_url + image_id, timeout=self.config.image_fetch_timeout)
+            response.raise_for_status()
+            if get_image_type(response.content) is None:
+                raise ValueError("response is not an image")
+            fetch["data"] = response.content
+            metrics.image_cache_total.inc(result="miss")
+            self._store(image_id, response.content)
+        except Exception as e:
+            metrics.image_cache_total.inc(result="error")
+            logging.warning(f"Image {image_id} could not be fetched: {e}")
+        finally:
+            with self.lock:
+                del self.fetches[image_id]
+            fetch["done"].set()
+        return fetch["data"]
+
+    def _store(self, image_id, data):
+        temp_path = self.get_path(image_id) + ".tmp"
+        with open(temp_path, "wb") as image_file:
+            image_file.write(data)
+        os.replace(temp_path, self.get_path(image_id))
+        evicted_ids = []
+        with self.lock:
+            self.total_bytes += len(data) - self.entries.pop(image_id, 0)
+            self.entries[image_id] = len(data)
+            while self.total_bytes > self.config.image_cache_size_mb * 1024 * 1024 and len(self.entries) > 1:
+                evicted_id, size = self.entries.popitem(last=False)
+                self.total_bytes -= size
+                evicted_ids.append(evicted_id)
+        for evicted_id in evicted_ids:
+            try:
+                os.remove(self.get_path(evicted_id))
+            except OSError:
+                pass
+
+    def _forget(self, image_id):
+        with self.lock:
+            self.total_bytes -= self.entries.pop(image_id, 0)
@@ -0,0 +1,204 @@
+import os
+import json
+import time
+import queue
+import sqlite3
+import logging
+import threading
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+
+class SqliteSubscription:
+    def __init__(self, broker, channels):
+        self.broker = broker
+        self.channels = tuple(channels)
+        self.cursor = broker.get_last_event_id()
+        self.buffered = []
+
+    def get(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.buffered:
+            rows = self.broker.read_events(self.channels, self.cursor)
+            if rows:
+                self.cursor = rows[-1][0]
+                self.buffered = [(channel, json.loads(payload)) for _, channel, payload in rows]
+                break
+            if deadline is not None and time.monotonic() >= deadline:
+                return None, None
+            time.sleep(self.broker.config.broker_poll_interval)
+        return self.buffered.pop(0)
+
+    def close(self):
+        self.buffered = []
+
+
+class SqliteJobBroker:
+    # Queues and channels in one SQLite file, every process on the host or a shared volume can use it
+    def __init__(self, config):
+        self.config = config
+        self.lock = threading.Lock()
+        broker_dir = os.path.dirname(self.config.broker_path)
+        if broker_dir:
+            os.makedirs(broker_dir, exist_ok=True)
+        self.connection = sqlite3.connect(self.config.broker_path, check_same_thread=False, isolation_level=None, timeout=30)
+        self.last_prune = 0
+        with self.lock:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS queue_messages (id INTEGER PRIMARY KEY AUTOINCREMENT, queue TEXT NOT NULL, payload TEXT NOT NULL)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS idx_queue_messages_queue ON queue_messages (queue, id)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS events (id INTEGER PRIMARY KEY AUTOINCREMENT, channel TEXT NOT NULL, payload TEXT NOT NULL, created_at REAL NOT NULL)")
+        logging.info(f"Job broker ready at: {self.config.broker_path}")
+
+    def put(self, queue_name, message):
+        with self.lock:
+            self.connection.execute("INSERT INTO queue_messages (queue, payload) VALUES (?, ?)", (queue_name, json.dumps(message)))
+
+    def get(self, queue_name, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self.lock:
+                # The write lock is taken before reading, so two consumers never get the same message
+                self.connection.execute("BEGIN IMMEDIATE")
+                try:
+                    row = self.connection.execute("SELECT id, payload FROM queue_messages WHERE queue = ? ORDER BY id LIMIT 1", (queue_name,)).fetchone()
+                    if row is not None:
+                        self.connection.execute("DELETE FROM queue_messages WHERE id = ?", (row[0],))
+                    self.connection.execute("COMMIT")
+                except Exception:
+                    self.connection.execute("ROLLBACK")
+                    raise
+            if row is not None:
+                return json.loads(row[1])
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(self.config.broker_poll_interval)
+
+    def publish(self, channel, message):
+        now = time.time()
+        with self.lock:
+            self.connection.execute("INSERT INTO events (channel, payload, created_at) VALUES (?, ?, ?)", (channel, json.dumps(message), now))
+            # Subscribers only read what was published after they joined, old events are dropped
+            if now - self.last_prune > 60:
+                self.connection.execute("DELETE FROM events WHERE created_at < ?", (now - self.config.broker_event_retention,))
+                self.last_prune = now
+
+    def subscribe(self, *channels):
+        return SqliteSubscription(self, channels)
+
+    def get_last_event_id(self):
+        with self.lock:
+            return self.connection.execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()[0]
+
+    def read_events(self, channels, after_id):
+        with self.lock:
+            return self.connection.execute(
+                f"SELECT id, channel, payload FROM events WHERE id > ? AND channel IN ({', '.join('?' for _ in channels)}) ORDER BY id LIMIT 500",
+                (after_id, *channels),
+            ).fetchall()
+
+
+class RedisSubscription:
+    def __init__(self, client, channels):
+        self.pubsub = client.pubsub(ignore_subscribe_messages=True)
+        self.pubsub.subscribe(*(f"spotspot:{channel}" for channel in channels))
+
+    def get(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = 1.0 if deadline is None else max(0.0, deadline - time.monotonic())
+            message = self.pubsub.get_message(timeout=remaining)
+            if message is not None and message["type"] == "message":
+                channel = message["channel"].decode() if isinstance(message["channel"], bytes) else message["channel"]
+                return channel.split(":", 1)[1], json.loads(message["data"])
+            if deadline is not None and time.monotonic() >= deadline:
+                return None, None
+
+    def close(self):
+        self.pubsub.close()
+
+
+class RedisJobBroker:
+    # Lists for queues and pub/sub for channels, any server speaking the Redis protocol works
+    def __init__(self, config, client=None):
+        self.config = config
+        if client is None:
+            import redis
+
+            client = redis.Redis.from_url(self.config.broker_url)
+        self.client = client
+        logging.info(f"Job broker connected to: {self.config.broker_url}")
+
+    def put(self, queue_name, message):
+        self.client.rpush(f"spotspot:{queue_name}", json.dumps(message))
+
+    def get(self, queue_name, timeout=None):
+        # BLPOP waits forever on 0, a whole second is its smallest timeout
+        item = self.client.blpop([f"spotspot:{queue_name}"], timeout=0 if timeout is None else max(1, int(timeout)))
+        return json.loads(item[1]) if item else None
+
+    def publish(self, channel, message):
+        self.client.publish(f"spotspot:{channel}", json.dumps(message))
+
+    def subscribe(self, *channels):
+        return RedisSubscription(self.client, channels)
+
+
+class LocalSubscription:
+    def __init__(self, broker, channels):
+        self.broker = broker
+        self.channels = tuple(channels)
+        self.messages = queue.Queue()
+
+    def get(self, timeout=None):
+        try:
+            return self.messages.get(timeout=timeout)
+        except queue.Empty:
+            return None, None
+
+    def close(self):
+        with self.broker.lock:
+            if self in self.broker.subscriptions:
+                self.broker.subscriptions.remove(self)
+
+
+class LocalJobBroker:
+    # In-memory stand-in with the same interface, for a single process and for tests
+    def __init__(self, config=None):
+        self.config = config
+        self.lock = threading.Lock()
+        self.queues = {}
+        self.subscriptions = []
+
+    def put(self, queue_name, message):
+        with self.lock:
+            message_queue = self.queues.setdefault(queue_name, queue.Queue())
+        message_queue.put(json.loads(json.dumps(message)))
+
+    def get(self, queue_name, timeout=None):
+        with self.lock:
+            message_queue = self.queues.setdefault(queue_name, queue.Queue())
+        try:
+            return message_queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def publish(self, channel, message):
+        with self.lock:
+            subscriptions = [subscription for subscription in self.subscriptions if channel in subscription.channels]
+        for subscription in subscriptions:
+            subscription.messages.put((channel, json.loads(json.dumps(message))))
+
+    def subscribe(self, *channels):
+        subscription = LocalSubscription(self, channels)
+        with self.lock:
+            self.subscriptions.append(subscription)
+        return subscription
+
+
+def create_job_broker(config):
+    if config.broker_url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisJobBroker(config)
+    if config.broker_url == "memory://":
+        return LocalJobBroker(config)
+    return SqliteJobBroker(config)
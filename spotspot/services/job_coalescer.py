@@ -0,0 +1,103 @@
+import logging
+import threading
+from collections import Counter
+from services.library_index import parse_spotify_url
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+
+class JobCoalescer:
+    def __init__(self):
+        self.lock = threading.RLock()
+        # One unfinished job per Spotify URL does the work, later requests join it
+        self.active_jobs = {}
+        self.job_refs = {}
+        self.followers = {}
+
+    def get_url_key(self, url):
+        url_type, spotify_id = parse_spotify_url(url)
+        if spotify_id:
+            return f"{url_type}:{spotify_id}"
+        return (url or "").split("?", 1)[0].rstrip("/")
+
+    def find_active(self, url):
+        with self.lock:
+            return self.active_jobs.get(self.get_url_key(url))
+
+    def register(self, download_info, requester=None):
+        with self.lock:
+            self.active_jobs.setdefault(self.get_url_key(download_info["url"]), download_info)
+            if not download_info.get("parent_id"):
+                refs = self.job_refs.setdefault(download_info["id"], Counter())
+                if requester is not None:
+                    refs[requester] += 1
+
+    def attach(self, download_info, requester):
+        with self.lock:
+            if requester is not None:
+                self.job_refs.setdefault(download_info["id"], Counter())[requester] += 1
+
+    def has_job(self, job_id):
+        with self.lock:
+            return job_id in self.job_refs
+
+    def attach_id(self, job_id, requester):
+        with self.lock:
+            if job_id not in self.job_refs:
+                return False
+            if requester is not None:
+                self.job_refs[job_id][requester] += 1
+            return True
+
+    def add_follower(self, primary_info, follower_info):
+        with self.lock:
+            self.followers.setdefault(primary_info["id"], []).append(follower_info)
+
+    def get_followers(self, download_info):
+        with self.lock:
+            return list(self.followers.get(download_info["id"], []))
+
+    def remove_follower(self, primary_info, follower_info):
+        with self.lock:
+            followers = self.followers.get(primary_info["id"])
+            if followers:
+                self.followers[primary_info["id"]] = [other_info for other_info in followers if other_info["id"] != follower_info["id"]]
+
+    def finish(self, download_info):
+        with self.lock:
+            url_key = self.get_url_key(download_info["url"])
+            active_job = self.active_jobs.get(url_key)
+            if active_job is not None and active_job["id"] == download_info["id"]:
+                del self.active_jobs[url_key]
+            self.job_refs.pop(download_info["id"], None)
+            return self.followers.pop(download_info["id"], [])
+
+    def release(self, requester, job_ids=None):
+        released_ids = []
+        with self.lock:
+            for job_id in self.job_refs if job_ids is None else job_ids:
+                refs = self.job_refs.get(job_id)
+                if refs is not None and refs.pop(requester, None) is not None:
+                    released_ids.append(job_id)
+        return released_ids
+
+    def get_primary_ids(self, job_ids):
+        # The jobs that run the work for these joined jobs
+        with self.lock:
+            return [primary_id for primary_id, followers in self.followers.items() if any(follower_info["id"] in job_ids for follower_info in followers)]
+
+    def get_owner(self, download_info):
+        # The client that asked first, a collection's tracks belong to whoever asked for the collection
+        with self.lock:
+            refs = self.job_refs.get(download_info["id"]) or self.job_refs.get(download_info.get("parent_id")) or {}
+            return next(iter(refs), None)
+
+    def is_wanted(self, download_info):
+        # A job lives on while any request holds it: its own, its collection's or one that joined it
+        with self.lock:
+            if self.job_refs.get(download_info["id"]):
+                return True
+            parent_id = download_info.get("parent_id")
+            if parent_id is not None and self.job_refs.get(parent_id):
+                return True
+            return any(self.is_wanted(follower_info) for follower_info in self.followers.get(download_info["id"], []))
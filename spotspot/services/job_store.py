@@ -0,0 +1,315 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+
+class JobStore:
+    unfinished_statuses = ("Pending...", "Downloading...", "Processing...")
+    failed_statuses = ("Failed", "Error")
+
+    def __init__(self, config):
+        self.config = config
+        self.lock = threading.RLock()
+        self.recent_jobs = OrderedDict()
+        self.version = 0
+        # Web and download processes of a split deployment write the same database
+        self.shared = self.config.spotspot_role != "all"
+
+        database_dir = os.path.dirname(self.config.database_path)
+        if database_dir:
+            os.makedirs(database_dir, exist_ok=True)
+        self.connection = sqlite3.connect(self.config.database_path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self._setup_database()
+        # A web process never writes jobs, a cache there would only go stale
+        if self.config.spotspot_role != "web":
+            self._load_recent_jobs()
+
+    def _setup_database(self):
+        with self.lock:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            with self.connection:
+                self.connection.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS jobs (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        url TEXT NOT NULL,
+                        type TEXT,
+                        name TEXT,
+                        artist TEXT,
+                        status TEXT NOT NULL,
+                        created_at REAL NOT NULL,
+                        updated_at REAL NOT NULL
+                    )
+                    """
+                )
+                self._ensure_column("version", "INTEGER NOT NULL DEFAULT 0")
+                self._ensure_column("parent_id", "INTEGER")
+                self._ensure_column("file_path", "TEXT")
+                self._ensure_column("priority", "INTEGER")
+                self._ensure_column("error", "TEXT")
+                # The download node that runs the job, a restarting node resumes only its own jobs and those of stopped nodes
+                self._ensure_column("node_id", "TEXT")
+                self.connection.execute("CREATE INDEX IF NOT EXISTS idx_jobs_url ON jobs(url)")
+                self.connection.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status)")
+                self.connection.execute("CREATE INDEX IF NOT EXISTS idx_jobs_version ON jobs(version)")
+                self.connection.execute("CREATE INDEX IF NOT EXISTS idx_jobs_parent_id ON jobs(parent_id)")
+            self.version = self.connection.execute("SELECT COALESCE(MAX(version), 0) FROM jobs").fetchone()[0]
+            if self.shared:
+                with self.connection:
+                    self.connection.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+                    self.connection.execute("CREATE TABLE IF NOT EXISTS job_claims (url_key TEXT PRIMARY KEY, job_id INTEGER NOT NULL)")
+                    self.connection.execute("CREATE TABLE IF NOT EXISTS nodes (node_id TEXT PRIMARY KEY, seen_at REAL NOT NULL)")
+                    self.connection.execute("INSERT OR IGNORE INTO counters (name, value) VALUES ('version', ?)", (self.version,))
+        logging.info(f"Job store ready at: {self.config.database_path}")
+
+    def _ensure_column(self, column, definition):
+        columns = [row["name"] for row in self.connection.execute("PRAGMA table_info(jobs)")]
+        if column not in columns:
+            self.connection.execute(f"ALTER TABLE jobs ADD COLUMN {column} {definition}")
+
+    def _next_version(self):
+        if self.shared:
+            # Runs inside the caller's transaction, the counter update locks the database until it commits
+            self.connection.execute("UPDATE counters SET value = value + 1 WHERE name = 'version'")
+            self.version = self.connection.execute("SELECT value FROM counters WHERE name = 'version'").fetchone()[0]
+        else:
+            self.version += 1
+        return self.version
+
+    def get_version(self):
+        if self.shared:
+            with self.lock:
+                return self.connection.execute("SELECT value FROM counters WHERE name = 'version'").fetchone()[0]
+        return self.version
+
+    def _load_recent_jobs(self):
+        for download_info in self.get_history(limit=self.config.history_memory_limit):
+            self._cache_job(download_info)
+
+    def _row_to_job(self, row):
+        return self.recent_jobs.get(row["id"]) or {
+            "id": row["id"],
+            "url": row["url"],
+            "type": row["type"],
+            "name": row["name"],
+            "artist": row["artist"],
+            "status": row["status"],
+            "version": row["version"],
+            "parent_id": row["parent_id"],
+            "file_path": row["file_path"],
+            "priority": row["priority"],
+            "error": row["error"],
+        }
+
+    def _cache_job(self, download_info):
+        self.recent_jobs[download_info["id"]] = download_info
+        while len(self.recent_jobs) > self.config.history_memory_limit:
+            self.recent_jobs.popitem(last=False)
+
+    def add_job(self, download_info):
+        return self.add_jobs([download_info])[0]
+
+    def add_jobs(self, download_infos):
+        # A whole batch is written in one transaction, children of a collection are kept out of the history cache
+        now = time.time()
+        with self.lock, self.connection:
+            for download_info in download_infos:
+                self._insert_job(download_info, now)
+        return download_infos
+
+    def add_claimed_jobs(self, download_infos, url_keys):
+        # Nodes sharing the database run each URL once, a URL claimed by an unfinished job returns that job instead
+        if not self.shared:
+            return self.add_jobs(download_infos)
+        now = time.time()
+        stored_jobs = []
+        with self.lock:
+            # The write lock is taken before the claims are read, two nodes cannot both miss them
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                for download_info, url_key in zip(download_infos, url_keys):
+                    if url_key is not None:
+                        row = self.connection.execute(
+                            f"SELECT jobs.* FROM job_claims JOIN jobs ON jobs.id = job_claims.job_id WHERE job_claims.url_key = ? AND jobs.status IN ({', '.join('?' for _ in self.unfinished_statuses)})",
+                            (url_key, *self.unfinished_statuses),
+                        ).fetchone()
+                        if row is not None:
+                            stored_jobs.append(self._row_to_job(row))
+                            continue
+                    self._insert_job(download_info, now)
+                    if url_key is not None:
+                        self.connection.execute("INSERT OR REPLACE INTO job_claims (url_key, job_id) VALUES (?, ?)", (url_key, download_info["id"]))
+                    stored_jobs.append(download_info)
+                self.connection.execute("COMMIT")
+            except Exception:
+                self.connection.execute("ROLLBACK")
+                raise
+        return stored_jobs
+
+    def _insert_job(self, download_info, now):
+        download_info["version"] = self._next_version()
+        cursor = self.connection.execute(
+            "INSERT INTO jobs (url, type, name, artist, status, version, parent_id, file_path, priority, node_id, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                download_info.get("url"),
+                download_info.get("type"),
+                download_info.get("name"),
+                download_info.get("artist"),
+                download_info.get("status"),
+                download_info["version"],
+                download_info.get("parent_id"),
+                download_info.get("file_path"),
+                download_info.get("priority"),
+                self.config.node_id,
+                now,
+                now,
+            ),
+        )
+        download_info["id"] = cursor.lastrowid
+        if not download_info.get("parent_id"):
+            self._cache_job(download_info)
+
+    def update_job(self, download_info):
+        self.update_jobs([download_info])
+
+    def update_jobs(self, download_infos):
+        now = time.time()
+        with self.lock, self.connection:
+            for download_info in download_infos:
+                download_info["version"] = self._next_version()
+                if download_info["id"] in self.recent_jobs:
+                    self.recent_jobs[download_info["id"]] = download_info
+            self.connection.executemany(
+                "UPDATE jobs SET status = ?, file_path = COALESCE(?, file_path), error = ?, version = ?, node_id = ?, updated_at = ? WHERE id = ?",
+                [
+                    (download_info.get("status"), download_info.get("file_path"), download_info.get("error"), download_info["version"], self.config.node_id, now, download_info["id"])
+                    for download_info in download_infos
+                ],
+            )
+
+    def _select_pending(self, job_ids=None, include_children=False):
+        if job_ids is None:
+            return self.connection.execute("SELECT * FROM jobs WHERE status = ? ORDER BY id", ("Pending...",)).fetchall()
+        job_ids = list(job_ids)
+        rows = {}
+        # Chunked to stay below SQLite's limit on query parameters
+        for start in range(0, len(job_ids), 500):
+            chunk = job_ids[start : start + 500]
+            placeholders = ", ".join("?" for _ in chunk)
+            condition = f"id IN ({placeholders}) OR parent_id IN ({placeholders})" if include_children else f"id IN ({placeholders})"
+            params = [*chunk, *chunk] if include_children else chunk
+            for row in self.connection.execute(f"SELECT * FROM jobs WHERE status = ? AND ({condition})", ("Pending...", *params)):
+                rows[row["id"]] = row
+        return [rows[job_id] for job_id in sorted(rows)]
+
+    def get_pending_jobs(self, job_ids):
+        # The pending jobs among these, and the pending tracks of those that are collections
+        with self.lock:
+            return [self._row_to_job(row) for row in self._select_pending(job_ids, include_children=True)]
+
+    def cancel_pending_jobs(self, job_ids=None):
+        now = time.time()
+        with self.lock, self.connection:
+            rows = self._select_pending(job_ids)
+            cancelled_jobs = []
+            for row in rows:
+                download_info = self._row_to_job(row)
+                download_info["status"] = "Cancelled"
+                download_info["version"] = self._next_version()
+                cancelled_jobs.append(download_info)
+            self.connection.executemany(
+                "UPDATE jobs SET status = ?, version = ?, updated_at = ? WHERE id = ?",
+                [(download_info["status"], download_info["version"], now, download_info["id"]) for download_info in cancelled_jobs],
+            )
+        return cancelled_jobs
+
+    def get_job(self, job_id):
+        with self.lock:
+            if job_id in self.recent_jobs:
+                return self.recent_jobs[job_id]
+            row = self.connection.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            return self._row_to_job(row) if row else None
+
+    def find_jobs_by_url(self, url, statuses=None):
+        query = "SELECT * FROM jobs WHERE url = ?"
+        params = [url]
+        if statuses:
+            query += f" AND status IN ({', '.join('?' for _ in statuses)})"
+            params.extend(statuses)
+        with self.lock:
+            rows = self.connection.execute(query + " ORDER BY id", params).fetchall()
+            return [self._row_to_job(row) for row in rows]
+
+    def get_children(self, parent_id):
+        with self.lock:
+            rows = self.connection.execute("SELECT * FROM jobs WHERE parent_id = ? ORDER BY id", (parent_id,)).fetchall()
+            return [self._row_to_job(row) for row in rows]
+
+    def get_failed_jobs(self, limit=None):
+        # The dead-letter list, tracks of collections included
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT * FROM jobs WHERE status IN (?, ?) ORDER BY id LIMIT ?",
+                (*self.failed_statuses, -1 if limit is None else limit),
+            ).fetchall()
+            return [self._row_to_job(row) for row in rows]
+
+    def get_unfinished_jobs(self):
+        with self.lock:
+            rows = self.connection.execute(
+                f"SELECT * FROM jobs WHERE status IN ({', '.join('?' for _ in self.unfinished_statuses)}) ORDER BY id",
+                self.unfinished_statuses,
+            ).fetchall()
+            return [self._row_to_job(row) for row in rows]
+
+    def record_heartbeat(self):
+        if self.shared:
+            with self.lock, self.connection:
+                self.connection.execute("INSERT OR REPLACE INTO nodes (node_id, seen_at) VALUES (?, ?)", (self.config.node_id, time.time()))
+
+    def claim_unfinished_jobs(self, include_own=True):
+        # Unfinished jobs of nodes that stopped reporting, and this node's own left over from before a restart
+        if not self.shared:
+            return self.get_unfinished_jobs() if include_own else []
+        now = time.time()
+        owner_condition = "node_id NOT IN (SELECT node_id FROM nodes WHERE seen_at >= ?)"
+        params = [*self.unfinished_statuses, now - self.config.broker_state_interval * 5]
+        if include_own:
+            owner_condition += " OR node_id IS NULL OR node_id = ?"
+            params.append(self.config.node_id)
+        query = f"SELECT * FROM jobs WHERE status IN ({', '.join('?' for _ in self.unfinished_statuses)}) AND ({owner_condition}) ORDER BY id"
+        with self.lock:
+            # Claiming inside one write transaction keeps two restarting nodes from taking the same job
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                self.connection.execute("INSERT OR REPLACE INTO nodes (node_id, seen_at) VALUES (?, ?)", (self.config.node_id, now))
+                rows = self.connection.execute(query, params).fetchall()
+                self.connection.executemany("UPDATE jobs SET node_id = ? WHERE id = ?", [(self.config.node_id, row["id"]) for row in rows])
+                self.connection.execute("COMMIT")
+            except Exception:
+                self.connection.execute("ROLLBACK")
+                raise
+            return [self._row_to_job(row) for row in rows]
+
+    def get_history(self, limit=100, before_id=None):
+        # Child jobs of a collection are reported through their parent
+        query = "SELECT * FROM jobs WHERE parent_id IS NULL"
+        params = []
+        if before_id is not None:
+            query += " AND id < ?"
+            params.append(before_id)
+        with self.lock:
+            rows = self.connection.execute(query + " ORDER BY id DESC LIMIT ?", params + [limit]).fetchall()
+            return [self._row_to_job(row) for row in reversed(rows)]
+
+    def get_changes_since(self, version, limit=100):
+        with self.lock:
+            rows = self.connection.execute("SELECT * FROM jobs WHERE version > ? AND parent_id IS NULL ORDER BY version LIMIT ?", (version, limit)).fetchall()
+            return [self._row_to_job(row) for row in rows]
@@ -0,0 +1,211 @@
+import os
+import re
+import time
+import sqlite3
+import logging
+import threading
+import mutagen
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+spotify_url_pattern = re.compile(r"open\.spotify\.com/(?:intl-[\w-]+/)?(?P<type>track|album|playlist|artist)/(?P<id>[A-Za-z0-9]+)")
+
+
+def parse_spotify_url(url):
+    match = spotify_url_pattern.search(url or "")
+    if not match:
+        return None, None
+    return match.group("type"), match.group("id")
+
+
+def read_track_tags(file_path):
+    # spotDL stores the song URL and the ISRC in every file it writes, the frame names differ per container
+    audio = mutagen.File(file_path)
+    if audio is None or audio.tags is None:
+        return None, None
+    tags = audio.tags
+    track_url = None
+    isrc = None
+    if hasattr(tags, "getall"):
+        woas_frames = tags.getall("WOAS")
+        isrc_frames = tags.getall("TSRC")
+        track_url = woas_frames[0].url if woas_frames else None
+        isrc = str(isrc_frames[0].text[0]) if isrc_frames and isrc_frames[0].text else None
+    else:
+        for key in ("woas", "----:spotdl:WOAS"):
+            if key in tags and tags[key]:
+                track_url = tags[key][0]
+                break
+        for key in ("isrc", "----:spotdl:ISRC"):
+            if key in tags and tags[key]:
+                isrc = tags[key][0]
+                break
+    if isinstance(track_url, bytes):
+        track_url = track_url.decode("utf-8", "ignore")
+    if isinstance(isrc, bytes):
+        isrc = isrc.decode("utf-8", "ignore")
+    return parse_spotify_url(track_url)[1], isrc.upper() if isrc else None
+
+
+class LibraryIndex:
+    def __init__(self, config):
+        self.config = config
+        self.lock = threading.RLock()
+        self.scan_lock = threading.Lock()
+        self.track_paths = {}
+        self.isrc_paths = {}
+        self.file_entries = {}
+        self.roots = self.get_roots()
+        self.connection = sqlite3.connect(self.config.library_index_path, check_same_thread=False)
+        self._setup_database()
+        self._load()
+
+    def get_roots(self):
+        roots = []
+        for output in (self.config.track_output, self.config.album_output, self.config.playlist_output, self.config.artist_output):
+            # Everything up to the first placeholder is fixed, that folder holds all files of the template
+            root = os.path.dirname(output.split("{", 1)[0])
+            if root:
+                roots.append(os.path.normpath(root))
+        # Nested roots would be walked twice
+        return [root for root in sorted(set(roots)) if not any(root != other and root.startswith(other.rstrip(os.sep) + os.sep) for other in roots)]
+
+    def _setup_database(self):
+        with self.lock, self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS files (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime REAL NOT NULL,
+                    track_id TEXT,
+                    isrc TEXT
+                )
+                """
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS idx_files_track_id ON files (track_id)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS idx_files_isrc ON files (isrc)")
+
+    def _load(self):
+        with self.lock:
+            for file_path, size, mtime, track_id, isrc in self.connection.execute("SELECT path, size, mtime, track_id, isrc FROM files"):
+                self._remember(file_path, size, mtime, track_id, isrc)
+        logging.info(f"Loaded library index with {len(self.file_entries)} files, {len(self.track_paths)} Spotify tracks")
+
+    def _remember(self, file_path, size, mtime, track_id, isrc):
+        self.file_entries[file_path] = (size, mtime, track_id, isrc)
+        if track_id:
+            self.track_paths[track_id] = file_path
+        if isrc:
+            self.isrc_paths[isrc] = file_path
+
+    def _forget(self, file_path):
+        size, mtime, track_id, isrc = self.file_entries.pop(file_path)
+        if track_id and self.track_paths.get(track_id) == file_path:
+            del self.track_paths[track_id]
+        if isrc and self.isrc_paths.get(isrc) == file_path:
+            del self.isrc_paths[isrc]
+
+    def _is_supported(self, file_name):
+        return os.path.splitext(file_name)[1].lower() in self.config.supported_formats
+
+    def _read_entry(self, file_path, size, mtime):
+        try:
+            track_id, isrc = read_track_tags(file_path)
+        except Exception as e:
+            logging.debug(f"Could not read tags of {file_path}: {e}")
+            track_id, isrc = None, None
+        return (file_path, size, mtime, track_id, isrc)
+
+    def _walk(self, root):
+        directories = [root]
+        while directories:
+            directory = directories.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            directories.append(entry.path)
+                        elif self._is_supported(entry.name) and entry.is_file():
+                            yield entry
+            except OSError as e:
+                logging.debug(f"Skipping unreadable folder {directory}: {e}")
+
+    def scan(self):
+        with self.scan_lock:
+            started = time.monotonic()
+            seen_files = set()
+            changed_entries = []
+            for root in self.roots:
+                for entry in self._walk(root):
+                    seen_files.add(entry.path)
+                    try:
+                        file_stat = entry.stat()
+                    except OSError:
+                        continue
+                    known_entry = self.file_entries.get(entry.path)
+                    # Tags are only read for files that are new or were rewritten since the last scan
+                    if known_entry is None or known_entry[:2] != (file_stat.st_size, file_stat.st_mtime):
+                        changed_entries.append(self._read_entry(entry.path, file_stat.st_size, file_stat.st_mtime))
+
+            with self.lock:
+                # Files added by a finished download while the walk was running are kept
+                removed_files = [file_path for file_path in self.file_entries if file_path not in seen_files and not os.path.exists(file_path)]
+                for file_path in removed_files:
+                    self._forget(file_path)
+                for file_entry in changed_entries:
+                    if file_entry[0] in self.file_entries:
+                        self._forget(file_entry[0])
+                    self._remember(*file_entry)
+                with self.connection:
+                    self.connection.executemany("DELETE FROM files WHERE path = ?", [(file_path,) for file_path in removed_files])
+                    self.connection.executemany("INSERT OR REPLACE INTO files (path, size, mtime, track_id, isrc) VALUES (?, ?, ?, ?, ?)", changed_entries)
+
+            logging.info(f"Library index scanned in {time.monotonic() - started:.1f}s: {len(changed_entries)} updated, {len(removed_files)} removed, {len(self.file_entries)} total")
+
+    def add_files(self, file_paths):
+        new_entries = []
+        for file_path in file_paths:
+            try:
+                file_stat = os.stat(file_path)
+            except OSError:
+                continue
+            new_entries.append(self._read_entry(file_path, file_stat.st_size, file_stat.st_mtime))
+        if not new_entries:
+            return
+        with self.lock:
+            for file_entry in new_entries:
+                if file_entry[0] in self.file_entries:
+                    self._forget(file_entry[0])
+                self._remember(*file_entry)
+            with self.connection:
+                self.connection.executemany("INSERT OR REPLACE INTO files (path, size, mtime, track_id, isrc) VALUES (?, ?, ?, ?, ?)", new_entries)
+
+    def find_track(self, track_id=None, isrc=None):
+        with self.lock:
+            file_path = self.track_paths.get(track_id) if track_id else None
+            if file_path is None and isrc:
+                file_path = self.isrc_paths.get(isrc.upper())
+        if file_path is None:
+            return None
+        # Files removed since the last scan must not block a download
+        if not os.path.isfile(file_path):
+            with self.lock:
+                if file_path in self.file_entries:
+                    self._forget(file_path)
+            return None
+        return file_path
+
+    def start_scanner(self):
+        scanner_thread = threading.Thread(target=self._scan_periodically, name="library-index", daemon=True)
+        scanner_thread.start()
+
+    def _scan_periodically(self):
+        while True:
+            try:
+                self.scan()
+            except Exception as e:
+                logging.error(f"Library Index Error: {e}")
+            time.sleep(self.config.library_scan_interval)
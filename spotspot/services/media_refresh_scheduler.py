@@ -0,0 +1,70 @@
+import time
+import logging
+import threading
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+
+class MediaRefreshScheduler:
+    def __init__(self, config, playlist_manager):
+        self.config = config
+        self.playlist_manager = playlist_manager
+        self.condition = threading.Condition()
+        self.first_dirty_event = None
+        self.last_dirty_event = None
+        self.plex_import_due = None
+        self.pending_events = 0
+        self.refresh_thread = threading.Thread(target=self._run, name="media-refresh", daemon=True)
+        self.refresh_thread.start()
+
+    def mark_dirty(self, reason=None):
+        with self.condition:
+            self.last_dirty_event = time.monotonic()
+            if self.first_dirty_event is None:
+                self.first_dirty_event = self.last_dirty_event
+            self.pending_events += 1
+            self.condition.notify_all()
+        logging.debug(f"Library marked dirty: {reason}")
+
+    def _next_action(self):
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                wait_time = None
+                # A pending library refresh always wins, it reschedules the playlist import anyway
+                if self.last_dirty_event is not None:
+                    # Downloads that never pause would push the refresh back forever, the max wait caps the delay
+                    refresh_due = min(
+                        self.last_dirty_event + self.config.media_refresh_quiet_window,
+                        self.first_dirty_event + self.config.media_refresh_max_wait,
+                    )
+                    wait_time = refresh_due - now
+                    if wait_time <= 0:
+                        pending_events = self.pending_events
+                        self.first_dirty_event = None
+                        self.last_dirty_event = None
+                        self.pending_events = 0
+                        self.plex_import_due = None
+                        return "refresh", pending_events
+                elif self.plex_import_due is not None:
+                    wait_time = self.plex_import_due - now
+                    if wait_time <= 0:
+                        self.plex_import_due = None
+                        return "plex_import", 0
+                self.condition.wait(wait_time)
+
+    def _run(self):
+        while True:
+            action, pending_events = self._next_action()
+            try:
+                if action == "refresh":
+                    logging.info(f"Refreshing media servers for {pending_events} library changes")
+                    self.playlist_manager.media_server_refresh_check()
+                    if self.playlist_manager.plex_playlist_import_needed():
+                        logging.info(f"Delaying Plex Playlist Import for {self.config.plex_playlist_import_delay} seconds")
+                        with self.condition:
+                            self.plex_import_due = time.monotonic() + self.config.plex_playlist_import_delay
+                else:
+                    self.playlist_manager.import_playlist_to_plex()
+            except Exception as e:
+                logging.error(f"Media Refresh Error: {str(e)}")
@@ -0,0 +1,167 @@
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+default_seconds_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+byte_buckets = (1e5, 1e6, 5e6, 1e7, 2.5e7, 5e7, 1e8, 2.5e8, 5e8, 1e9)
+
+
+def escape_label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(label_names, label_values, extra_labels=()):
+    pairs = list(zip(label_names, label_values)) + list(extra_labels)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label_value(value)}"' for name, value in pairs) + "}"
+
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        label_values = tuple(labels.get(label_name, "") for label_name in self.label_names)
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            values = list(self.values.items())
+        for label_values, value in values:
+            lines.append(f"{self.name}{format_labels(self.label_names, label_values)} {format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, label_names=(), buckets=default_seconds_buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        # Per label set: bucket counts, then the sum and count of all observations
+        self.values = {}
+
+    def observe(self, value, **labels):
+        label_values = tuple(labels.get(label_name, "") for label_name in self.label_names)
+        bucket_index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.values.get(label_values)
+            if series is None:
+                series = self.values[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            if bucket_index < len(self.buckets):
+                series[0][bucket_index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield labels
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            values = [(label_values, list(series[0]), series[1], series[2]) for label_values, series in self.values.items()]
+        for label_values, bucket_counts, total, count in values:
+            cumulative = 0
+            for upper_bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{format_labels(self.label_names, label_values, [('le', format_value(float(upper_bound)))])} {cumulative}")
+            lines.append(f"{self.name}_bucket{format_labels(self.label_names, label_values, [('le', '+Inf')])} {count}")
+            lines.append(f"{self.name}_sum{format_labels(self.label_names, label_values)} {format_value(total)}")
+            lines.append(f"{self.name}_count{format_labels(self.label_names, label_values)} {count}")
+        return lines
+
+
+class Gauge:
+    # Read at scrape time from a callback, nothing is recorded on the hot path
+    def __init__(self, name, help_text, label_names=(), callback=None):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.callback = callback
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        if self.callback is None:
+            return lines
+        for label_values, value in self.callback().items():
+            lines.append(f"{self.name}{format_labels(self.label_names, label_values)} {format_value(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+
+    def register(self, metric):
+        with self.lock:
+            self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help_text, label_names=()):
+        return self.register(Counter(name, help_text, label_names))
+
+    def histogram(self, name, help_text, label_names=(), buckets=default_seconds_buckets):
+        return self.register(Histogram(name, help_text, label_names, buckets))
+
+    def gauge(self, name, help_text, label_names=(), callback=None):
+        return self.register(Gauge(name, help_text, label_names, callback))
+
+    def render(self):
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+search_seconds = registry.histogram("spotspot_search_seconds", "Spotify search latency including cache lookups", ("cache",))
+search_cache_total = registry.counter("spotspot_search_cache_total", "Spotify search cache lookups", ("result",))
+parse_seconds = registry.histogram("spotspot_search_parse_seconds", "Time spent parsing Spotify search responses")
+job_duration_seconds = registry.histogram("spotspot_job_duration_seconds", "Duration of finished spotDL jobs", ("type", "status"), (1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600, 7200))
+job_bytes = registry.histogram("spotspot_job_bytes", "Bytes written by finished spotDL jobs", ("type",), byte_buckets)
+bytes_written_total = registry.counter("spotspot_bytes_written_total", "Bytes of audio files written by downloads")
+spotdl_exit_total = registry.counter("spotspot_spotdl_exit_total", "spotDL exit codes", ("code",))
+download_failures_total = registry.counter("spotspot_download_failures_total", "Failed spotDL jobs by failure class", ("kind",))
+postprocess_seconds = registry.histogram("spotspot_postprocess_seconds", "Time spent transcoding, normalizing and tagging one file", ("result",))
+postprocess_wait_seconds = registry.histogram("spotspot_postprocess_wait_seconds", "Time a downloaded file waited for a post-processing worker")
+m3u_generate_seconds = registry.histogram("spotspot_m3u_generate_seconds", "M3U playlist generation time")
+media_refresh_seconds = registry.histogram("spotspot_media_refresh_seconds", "Media server refresh call latency", ("server", "result"))
+image_cache_total = registry.counter("spotspot_image_cache_total", "Thumbnail proxy lookups", ("result",))
+suggest_seconds = registry.histogram("spotspot_suggest_seconds", "Local suggest index lookup time", buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05))
+suggest_total = registry.counter("spotspot_suggest_total", "Suggest requests by where the answer came from", ("source",))
+socket_emits_total = registry.counter("spotspot_socket_emits_total", "Socket.IO events emitted by the server", ("event",))
+
+
+def count_socket_emits(socketio):
+    emit = socketio.emit
+
+    def counted_emit(event, *args, **kwargs):
+        socket_emits_total.inc(event=event)
+        return emit(event, *args, **kwargs)
+
+    socketio.emit = counted_emit
+    return socketio
@@ -0,0 +1,154 @@
+import os
+import json
+import stat
+import bisect
+import logging
+import tempfile
+import threading
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# Read once at import, os.umask can only be read by setting it and that is not thread safe
+process_umask = os.umask(0)
+os.umask(process_umask)
+
+
+def write_file_atomically(file_path, content):
+    # Write next to the target and rename over it, readers never see a half written file
+    file_dir = os.path.dirname(file_path) or "."
+    os.makedirs(file_dir, exist_ok=True)
+    with tempfile.NamedTemporaryFile("w", dir=file_dir, prefix=".tmp-", delete=False, encoding="utf-8") as temp_file:
+        temp_file.write(content)
+        temp_path = temp_file.name
+    # Temporary files are private, media servers running as another user must still read the playlist
+    try:
+        file_mode = stat.S_IMODE(os.stat(file_path).st_mode)
+    except FileNotFoundError:
+        file_mode = 0o666 & ~process_umask
+    os.chmod(temp_path, file_mode)
+    os.replace(temp_path, file_path)
+
+
+class PlaylistIndex:
+    def __init__(self, config):
+        self.config = config
+        self.lock = threading.Lock()
+        self.folder_path = self.config.absolute_server_path
+        self.sort_order = self.config.m3u_playlist_sort_order
+        self.files = {}
+        self.sorted_files = []
+        self.dir_mtime = None
+        self.changed = True
+        self._load()
+
+    def _sort_value(self, file_path, mtime):
+        if self.sort_order in ("name_asc", "name_desc"):
+            return os.path.basename(file_path)
+        return mtime
+
+    def _is_supported(self, file_name):
+        return any(file_name.lower().endswith(ext) for ext in self.config.supported_formats)
+
+    def _load(self):
+        try:
+            with open(self.config.playlist_index_path, "r", encoding="utf-8") as index_file:
+                saved_index = json.load(index_file)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logging.warning(f"Playlist index unreadable, rebuilding: {e}")
+            return
+
+        if saved_index.get("folder") != self.folder_path or saved_index.get("sort_order") != self.sort_order:
+            logging.info("Playlist index settings changed, rebuilding")
+            return
+
+        self.dir_mtime = saved_index.get("dir_mtime")
+        self.files = {file_path: tuple(file_stat) for file_path, file_stat in saved_index.get("files", {}).items()}
+        self.sorted_files = sorted((self._sort_value(file_path, file_stat[1]), file_path) for file_path, file_stat in self.files.items())
+        self.changed = False
+        logging.info(f"Loaded playlist index with {len(self.files)} files")
+
+    def save(self):
+        with self.lock:
+            saved_index = {
+                "folder": self.folder_path,
+                "sort_order": self.sort_order,
+                "dir_mtime": self.dir_mtime,
+                "files": self.files,
+            }
+            write_file_atomically(self.config.playlist_index_path, json.dumps(saved_index))
+
+    def _add(self, file_path, size, mtime):
+        previous_stat = self.files.get(file_path)
+        if previous_stat == (size, mtime):
+            return False
+        if previous_stat is not None:
+            self._remove(file_path)
+        self.files[file_path] = (size, mtime)
+        bisect.insort(self.sorted_files, (self._sort_value(file_path, mtime), file_path))
+        return True
+
+    def _remove(self, file_path):
+        size, mtime = self.files.pop(file_path)
+        entry = (self._sort_value(file_path, mtime), file_path)
+        position = bisect.bisect_left(self.sorted_files, entry)
+        if position < len(self.sorted_files) and self.sorted_files[position] == entry:
+            del self.sorted_files[position]
+
+    def add_file(self, file_path):
+        if os.path.normpath(os.path.dirname(file_path)) != os.path.normpath(self.folder_path) or not self._is_supported(file_path):
+            return False
+        file_path = os.path.join(self.folder_path, os.path.basename(file_path))
+        try:
+            file_stat = os.stat(file_path)
+        except OSError:
+            return False
+        with self.lock:
+            added = self._add(file_path, file_stat.st_size, file_stat.st_mtime)
+            self.changed = self.changed or added
+            return added
+
+    def sync(self):
+        try:
+            dir_mtime = os.stat(self.folder_path).st_mtime_ns
+        except FileNotFoundError:
+            dir_mtime = None
+
+        with self.lock:
+            updated = 0
+            removed_files = []
+            # An unchanged folder has the same files, downloads rewritten in place come in through add_file
+            if dir_mtime is None or dir_mtime != self.dir_mtime:
+                seen_files = set()
+                if dir_mtime is not None:
+                    with os.scandir(self.folder_path) as entries:
+                        for entry in entries:
+                            if not self._is_supported(entry.name) or not entry.is_file():
+                                continue
+                            seen_files.add(entry.path)
+                            # Only files new to the index are stat'ed
+                            if entry.path not in self.files:
+                                file_stat = entry.stat()
+                                updated += self._add(entry.path, file_stat.st_size, file_stat.st_mtime)
+                removed_files = [file_path for file_path in self.files if file_path not in seen_files]
+
+            for file_path in removed_files:
+                self._remove(file_path)
+
+            if updated or removed_files:
+                logging.info(f"Playlist index synced: {updated} added or changed, {len(removed_files)} removed, {len(self.files)} total")
+            self.dir_mtime = dir_mtime
+            self.changed = self.changed or updated > 0 or len(removed_files) > 0
+            return self.changed
+
+    def get_playlist_lines(self):
+        with self.lock:
+            file_paths = [file_path for _, file_path in self.sorted_files]
+        if self.sort_order in ("name_asc", "date_asc"):
+            return file_paths
+        return file_paths[::-1]
+
+    def mark_written(self):
+        with self.lock:
+            self.changed = False
@@ -0,0 +1,254 @@
+import os
+import time
+import queue
+import shlex
+import base64
+import logging
+import threading
+import subprocess
+import mutagen
+from mutagen.id3 import ID3, APIC, COMM, TALB, TCON, TCOP, TDRC, TENC, TIT2, TPE1, TPE2, TPOS, TRCK, TSRC, USLT, WOAS
+from mutagen.flac import Picture
+from mutagen.mp4 import MP4Cover, MP4FreeForm
+from services import metrics
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# spotDL keeps YouTube's audio as it is when the container matches, Opus comes in webm and AAC in m4a
+native_formats = ("opus", "m4a")
+# Other formats are converted once by the post-processing workers, from the stream YouTube serves most
+native_format = "opus"
+codec_arguments = {
+    "mp3": ["-codec:a", "libmp3lame"],
+    "flac": ["-codec:a", "flac", "-sample_fmt", "s16"],
+    "ogg": ["-codec:a", "libvorbis"],
+    "opus": ["-codec:a", "libopus"],
+    "m4a": ["-codec:a", "aac"],
+    "wav": ["-codec:a", "pcm_s16le"],
+}
+id3_text_frames = {"title": TIT2, "artist": TPE1, "albumartist": TPE2, "album": TALB, "date": TDRC, "genre": TCON, "copyright": TCOP, "encodedby": TENC, "isrc": TSRC}
+mp4_text_atoms = {"title": "\xa9nam", "artist": "\xa9ART", "albumartist": "aART", "album": "\xa9alb", "date": "\xa9day", "genre": "\xa9gen", "copyright": "cprt", "encodedby": "\xa9too", "comment": "\xa9cmt", "lyrics": "\xa9lyr"}
+
+
+def get_native_format(target_format):
+    return target_format if target_format in native_formats else native_format
+
+
+def build_ffmpeg_command(config, source_path, target_path, target_format):
+    command = [config.ffmpeg, "-nostdin", "-y", "-v", "error", "-i", source_path, "-map", "0:a", "-map_metadata", "-1"]
+    if config.normalize_loudness:
+        command += ["-af", f"loudnorm=I={config.loudness_target}:TP=-1.5:LRA=11"]
+    command += codec_arguments[target_format]
+    # Same meaning as spotDL's --bitrate: 0-9 is a VBR quality, auto and disable keep the encoder default
+    if config.bitrate and config.bitrate not in ("auto", "disable"):
+        command += ["-q:a", config.bitrate] if config.bitrate.isdigit() and len(config.bitrate) == 1 else ["-b:a", config.bitrate]
+    if config.ffmpeg_args:
+        command += shlex.split(config.ffmpeg_args)
+    return command + [target_path]
+
+
+def read_vorbis_tags(file_path):
+    # spotDL writes Vorbis comments into Opus files, the same keys it uses for FLAC and Ogg
+    audio = mutagen.File(file_path)
+    if audio is None or audio.tags is None:
+        return {}
+    return {key.lower(): values for key, values in audio.tags.as_dict().items()}
+
+
+def get_number_pair(tags, number_key, total_key):
+    number = (tags.get(number_key) or [""])[0]
+    total = (tags.get(total_key) or [""])[0]
+    return number, total
+
+
+def get_cover(tags):
+    encoded_pictures = tags.get("metadata_block_picture")
+    if not encoded_pictures:
+        return None
+    try:
+        return Picture(base64.b64decode(encoded_pictures[0]))
+    except Exception:
+        return None
+
+
+def write_id3_tags(id3, tags):
+    for key, frame_class in id3_text_frames.items():
+        if tags.get(key):
+            id3.add(frame_class(encoding=3, text=tags[key]))
+    track_number, track_total = get_number_pair(tags, "tracknumber", "tracktotal")
+    if track_number:
+        id3.add(TRCK(encoding=3, text=f"{track_number}/{track_total}" if track_total else track_number))
+    disc_number, disc_total = get_number_pair(tags, "discnumber", "disctotal")
+    if disc_number:
+        id3.add(TPOS(encoding=3, text=f"{disc_number}/{disc_total}" if disc_total else disc_number))
+    if tags.get("woas"):
+        id3.add(WOAS(encoding=3, url=tags["woas"][0]))
+    if tags.get("comment"):
+        id3.add(COMM(encoding=3, text=tags["comment"]))
+    if tags.get("lyrics"):
+        id3.add(USLT(encoding=3, text=tags["lyrics"][0]))
+    cover = get_cover(tags)
+    if cover is not None:
+        id3.add(APIC(encoding=3, mime=cover.mime, type=3, desc="Cover", data=cover.data))
+
+
+def copy_mp4_tags(source_path, target_path):
+    source = mutagen.File(source_path)
+    if source is None or source.tags is None:
+        return
+    audio = mutagen.File(target_path)
+    if audio.tags is None:
+        audio.add_tags()
+    audio.tags.update(source.tags)
+    audio.save()
+
+
+def copy_tags(source_path, target_path, target_format):
+    if source_path.endswith(".m4a"):
+        # Only downloaded as m4a when that is the target as well, the atoms are copied as they are
+        copy_mp4_tags(source_path, target_path)
+        return
+    # ffmpeg drops spotDL's URL and cover frames when changing containers, so the tags are rewritten the way spotDL writes them
+    tags = read_vorbis_tags(source_path)
+    if not tags:
+        return
+    if target_format in ("opus", "ogg", "flac"):
+        audio = mutagen.File(target_path)
+        if audio.tags is None:
+            audio.add_tags()
+        for key, values in tags.items():
+            if target_format != "flac" or key != "metadata_block_picture":
+                audio.tags[key] = values
+        cover = get_cover(tags)
+        if target_format == "flac" and cover is not None:
+            audio.add_picture(cover)
+        audio.save()
+    elif target_format == "m4a":
+        audio = mutagen.File(target_path)
+        if audio.tags is None:
+            audio.add_tags()
+        for key, atom in mp4_text_atoms.items():
+            if tags.get(key):
+                audio.tags[atom] = tags[key]
+        track_number, track_total = get_number_pair(tags, "tracknumber", "tracktotal")
+        if track_number.isdigit():
+            audio.tags["trkn"] = [(int(track_number), int(track_total) if track_total.isdigit() else 0)]
+        disc_number, disc_total = get_number_pair(tags, "discnumber", "disctotal")
+        if disc_number.isdigit():
+            audio.tags["disk"] = [(int(disc_number), int(disc_total) if disc_total.isdigit() else 0)]
+        for key, atom in (("woas", "----:spotdl:WOAS"), ("isrc", "----:spotdl:ISRC")):
+            if tags.get(key):
+                audio.tags[atom] = [MP4FreeForm(tags[key][0].encode("utf-8"))]
+        cover = get_cover(tags)
+        if cover is not None:
+            audio.tags["covr"] = [MP4Cover(cover.data, imageformat=MP4Cover.FORMAT_PNG if cover.mime == "image/png" else MP4Cover.FORMAT_JPEG)]
+        audio.save()
+    elif target_format == "mp3":
+        id3 = ID3()
+        write_id3_tags(id3, tags)
+        id3.save(target_path, v2_version=3)
+    elif target_format == "wav":
+        audio = mutagen.File(target_path)
+        if audio.tags is None:
+            audio.add_tags()
+        write_id3_tags(audio.tags, tags)
+        audio.save()
+
+
+class PostProcessBatch:
+    # The files of one job, the callback runs once the last of them is done
+    def __init__(self, file_count, on_done):
+        self.lock = threading.Lock()
+        self.remaining = file_count
+        self.results = []
+        self.on_done = on_done
+
+    def add_result(self, result):
+        with self.lock:
+            self.results.append(result)
+            self.remaining -= 1
+            finished = self.remaining == 0
+        if finished:
+            self.on_done(self.results)
+
+
+class PostProcessor:
+    def __init__(self, config):
+        self.config = config
+        self.tasks = queue.Queue()
+        self.lock = threading.Lock()
+        self.active = 0
+        self.workers_started = False
+        metrics.registry.gauge("spotspot_postprocess_queue_depth", "Downloaded files waiting for post-processing", callback=lambda: {(): self.tasks.qsize()})
+        metrics.registry.gauge("spotspot_postprocess_in_flight", "Files being transcoded, normalized or tagged", callback=lambda: {(): self.active})
+
+    def is_enabled(self):
+        return self.config.postprocess
+
+    def get_download_format(self):
+        return get_native_format(self.config.format) if self.config.postprocess else self.config.format
+
+    def needs_processing(self):
+        # Output straight from spotDL is already final when the container matches, unless it should be re-encoded or filtered
+        return self.config.format != get_native_format(self.config.format) or self.config.normalize_loudness or bool(self.config.ffmpeg_args) or self.config.bitrate not in (None, "auto", "disable")
+
+    def get_target_path(self, source_path):
+        return os.path.splitext(source_path)[0] + "." + self.config.format
+
+    def start(self):
+        with self.lock:
+            if self.workers_started:
+                return
+            self.workers_started = True
+        # Each worker drives one ffmpeg process, so the pool size is the number of cores kept busy
+        logging.info(f"Starting {self.config.postprocess_workers} post-processing workers")
+        for worker_number in range(self.config.postprocess_workers):
+            worker_thread = threading.Thread(target=self._run, name=f"postprocess-worker-{worker_number}", daemon=True)
+            worker_thread.start()
+
+    def submit(self, source_paths, on_done):
+        self.start()
+        batch = PostProcessBatch(len(source_paths), on_done)
+        enqueued_at = time.monotonic()
+        for source_path in source_paths:
+            self.tasks.put((source_path, batch, enqueued_at))
+
+    def get_counts(self):
+        return {"pending": self.tasks.qsize(), "active": self.active}
+
+    def _run(self):
+        while True:
+            source_path, batch, enqueued_at = self.tasks.get()
+            metrics.postprocess_wait_seconds.observe(time.monotonic() - enqueued_at)
+            with self.lock:
+                self.active += 1
+            try:
+                with metrics.postprocess_seconds.time(result="ok") as labels:
+                    try:
+                        result = (source_path, self.process_file(source_path), None)
+                    except Exception as e:
+                        labels["result"] = "error"
+                        logging.error(f"Post-processing failed for {source_path}: {e}")
+                        result = (source_path, None, str(e))
+            finally:
+                with self.lock:
+                    self.active -= 1
+                self.tasks.task_done()
+            batch.add_result(result)
+
+    def process_file(self, source_path):
+        target_path = self.get_target_path(source_path)
+        temp_path = f"{os.path.splitext(source_path)[0]}.temp.{self.config.format}"
+        command = build_ffmpeg_command(self.config, source_path, temp_path, self.config.format)
+        try:
+            completed = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+            if completed.returncode != 0:
+                raise RuntimeError(f"ffmpeg exited with {completed.returncode}: {completed.stdout.strip()[-500:]}")
+            copy_tags(source_path, temp_path, self.config.format)
+            os.replace(temp_path, target_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        if target_path != source_path:
+            os.remove(source_path)
+        return target_path
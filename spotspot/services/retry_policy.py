@@ -0,0 +1,78 @@
+import re
+import time
+import heapq
+import random
+import logging
+import itertools
+import threading
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# Checked in order, a throttled run often also logs connection errors
+failure_patterns = (
+    ("rate_limited", re.compile(r"HTTP Error 429|Too Many Requests|rate.?limit|Sign in to confirm|not a bot", re.IGNORECASE)),
+    ("permanent", re.compile(r"No results found|LookupError|Video unavailable|not available in your country|Private video|SongError|FFmpegError", re.IGNORECASE)),
+    ("transient", re.compile(r"ConnectionError|Timeout|timed out|Temporary failure in name resolution|Connection reset|RemoteDisconnected|IncompleteRead|SSLError|HTTP Error 5\d\d|AudioProviderError", re.IGNORECASE)),
+)
+
+
+def classify_failure(returncode, output_lines):
+    for failure_class, pattern in failure_patterns:
+        for line in reversed(output_lines):
+            if pattern.search(line):
+                return failure_class, line[:300]
+    # No known error in the output, a crash or a killed process is worth another try
+    return "transient", f"SpotDL exit code {returncode}"
+
+
+class RetryPolicy:
+    def __init__(self, config, submit):
+        self.config = config
+        self.submit = submit
+        self.condition = threading.Condition()
+        self.sequence = itertools.count()
+        self.delayed_jobs = []
+        self.cooldown_until = 0
+        self.rate_limit_strikes = 0
+
+    def get_delay(self, attempt):
+        # Full jitter keeps jobs that failed together from retrying together
+        delay = min(self.config.retry_max_delay, self.config.retry_base_delay * 2**attempt)
+        return random.uniform(delay / 2, delay)
+
+    def start_cooldown(self):
+        with self.condition:
+            cooldown = min(self.config.retry_max_delay, self.config.rate_limit_cooldown * 2**self.rate_limit_strikes)
+            self.rate_limit_strikes += 1
+            self.cooldown_until = max(self.cooldown_until, time.monotonic() + cooldown)
+        logging.warning(f"Provider is rate limiting, no downloads start for {cooldown:.0f}s")
+
+    def record_success(self):
+        with self.condition:
+            self.rate_limit_strikes = 0
+
+    def get_cooldown_delay(self):
+        # Jobs held back by a cooldown start spread out once it ends
+        remaining = self.cooldown_until - time.monotonic()
+        return remaining + random.uniform(0, self.config.retry_base_delay) if remaining > 0 else 0
+
+    def schedule(self, url, download_info, delay):
+        with self.condition:
+            heapq.heappush(self.delayed_jobs, (time.monotonic() + delay, next(self.sequence), url, download_info))
+            self.condition.notify()
+
+    def get_delayed_count(self):
+        with self.condition:
+            return len(self.delayed_jobs)
+
+    def start(self):
+        release_thread = threading.Thread(target=self._release_due_jobs, name="retry-policy", daemon=True)
+        release_thread.start()
+
+    def _release_due_jobs(self):
+        while True:
+            with self.condition:
+                while not self.delayed_jobs or self.delayed_jobs[0][0] > time.monotonic():
+                    self.condition.wait(self.delayed_jobs[0][0] - time.monotonic() if self.delayed_jobs else None)
+                _, _, url, download_info = heapq.heappop(self.delayed_jobs)
+            self.submit(url, download_info)
@@ -0,0 +1,116 @@
+import logging
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, CancelledError
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+
+class SearchDispatcher:
+    def __init__(self, config, socketio, spotify_service):
+        self.config = config
+        self.socketio = socketio
+        self.spotify_service = spotify_service
+        self.executor = ThreadPoolExecutor(max_workers=self.config.search_workers, thread_name_prefix="spotify-search")
+        self.lock = threading.Lock()
+        self.tokens = itertools.count(1)
+        self.in_flight = {}
+        self.waiters = {}
+        self.client_requests = {}
+
+    def submit(self, sid, search_req):
+        search_key = self.spotify_service.get_search_key(search_req)
+        with self.lock:
+            token = next(self.tokens)
+            self._release_client_request(sid)
+            future = self.in_flight.get(search_key)
+            if future is None:
+                # Identical searches from any client share one Spotify call
+                future = self.executor.submit(self.spotify_service.perform_spotify_search, search_req)
+                self.in_flight[search_key] = future
+                self.waiters[search_key] = 0
+            self.waiters[search_key] += 1
+            self.client_requests[sid] = (token, search_key)
+        self.socketio.start_background_task(self._wait_and_emit, sid, token, search_key, future, search_req)
+
+    def prefetch(self, search_req):
+        # Fetched while the user looks at the current page, the search cache then answers "load more" at once
+        if self.spotify_service.is_search_cached(search_req):
+            return
+        search_key = self.spotify_service.get_search_key(search_req)
+        with self.lock:
+            if search_key in self.in_flight:
+                return
+            future = self.executor.submit(self.spotify_service.perform_spotify_search, search_req)
+            self.in_flight[search_key] = future
+            self.waiters[search_key] = 0
+        future.add_done_callback(lambda done_future: self._finish_prefetch(search_key, done_future))
+
+    def _finish_prefetch(self, search_key, future):
+        with self.lock:
+            # A client that joined the prefetch cleans up in _finish instead
+            if self.in_flight.get(search_key) is future and self.waiters.get(search_key) == 0:
+                del self.in_flight[search_key]
+                del self.waiters[search_key]
+
+    def cancel(self, sid):
+        with self.lock:
+            self._release_client_request(sid)
+
+    def _release_client_request(self, sid):
+        previous_request = self.client_requests.pop(sid, None)
+        if previous_request is None:
+            return
+        _, search_key = previous_request
+        if search_key not in self.waiters:
+            return
+        self.waiters[search_key] -= 1
+        if self.waiters[search_key] <= 0:
+            # Nobody wants this result anymore, drop it before it starts if we can
+            self.in_flight.pop(search_key).cancel()
+            del self.waiters[search_key]
+
+    def _finish(self, sid, token, search_key):
+        with self.lock:
+            current_request = self.client_requests.get(sid)
+            if current_request is None or current_request[0] != token:
+                return False
+            del self.client_requests[sid]
+            self.waiters[search_key] -= 1
+            if self.waiters[search_key] <= 0:
+                self.in_flight.pop(search_key, None)
+                del self.waiters[search_key]
+            return True
+
+    def _wait_and_emit(self, sid, token, search_key, future, search_req):
+        search_page = None
+        timed_out = False
+        try:
+            search_page = future.result(timeout=self.config.search_timeout)
+        except TimeoutError:
+            timed_out = True
+        except CancelledError:
+            pass
+        except Exception as e:
+            logging.error(f"Spotify Search Error: {str(e)}")
+
+        if not self._finish(sid, token, search_key):
+            logging.info(f"Search superseded: {search_key[0]}, Type: {search_key[1]}")
+            return
+
+        if timed_out:
+            logging.warning(f"Search timed out after {self.config.search_timeout} seconds: {search_key[0]}")
+            self.socketio.emit("toast", {"title": "Search Timed Out", "body": "Spotify took too long to respond"}, to=sid)
+        search_page = search_page or {}
+        self.socketio.emit(
+            "search_results",
+            {
+                "results": search_page.get("results", {}),
+                "offset": search_page.get("offset", self.spotify_service.get_search_offset(search_req)),
+                "next_offset": search_page.get("next_offset"),
+                "request_id": search_req.get("request_id"),
+            },
+            to=sid,
+        )
+        if self.config.search_prefetch and search_page.get("next_offset") is not None:
+            self.prefetch(dict(search_req, offset=search_page["next_offset"]))
@@ -0,0 +1,191 @@
+import os
+import queue
+import signal
+import logging
+import threading
+import subprocess
+import multiprocessing
+from gevent import monkey
+from gevent.socket import wait_read
+from services.post_processor import get_native_format
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+
+class PipeLogHandler(logging.Handler):
+    def __init__(self, connection, send_lock):
+        super().__init__(level=logging.INFO)
+        self.connection = connection
+        self.send_lock = send_lock
+
+    def emit(self, record):
+        try:
+            with self.send_lock:
+                self.connection.send(("line", record.getMessage()))
+        except Exception:
+            pass
+
+
+def run_spotdl_worker(connection, spotify_settings, downloader_settings):
+    # Runs in the child process: spotDL is imported and authenticated once, then reused for every job
+    if os.name == "posix":
+        os.setsid()
+
+    from spotdl import Spotdl
+    from spotdl.types.options import DownloaderOptions
+    from spotdl.utils.search import get_simple_songs
+
+    send_lock = threading.Lock()
+    root_logger = logging.getLogger()
+    root_logger.handlers = [PipeLogHandler(connection, send_lock)]
+    root_logger.setLevel(logging.INFO)
+
+    downloader_settings = {key: value for key, value in downloader_settings.items() if key in DownloaderOptions.__annotations__}
+    spotdl = Spotdl(downloader_settings=downloader_settings, **spotify_settings)
+    downloader = spotdl.downloader
+
+    while True:
+        try:
+            job = connection.recv()
+        except (EOFError, OSError):
+            break
+
+        returncode = 0
+        try:
+            os.chdir(job["cwd"])
+            downloader.settings["m3u"] = job.get("m3u")
+            songs = get_simple_songs(
+                job["urls"],
+                use_ytm_data=downloader.settings["ytm_data"],
+                playlist_numbering=downloader.settings["playlist_numbering"],
+                albums_to_ignore=downloader.settings["ignore_albums"],
+                album_type=downloader.settings["album_type"],
+                playlist_retain_track_cover=downloader.settings["playlist_retain_track_cover"],
+            )
+            downloader.download_multiple_songs(songs)
+        except Exception as e:
+            logging.error(f"{type(e).__name__}: {e}")
+            returncode = 1
+
+        with send_lock:
+            connection.send(("done", returncode))
+
+
+class SpotdlWorker:
+    def __init__(self, context, spotify_settings, downloader_settings):
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(target=run_spotdl_worker, args=(child_connection, spotify_settings, downloader_settings), daemon=True)
+        self.process.start()
+        child_connection.close()
+        self.pid = self.process.pid
+        self.returncode = None
+        self.stdout = None
+        # The download job using the worker, a cancel only signals it while that job still holds it
+        self.lock = threading.Lock()
+        self.job_id = None
+        self.poisoned = False
+
+    def start_job(self, urls, cwd, m3u_name, job_id):
+        with self.lock:
+            self.job_id = job_id
+        self.returncode = None
+        self.connection.send({"urls": urls, "cwd": cwd, "m3u": m3u_name})
+        self.stdout = self._read_lines()
+        return self
+
+    def _wait_readable(self):
+        # Under gunicorn's gevent worker a blocking recv() would stall every greenlet, the hub waits for the pipe instead
+        if monkey.is_module_patched("threading"):
+            wait_read(self.connection.fileno())
+
+    def _read_lines(self):
+        while True:
+            try:
+                self._wait_readable()
+                message_type, payload = self.connection.recv()
+            except (EOFError, OSError):
+                # Worker died mid job (crash or cancellation), the web process carries on
+                self.process.join(1)
+                self.returncode = self.process.exitcode if self.process.exitcode is not None else 1
+                return
+            if message_type == "done":
+                self.returncode = payload
+                return
+            yield payload
+
+    def is_alive(self):
+        return self.process.is_alive()
+
+    def wait(self, timeout=None):
+        if self.returncode is not None and self.process.is_alive():
+            return self.returncode
+        self.process.join(timeout)
+        if self.process.is_alive():
+            raise subprocess.TimeoutExpired(f"spotdl-worker-{self.pid}", timeout)
+        return self.returncode if self.returncode is not None else self.process.exitcode
+
+    def signal_job(self, job_id, force=False):
+        with self.lock:
+            if self.job_id != job_id:
+                return False
+            # A signalled worker may be half way through a song, it is never handed out again
+            self.poisoned = True
+            if os.name == "posix":
+                os.killpg(self.pid, signal.SIGKILL if force else signal.SIGTERM)
+            elif force:
+                self.process.kill()
+            else:
+                self.process.terminate()
+            return True
+
+    def finish_job(self):
+        with self.lock:
+            self.job_id = None
+            return self.poisoned
+
+    def terminate(self):
+        self.process.terminate()
+
+    def kill(self):
+        self.process.kill()
+
+
+class SpotdlWorkerPool:
+    def __init__(self, config):
+        self.config = config
+        self.context = multiprocessing.get_context("spawn")
+        self.idle_workers = queue.Queue()
+        self.spotify_settings = {
+            "client_id": self.config.client_id,
+            "client_secret": self.config.client_secret,
+            "user_auth": self.config.user_auth,
+            "cache_path": self.config.cache_path,
+            "no_cache": self.config.no_cache,
+            "headless": True,
+        }
+        self.downloader_settings = dict(self.config.spotdl_config)
+        self.downloader_settings["output"] = "."
+        if self.config.postprocess:
+            # Same as the --format overrides of the subprocess mode, converting happens in the post-processing workers
+            download_format = get_native_format(self.config.format)
+            self.downloader_settings.update(format=download_format, bitrate="disable", ffmpeg_args=None, detect_formats=[self.config.format, download_format])
+        logging.info(f"Starting {self.config.spotdl_worker_processes} in-process spotDL workers")
+        for _ in range(self.config.spotdl_worker_processes):
+            self.idle_workers.put(self._start_worker())
+
+    def _start_worker(self):
+        return SpotdlWorker(self.context, self.spotify_settings, self.downloader_settings)
+
+    def acquire(self):
+        return self.idle_workers.get()
+
+    def release(self, worker):
+        if worker.finish_job():
+            logging.info(f"spotDL worker {worker.pid} was stopped, starting a replacement")
+            if worker.is_alive():
+                worker.kill()
+            worker = self._start_worker()
+        elif not worker.is_alive():
+            logging.warning(f"spotDL worker {worker.pid} exited, starting a replacement")
+            worker = self._start_worker()
+        self.idle_workers.put(worker)
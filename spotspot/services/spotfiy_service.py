@@ -1,33 +1,201 @@
+import time
 import logging
+import requests
 import spotipy
+import threading
+from urllib3.util.retry import Retry
+from requests.adapters import HTTPAdapter
+from spotipy.cache_handler import MemoryCacheHandler
 from spotipy.oauth2 import SpotifyClientCredentials
+from services import metrics
+from services.ttl_cache import TTLCache
+from services.suggest_index import SuggestIndex
+from services.image_cache import ImageCache, select_image
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
+# Spotify rejects search offsets past this
+max_search_offset = 1000
+
 
 class SpotifyService:
     def __init__(self, config):
         self.config = config
+        self.sp = None
+        self.client_lock = threading.Lock()
+        self.search_cache = TTLCache(self.config.search_cache_size, self.config.search_cache_ttl)
+        self.suggest_index = SuggestIndex(self.config)
+        self.image_cache = ImageCache(self.config)
+
+    def get_client(self):
+        # One client for the app lifetime, the token is only refetched once it expires
+        with self.client_lock:
+            if self.sp is None:
+                # A session passed in replaces spotipy's own, so its retries on rate limits and server errors are kept here
+                retry = Retry(
+                    total=spotipy.Spotify.max_retries,
+                    status=spotipy.Spotify.max_retries,
+                    backoff_factor=0.3,
+                    status_forcelist=spotipy.Spotify.default_retry_codes,
+                    respect_retry_after_header=True,
+                    allowed_methods=False,
+                )
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.config.spotify_pool_size, max_retries=retry)
+                session.mount("https://", adapter)
+                client_credentials_manager = SpotifyClientCredentials(
+                    client_id=self.config.client_id,
+                    client_secret=self.config.client_secret,
+                    cache_handler=MemoryCacheHandler(),
+                    requests_session=session,
+                )
+                self.sp = spotipy.Spotify(client_credentials_manager=client_credentials_manager, requests_session=session)
+            return self.sp
+
+    def get_search_offset(self, search_req):
+        try:
+            offset = int(search_req.get("offset") or 0)
+        except (TypeError, ValueError):
+            offset = 0
+        return min(max(0, offset), max_search_offset - self.config.search_limit)
+
+    def get_search_key(self, search_req):
+        query_type = search_req.get("type", "track")
+        search_type = "album,artist,playlist,track" if query_type == "all" else query_type
+        return (" ".join(search_req.get("query", "").lower().split()), search_type, self.config.search_limit, self.get_search_offset(search_req))
+
+    def is_search_cached(self, search_req):
+        return self.search_cache.contains(self.get_search_key(search_req))
 
     def perform_spotify_search(self, search_req):
+        started = time.perf_counter()
+        cache_result = "miss"
         try:
-            parsed_results = None
-            query_type = search_req.get("type", "track")
+            search_page = None
             query = search_req.get("query")
-            search_type = "album,artist,playlist,track" if query_type == "all" else query_type
+            cache_key = self.get_search_key(search_req)
+            search_type, offset = cache_key[1], cache_key[3]
 
-            logging.info(f"Search query: {query}, Type: {search_type}")
-            client_credentials_manager = SpotifyClientCredentials(client_id=self.config.client_id, client_secret=self.config.client_secret)
-            self.sp = spotipy.Spotify(client_credentials_manager=client_credentials_manager)
+            search_page = self.search_cache.get(cache_key)
+            if search_page is not None:
+                logging.info(f"Search cache hit: {query}, Type: {search_type}, Offset: {offset}")
+                cache_result = "hit"
+                return search_page
 
-            results = self.sp.search(q=query, limit=self.config.search_limit, type=search_type)
-            parsed_results = self.parse_spotify_data(results)
+            logging.info(f"Search query: {query}, Type: {search_type}, Offset: {offset}")
+            results = self.get_client().search(q=query, limit=self.config.search_limit, offset=offset, type=search_type)
+            with metrics.parse_seconds.time():
+                parsed_results = self.parse_spotify_data(results)
+            # Types are paged together, another page exists while any of them has one
+            next_offset = offset + self.config.search_limit
+            has_next_page = next_offset + self.config.search_limit <= max_search_offset and any(value.get("next") for value in results.values() if isinstance(value, dict))
+            search_page = {"results": parsed_results, "offset": offset, "next_offset": next_offset if has_next_page else None}
+            self.search_cache.set(cache_key, search_page)
+            self.suggest_index.add_results(parsed_results)
 
         except Exception as e:
+            cache_result = "error"
             logging.error(f"Spotify Search Error: {str(e)}")
 
         finally:
-            return parsed_results
+            metrics.search_cache_total.inc(result=cache_result)
+            metrics.search_seconds.observe(time.perf_counter() - started, cache=cache_result)
+            return search_page
+
+    def get_collection_tracks(self, collection_type, collection_id):
+        sp = self.get_client()
+        tracks = []
+        if collection_type == "album":
+            results = sp.album_tracks(collection_id, limit=50)
+        else:
+            results = sp.playlist_items(collection_id, limit=100, additional_types=("track",))
+        while results:
+            for item in results["items"]:
+                track = item if collection_type == "album" else item.get("track")
+                if not track or not track.get("id") or track.get("is_local"):
+                    continue
+                tracks.append(
+                    {
+                        "id": track["id"],
+                        "name": track["name"],
+                        "artist": track["artists"][0]["name"] if track["artists"] else None,
+                        "url": track["external_urls"]["spotify"],
+                        "isrc": track.get("external_ids", {}).get("isrc"),
+                    }
+                )
+            results = sp.next(results) if results.get("next") else None
+        return tracks
+
+    def get_playlist_snapshot(self, playlist_id):
+        # snapshot_id changes with every edit of the playlist, asking for it alone is one small response
+        return self.get_client().playlist(playlist_id, fields="snapshot_id,name,owner.display_name")
+
+    def get_artist_albums(self, artist_id):
+        sp = self.get_client()
+        albums = []
+        results = sp.artist_albums(artist_id, include_groups="album,single", limit=50)
+        while results:
+            for item in results["items"]:
+                if not item or not item.get("id"):
+                    continue
+                albums.append(
+                    {
+                        "id": item["id"],
+                        "name": item["name"],
+                        "artist": item["artists"][0]["name"] if item["artists"] else None,
+                        "url": item["external_urls"]["spotify"],
+                    }
+                )
+            results = sp.next(results) if results.get("next") else None
+        return albums
+
+    def fill_track_isrcs(self, tracks):
+        # Album listings carry no ISRC, the several tracks endpoint returns 50 per call
+        missing_isrc = [track for track in tracks if not track["isrc"]]
+        sp = self.get_client()
+        for start in range(0, len(missing_isrc), 50):
+            batch = missing_isrc[start : start + 50]
+            results = sp.tracks([track["id"] for track in batch])
+            for track, item in zip(batch, results["tracks"]):
+                if item:
+                    track["isrc"] = item.get("external_ids", {}).get("isrc")
+        return tracks
+
+    def get_items(self, item_type, item_ids):
+        # Tracks, albums and artists come from the several-items endpoints, playlists have none and are fetched one by one
+        sp = self.get_client()
+        items = {}
+        if item_type == "playlist":
+            for playlist_id in item_ids:
+                try:
+                    item = sp.playlist(playlist_id, fields="id,name,owner(display_name),external_urls")
+                except spotipy.SpotifyException as e:
+                    logging.warning(f"Playlist {playlist_id} not found: {e}")
+                    continue
+                items[item["id"]] = {"type": "playlist", "name": item["name"], "artist": item["owner"]["display_name"], "url": item["external_urls"]["spotify"]}
+            return items
+        batch_size, fetch_items, result_key = {"track": (50, sp.tracks, "tracks"), "album": (20, sp.albums, "albums"), "artist": (50, sp.artists, "artists")}[item_type]
+        for start in range(0, len(item_ids), batch_size):
+            results = fetch_items(item_ids[start : start + batch_size])
+            for item in results[result_key]:
+                if not item:
+                    continue
+                items[item["id"]] = {
+                    "type": item_type,
+                    "name": item["name"],
+                    "artist": item["artists"][0]["name"] if item.get("artists") else item["name"],
+                    "url": item["external_urls"]["spotify"],
+                }
+        return items
+
+    def find_track(self, query):
+        results = self.get_client().search(q=query, limit=1, type="track")
+        for item in results["tracks"]["items"]:
+            return {"type": "track", "name": item["name"], "artist": item["artists"][0]["name"], "url": item["external_urls"]["spotify"]}
+        return None
+
+    def get_image(self, images):
+        return self.image_cache.get_proxy_url(select_image(images or [], self.config.thumbnail_size))
 
     def parse_spotify_data(self, results):
         parsed_results = {"tracks": [], "albums": [], "artists": [], "playlists": []}
@@ -42,7 +210,7 @@ class SpotifyService:
                         "artist": item["artists"][0]["name"],
                         "album": item["album"]["name"],
                         "url": item["external_urls"]["spotify"],
-                        "image": item["album"]["images"][0]["url"] if item["album"]["images"] else None,
+                        "image": self.get_image(item["album"]["images"]),
                     }
                 )
 
@@ -56,7 +224,7 @@ class SpotifyService:
                         "artist": item["artists"][0]["name"],
                         "release_date": item["release_date"],
                         "url": item["external_urls"]["spotify"],
-                        "image": item["images"][0]["url"] if item["images"] else None,
+                        "image": self.get_image(item["images"]),
                     }
                 )
 
@@ -69,7 +237,7 @@ class SpotifyService:
                         "name": item["name"],
                         "followers": item["followers"]["total"],
                         "url": item["external_urls"]["spotify"],
-                        "image": item["images"][0]["url"] if item["images"] else None,
+                        "image": self.get_image(item["images"]),
                     }
                 )
 
@@ -84,7 +252,7 @@ class SpotifyService:
                         "name": item["name"],
                         "owner": item["owner"]["display_name"],
                         "url": item["external_urls"]["spotify"],
-                        "image": item["images"][0]["url"] if item["images"] else None,
+                        "image": self.get_image(item["images"]),
                     }
                 )
 
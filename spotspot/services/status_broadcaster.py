@@ -0,0 +1,67 @@
+import logging
+import threading
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+
+class StatusBroadcaster:
+    def __init__(self, config, socketio, job_store):
+        self.config = config
+        self.socketio = socketio
+        self.job_store = job_store
+        self.lock = threading.Lock()
+        self.changed_jobs = {}
+        self.flush_scheduled = False
+
+    def job_changed(self, download_info):
+        self.jobs_changed([download_info])
+
+    def jobs_changed(self, download_infos):
+        download_infos = [download_info for download_info in download_infos if not download_info.get("parent_id")]
+        if not download_infos:
+            return
+        with self.lock:
+            for download_info in download_infos:
+                self.changed_jobs[download_info["id"]] = download_info
+            if self.flush_scheduled:
+                return
+            self.flush_scheduled = True
+        self.socketio.start_background_task(self._flush_after_window)
+
+    def _flush_after_window(self):
+        # Coalesce every change made during the window into a single delta
+        self.socketio.sleep(self.config.status_emit_interval)
+        with self.lock:
+            changed_jobs = [dict(job) for job in self.changed_jobs.values()]
+            self.changed_jobs = {}
+            self.flush_scheduled = False
+        changed_jobs.sort(key=lambda job: job["version"])
+        self.socketio.emit("status_delta", {"jobs": changed_jobs, "version": self.job_store.get_version()})
+
+    def get_status(self, status_req):
+        status_req = status_req or {}
+        try:
+            limit = min(int(status_req.get("limit") or self.config.status_page_size), self.config.status_page_size)
+        except (TypeError, ValueError):
+            limit = self.config.status_page_size
+        limit = max(1, limit)
+        version = self.job_store.get_version()
+        # A malformed cursor is answered with a full snapshot, the client starts over from its version
+        try:
+            since_version = int(status_req["since_version"]) if status_req.get("since_version") is not None else None
+            before_id = int(status_req["before_id"]) if status_req.get("before_id") is not None else None
+        except (TypeError, ValueError):
+            since_version = before_id = None
+
+        if since_version is not None:
+            jobs = self.job_store.get_changes_since(since_version, limit + 1)
+            has_more = len(jobs) > limit
+            jobs = jobs[:limit]
+            mode = "changes"
+        else:
+            jobs = self.job_store.get_history(limit + 1, before_id=before_id)
+            has_more = len(jobs) > limit
+            jobs = jobs[-limit:]
+            mode = "snapshot" if before_id is None else "older"
+
+        return {"jobs": [dict(job) for job in jobs], "version": version, "has_more": has_more, "mode": mode}
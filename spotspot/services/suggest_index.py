@@ -0,0 +1,214 @@
+import json
+import time
+import bisect
+import itertools
+import sqlite3
+import logging
+import threading
+import unicodedata
+from services import metrics
+from services.library_index import parse_spotify_url
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+result_keys = {"track": "tracks", "album": "albums", "artist": "artists", "playlist": "playlists"}
+# Second line of a result card, also searched so "artist title" finds a track
+subtitle_fields = {"track": ("artist", "album"), "album": ("artist",), "artist": (), "playlist": ("owner",)}
+# Prefixes matching more items than this are answered from the ranked lists instead
+max_candidates = 500
+# Ranked items checked per type for such a prefix before giving up on more matches
+max_ranked_scan = 5000
+
+
+def get_tokens(text):
+    # Case, accents and punctuation are ignored, "Beyoncé - Halo!" and "beyonce halo" match
+    folded = "".join(char for char in unicodedata.normalize("NFKD", text or "") if not unicodedata.combining(char)).lower()
+    return "".join(char if char.isalnum() else " " for char in folded).split()
+
+
+def get_item_key(url):
+    url_type, spotify_id = parse_spotify_url(url)
+    if spotify_id:
+        return f"{url_type}:{spotify_id}"
+    return (url or "").split("?", 1)[0].rstrip("/")
+
+
+class SuggestIndex:
+    def __init__(self, config):
+        self.config = config
+        self.lock = threading.RLock()
+        # Item key -> [result, hits, downloaded, seen_at, tokens]
+        self.entries = {}
+        # Sorted distinct tokens, a prefix is a contiguous run found by bisect
+        self.sorted_tokens = []
+        self.token_keys = {}
+        # (rank, key) per type in ascending order, kept sorted as items change
+        self.ranked_keys = {}
+        self.connection = sqlite3.connect(self.config.suggest_index_path, check_same_thread=False)
+        self._setup_database()
+        self._load()
+
+    def _setup_database(self):
+        with self.lock, self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS items (
+                    key TEXT PRIMARY KEY,
+                    data TEXT NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 1,
+                    downloaded INTEGER NOT NULL DEFAULT 0,
+                    seen_at REAL NOT NULL
+                )
+                """
+            )
+
+    def _load(self):
+        with self.lock:
+            rows = self.connection.execute("SELECT key, data, hits, downloaded, seen_at FROM items ORDER BY seen_at DESC LIMIT ?", (self.config.suggest_index_size,)).fetchall()
+            for key, data, hits, downloaded, seen_at in rows:
+                self._remember(key, json.loads(data), hits, bool(downloaded), seen_at)
+        logging.info(f"Loaded suggest index with {len(self.entries)} items, {len(self.sorted_tokens)} words")
+
+    def _get_item_tokens(self, result):
+        tokens = set(get_tokens(result.get("name")))
+        for field in subtitle_fields.get(result.get("type"), ()):
+            tokens.update(get_tokens(result.get(field)))
+        return tokens
+
+    def _remember(self, key, result, hits, downloaded, seen_at):
+        entry = self.entries.get(key)
+        tokens = self._get_item_tokens(result)
+        if entry is not None:
+            for token in entry[4] - tokens:
+                self._remove_token(token, key)
+            tokens_added = tokens - entry[4]
+            self._unrank(key, entry)
+        else:
+            tokens_added = tokens
+        for token in tokens_added:
+            token_keys = self.token_keys.get(token)
+            if token_keys is None:
+                token_keys = self.token_keys[token] = set()
+                bisect.insort(self.sorted_tokens, token)
+            token_keys.add(key)
+        entry = self.entries[key] = [result, hits, downloaded, seen_at, tokens]
+        bisect.insort(self.ranked_keys.setdefault(result.get("type"), []), (self._get_rank(entry), key))
+
+    def _remove_token(self, token, key):
+        token_keys = self.token_keys.get(token)
+        if token_keys is None:
+            return
+        token_keys.discard(key)
+        if not token_keys:
+            del self.token_keys[token]
+            del self.sorted_tokens[bisect.bisect_left(self.sorted_tokens, token)]
+
+    def _forget(self, key):
+        entry = self.entries.pop(key)
+        for token in entry[4]:
+            self._remove_token(token, key)
+        self._unrank(key, entry)
+
+    def _get_rank(self, entry):
+        return (entry[2], entry[1], entry[3])
+
+    def _unrank(self, key, entry):
+        ranked_keys = self.ranked_keys[entry[0].get("type")]
+        del ranked_keys[bisect.bisect_left(ranked_keys, (self._get_rank(entry), key))]
+
+    def _evict(self):
+        # Trimmed in steps of a tenth so a full index is not sorted on every search
+        if len(self.entries) <= self.config.suggest_index_size:
+            return []
+        keep_count = self.config.suggest_index_size * 9 // 10
+        evicted_keys = sorted(self.entries, key=lambda key: self._get_rank(self.entries[key]))[: len(self.entries) - keep_count]
+        for key in evicted_keys:
+            self._forget(key)
+        return evicted_keys
+
+    def add_results(self, parsed_results):
+        now = time.time()
+        rows = []
+        with self.lock:
+            for items in parsed_results.values():
+                for result in items:
+                    key = get_item_key(result.get("url"))
+                    if not key:
+                        continue
+                    entry = self.entries.get(key)
+                    hits, downloaded = (entry[1] + 1, entry[2]) if entry is not None else (1, False)
+                    self._remember(key, result, hits, downloaded, now)
+                    rows.append((key, json.dumps(result), now))
+            evicted_keys = self._evict()
+            with self.connection:
+                self.connection.executemany(
+                    "INSERT INTO items (key, data, seen_at) VALUES (?, ?, ?) ON CONFLICT (key) DO UPDATE SET data = excluded.data, hits = hits + 1, seen_at = excluded.seen_at",
+                    rows,
+                )
+                self.connection.executemany("DELETE FROM items WHERE key = ?", [(key,) for key in evicted_keys])
+
+    def add_download(self, download_info):
+        key = get_item_key(download_info.get("url"))
+        if not key or download_info.get("type") not in result_keys:
+            return
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                result, hits = entry[0], entry[1] + 1
+            else:
+                # Tracks of a collection were never in a search result, the job has enough for a card
+                result = {"type": download_info["type"], "name": download_info.get("name"), "url": download_info["url"], "image": None}
+                result["owner" if download_info["type"] == "playlist" else "artist"] = download_info.get("artist")
+                hits = 1
+            self._remember(key, result, hits, True, now)
+            evicted_keys = self._evict()
+            with self.connection:
+                self.connection.execute(
+                    "INSERT INTO items (key, data, downloaded, seen_at) VALUES (?, ?, 1, ?) ON CONFLICT (key) DO UPDATE SET hits = hits + 1, downloaded = 1, seen_at = excluded.seen_at",
+                    (key, json.dumps(result), now),
+                )
+                self.connection.executemany("DELETE FROM items WHERE key = ?", [(key,) for key in evicted_keys])
+
+    def _matches(self, entry, query_tokens):
+        return all(any(token.startswith(query_token) for token in entry[4]) for query_token in query_tokens)
+
+    def suggest(self, query, search_type="all", limit=10):
+        with metrics.suggest_seconds.time():
+            query_tokens = get_tokens(query)
+            if not query_tokens:
+                return {}
+            # The longest word narrows the candidates most, the others only filter them
+            query_tokens.sort(key=len, reverse=True)
+            lead_token = query_tokens[0]
+            search_types = list(result_keys) if search_type == "all" else [search_type]
+            suggestions = {}
+            with self.lock:
+                candidate_keys = set()
+                position = bisect.bisect_left(self.sorted_tokens, lead_token)
+                while position < len(self.sorted_tokens) and self.sorted_tokens[position].startswith(lead_token) and len(candidate_keys) <= max_candidates:
+                    candidate_keys.update(self.token_keys[self.sorted_tokens[position]])
+                    position += 1
+                if len(candidate_keys) > max_candidates:
+                    # A short prefix matches most of the index, the best ranked items are checked until enough match
+                    for item_type in search_types:
+                        items = []
+                        for _, key in itertools.islice(reversed(self.ranked_keys.get(item_type, [])), max_ranked_scan):
+                            entry = self.entries[key]
+                            if self._matches(entry, query_tokens):
+                                items.append(entry[0])
+                                if len(items) >= limit:
+                                    break
+                        if items:
+                            suggestions[result_keys[item_type]] = items
+                    return suggestions
+                matches = [self.entries[key] for key in candidate_keys]
+            matches = [entry for entry in matches if entry[0]["type"] in search_types and self._matches(entry, query_tokens[1:])]
+            matches.sort(key=self._get_rank, reverse=True)
+            for entry in matches:
+                items = suggestions.setdefault(result_keys[entry[0]["type"]], [])
+                if len(items) < limit:
+                    items.append(entry[0])
+            return suggestions
@@ -0,0 +1,185 @@
+import json
+import time
+import sqlite3
+import logging
+import threading
+from services.library_index import parse_spotify_url
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+watch_types = ("playlist", "artist")
+
+
+class WatchScheduler:
+    def __init__(self, config, spotify_service, download_service):
+        self.config = config
+        self.spotify_service = spotify_service
+        self.download_service = download_service
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.started = False
+        # Watches live next to the jobs, a web node registers them and a download node syncs them
+        self.connection = sqlite3.connect(self.config.database_path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self._setup_database()
+
+    def _setup_database(self):
+        with self.lock, self.connection:
+            self.connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS watches (
+                    key TEXT PRIMARY KEY,
+                    type TEXT NOT NULL,
+                    spotify_id TEXT NOT NULL,
+                    url TEXT NOT NULL,
+                    name TEXT,
+                    artist TEXT,
+                    requester TEXT,
+                    snapshot_id TEXT,
+                    item_ids TEXT,
+                    created_at REAL NOT NULL,
+                    checked_at REAL,
+                    changed_at REAL,
+                    next_sync_at REAL NOT NULL
+                )
+                """
+            )
+
+    def add_watch(self, data, requester=None):
+        url_type, spotify_id = parse_spotify_url(data.get("url"))
+        if url_type not in watch_types or not spotify_id:
+            return None
+        key = f"{url_type}:{spotify_id}"
+        now = time.time()
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT INTO watches (key, type, spotify_id, url, name, artist, requester, created_at, next_sync_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET name = excluded.name, artist = excluded.artist, requester = excluded.requester",
+                (key, url_type, spotify_id, f"https://open.spotify.com/{url_type}/{spotify_id}", data.get("name"), data.get("artist"), requester, now, now),
+            )
+        logging.info(f"Watching {url_type} {data.get('name')} ({spotify_id})")
+        self.wakeup.set()
+        return key
+
+    def remove_watch(self, url):
+        url_type, spotify_id = parse_spotify_url(url)
+        with self.lock, self.connection:
+            removed = self.connection.execute("DELETE FROM watches WHERE key = ?", (f"{url_type}:{spotify_id}",)).rowcount
+        if removed:
+            logging.info(f"Stopped watching {url_type} {spotify_id}")
+        return bool(removed)
+
+    def get_watches(self):
+        with self.lock:
+            rows = self.connection.execute("SELECT * FROM watches ORDER BY type DESC, name COLLATE NOCASE").fetchall()
+        return [
+            {
+                "url": row["url"],
+                "type": row["type"],
+                "name": row["name"],
+                "artist": row["artist"],
+                "item_count": len(json.loads(row["item_ids"])) if row["item_ids"] is not None else None,
+                "checked_at": row["checked_at"],
+                "changed_at": row["changed_at"],
+                "next_sync_at": row["next_sync_at"],
+            }
+            for row in rows
+        ]
+
+    def start(self):
+        if self.started:
+            return
+        self.started = True
+        threading.Thread(target=self._run, name="watch-scheduler", daemon=True).start()
+
+    def _run(self):
+        while True:
+            try:
+                next_sync_at = self.sync_due_watches()
+            except Exception as e:
+                logging.error(f"Watch sync failed: {e}")
+                next_sync_at = None
+            # New watches from this node wake the loop, those from a web node are found on the next check
+            delay = self.config.watch_check_interval
+            if next_sync_at is not None:
+                delay = max(0, min(delay, next_sync_at - time.time()))
+            self.wakeup.wait(delay)
+            self.wakeup.clear()
+
+    def sync_due_watches(self):
+        now = time.time()
+        with self.lock:
+            due_watches = [dict(row) for row in self.connection.execute("SELECT * FROM watches WHERE next_sync_at <= ? ORDER BY next_sync_at", (now,))]
+        for watch in due_watches:
+            if self._claim(watch, now + self.config.watch_sync_interval):
+                self.sync_watch(watch)
+        with self.lock:
+            return self.connection.execute("SELECT MIN(next_sync_at) FROM watches").fetchone()[0]
+
+    def _claim(self, watch, next_sync_at):
+        # Several download nodes share the table, only the one that moves the due time syncs
+        with self.lock, self.connection:
+            return self.connection.execute("UPDATE watches SET next_sync_at = ? WHERE key = ? AND next_sync_at = ?", (next_sync_at, watch["key"], watch["next_sync_at"])).rowcount == 1
+
+    def _save(self, key, **fields):
+        assignments = ", ".join(f"{field} = ?" for field in fields)
+        with self.lock, self.connection:
+            self.connection.execute(f"UPDATE watches SET {assignments} WHERE key = ?", (*fields.values(), key))
+
+    def sync_watch(self, watch):
+        try:
+            if watch["type"] == "playlist":
+                self._sync_playlist(watch)
+            else:
+                self._sync_artist(watch)
+        except Exception as e:
+            logging.warning(f"Could not sync watched {watch['type']} {watch['url']}: {e}")
+
+    def _get_known_ids(self, watch):
+        # Nothing is known before the first sync, so everything counts as added
+        return set(json.loads(watch["item_ids"])) if watch["item_ids"] is not None else set()
+
+    def _sync_playlist(self, watch):
+        snapshot = self.spotify_service.get_playlist_snapshot(watch["spotify_id"])
+        now = time.time()
+        if snapshot["snapshot_id"] == watch["snapshot_id"] and not self._last_download_failed(watch):
+            logging.info(f"Watched playlist unchanged: {watch['name']}")
+            self._save(watch["key"], checked_at=now)
+            return
+
+        tracks = self.spotify_service.get_collection_tracks("playlist", watch["spotify_id"])
+        track_ids = [track["id"] for track in tracks]
+        known_ids = self._get_known_ids(watch)
+        added_ids = set(track_ids) - known_ids
+        name = snapshot.get("name") or watch["name"]
+        artist = (snapshot.get("owner") or {}).get("display_name") or watch["artist"]
+        logging.info(f"Watched playlist changed: {name}, {len(added_ids)} tracks added, {len(known_ids - set(track_ids))} removed")
+        # Also runs without added tracks, a reordered or shortened playlist still gets a new M3U
+        download_info = self.download_service.add_playlist_update({"url": watch["url"], "name": name, "artist": artist}, tracks, watch["requester"])
+        if download_info is None:
+            # A job for the whole playlist is running, it may predate the change so the playlist is checked again soon
+            self._save(watch["key"], checked_at=now, next_sync_at=now + self.config.watch_check_interval)
+            return
+        self._save(watch["key"], name=name, artist=artist, snapshot_id=snapshot["snapshot_id"], item_ids=json.dumps(track_ids), checked_at=now, changed_at=now)
+
+    def _last_download_failed(self, watch):
+        # An unchanged playlist is updated again while tracks from its last download are missing
+        jobs = self.download_service.job_store.find_jobs_by_url(watch["url"])
+        return bool(jobs) and jobs[-1]["status"] == "Failed"
+
+    def _sync_artist(self, watch):
+        # Artists have no snapshot_id, their release list is compared instead
+        albums = self.spotify_service.get_artist_albums(watch["spotify_id"])
+        now = time.time()
+        known_ids = self._get_known_ids(watch)
+        new_albums = [album for album in albums if album["id"] not in known_ids]
+        if new_albums:
+            logging.info(f"Watched artist {watch['name']} has {len(new_albums)} new releases")
+            self.download_service.add_items_to_queue(
+                [{"url": album["url"], "type": "album", "name": album["name"], "artist": album["artist"]} for album in new_albums],
+                watch["requester"],
+            )
+            self._save(watch["key"], item_ids=json.dumps([album["id"] for album in albums]), checked_at=now, changed_at=now)
+        else:
+            logging.info(f"Watched artist unchanged: {watch['name']}")
+            self._save(watch["key"], item_ids=json.dumps([album["id"] for album in albums]), checked_at=now)
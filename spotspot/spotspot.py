@@ -1,73 +1,250 @@
+import time
+
+import_started = time.perf_counter()
+
+import os
+import uuid
 import queue
+import signal
 import logging
 import threading
 from flask_socketio import SocketIO
-from flask import Flask, render_template
+from flask import Flask, Response, jsonify, render_template, request, session
+from services import metrics
+from services.job_store import JobStore
 from services.config_service import ConfigService
 from services.spotfiy_service import SpotifyService
 from services.download_service import DownloadService
+from services.status_broadcaster import StatusBroadcaster
 from services.playlist_manager import PlaylistManager
+from services.search_dispatcher import SearchDispatcher
+from services.media_refresh_scheduler import MediaRefreshScheduler
+from services.library_index import LibraryIndex
+from services.bulk_import import BulkImporter
+from services.job_broker import create_job_broker
+from services.download_node import RemoteDownloadService
+from services.watch_scheduler import WatchScheduler
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
 
 class SpotSpotWebApp:
     def __init__(self):
+        init_started = time.perf_counter()
+        self.first_request_seconds = None
         # Setup Flask App
         self.app = Flask(__name__)
         self.app.secret_key = "SECRET_KEY"
-        self.socketio = SocketIO(self.app)
+        self.config = ConfigService()
+        self.socketio = metrics.count_socket_emits(SocketIO(self.app, message_queue=self.config.socketio_message_queue or None))
         # Setup Data
         self.download_queue = queue.Queue()
-        self.download_history = {}
         self.active_downloads = {}
         # Instantiate
-        self.config = ConfigService()
+        self.job_store = JobStore(self.config)
+        self.status_broadcaster = StatusBroadcaster(self.config, self.socketio, self.job_store)
         self.spotify_services = SpotifyService(self.config)
-        self.playlist_manager = PlaylistManager(self.config)
-        self.download_services = DownloadService(self.config, self.playlist_manager, self.socketio, self.download_queue, self.download_history)
+        self.search_dispatcher = SearchDispatcher(self.config, self.socketio, self.spotify_services)
+        if self.config.spotspot_role == "web":
+            # Downloads run on separate nodes, see worker.py
+            self.job_broker = create_job_broker(self.config)
+            self.download_services = RemoteDownloadService(self.config, self.job_broker)
+        else:
+            self.playlist_manager = PlaylistManager(self.config)
+            self.media_refresh_scheduler = MediaRefreshScheduler(self.config, self.playlist_manager)
+            self.library_index = LibraryIndex(self.config)
+            self.download_services = DownloadService(
+                self.config,
+                self.playlist_manager,
+                self.socketio,
+                self.download_queue,
+                self.job_store,
+                self.status_broadcaster,
+                self.media_refresh_scheduler,
+                self.spotify_services,
+                self.library_index,
+            )
+        self.bulk_importer = BulkImporter(self.config, self.spotify_services, self.download_services)
+        self.watch_scheduler = WatchScheduler(self.config, self.spotify_services, self.download_services)
         # Setup Routes
         self.setup_routes()
+        self.setup_reload_signal()
         self.start_download_thread()
+        logging.info(f"SpotSpot started: imports {init_started - import_started:.2f}s, config {self.config.load_seconds:.2f}s, services {time.perf_counter() - init_started:.2f}s")
+
+    def get_client_id(self):
+        # Stable across reconnects, so a client can still cancel what it queued before a reload
+        if "client_id" not in session:
+            session["client_id"] = uuid.uuid4().hex
+        return session["client_id"]
+
+    def reload_config(self):
+        try:
+            self.config.reload()
+        except Exception as e:
+            logging.error(f"Config reload failed, keeping the current settings: {e}")
+
+    def setup_reload_signal(self):
+        if os.name != "posix":
+            return
+        try:
+            signal.signal(signal.SIGHUP, lambda signum, frame: threading.Thread(target=self.reload_config, daemon=True).start())
+        except ValueError:
+            logging.warning("Config reload on SIGHUP is only available from the main thread")
 
     def setup_routes(self):
+        @self.app.before_request
+        def report_first_request():
+            if self.first_request_seconds is None:
+                self.first_request_seconds = time.perf_counter() - import_started
+                logging.info(f"First request served {self.first_request_seconds:.2f}s after import")
+
         @self.app.route("/")
         def index_page():
+            self.get_client_id()
             return render_template("index.html")
 
         @self.app.route("/status")
         def status_page():
+            self.get_client_id()
             return render_template("status.html")
 
+        @self.app.route("/api/bulk_download", methods=["POST"])
+        def bulk_download():
+            requester = self.get_client_id()
+            upload = request.files.get("file")
+            if upload is not None:
+                text = upload.read().decode("utf-8", "replace")
+                return jsonify(self.bulk_importer.import_text(text, upload.filename, requester, request.form.get("priority")))
+            if request.is_json:
+                return jsonify(self.import_bulk_request(request.get_json(silent=True) or {}, requester))
+            return jsonify(self.bulk_importer.import_text(request.get_data(as_text=True), requester=requester))
+
+        @self.app.route("/img/<image_id>")
+        def image_proxy(image_id):
+            return self.spotify_services.image_cache.get_response(image_id, request.if_none_match)
+
+        @self.app.route("/metrics")
+        def metrics_page():
+            return Response(metrics.registry.render(), mimetype="text/plain; version=0.0.4")
+
         @self.socketio.on("search")
         def handle_search(query_req):
             if not query_req.get("query"):
-                self.socketio.emit("toast", {"title": "Blank Search Query", "body": "Please enter search request"})
-                parsed_results = {}
+                self.search_dispatcher.cancel(request.sid)
+                self.socketio.emit("toast", {"title": "Blank Search Query", "body": "Please enter search request"}, to=request.sid)
+                self.socketio.emit("search_results", {"results": {}, "request_id": query_req.get("request_id")}, to=request.sid)
+            else:
+                self.search_dispatcher.submit(request.sid, query_req)
+
+        @self.socketio.on("suggest")
+        def handle_suggest(suggest_req):
+            query = suggest_req.get("query") or ""
+            suggestions = self.spotify_services.suggest_index.suggest(query, suggest_req.get("type", "track"), self.config.search_limit)
+            # Spotify is only asked when the local index knows too little about what was typed
+            searching = sum(len(items) for items in suggestions.values()) < self.config.suggest_min_results and len(query.strip()) >= self.config.suggest_min_query_length
+            metrics.suggest_total.inc(source="spotify" if searching else "local")
+            self.socketio.emit("suggestions", {"results": suggestions, "request_id": suggest_req.get("request_id"), "searching": searching}, to=request.sid)
+            if searching:
+                self.search_dispatcher.submit(request.sid, suggest_req)
             else:
-                parsed_results = self.spotify_services.perform_spotify_search(query_req)
-            self.socketio.emit("search_results", {"results": parsed_results})
+                self.search_dispatcher.cancel(request.sid)
+
+        @self.socketio.on("disconnect")
+        def handle_disconnect(*args):
+            self.search_dispatcher.cancel(request.sid)
 
         @self.socketio.on("download_item")
         def handle_download(requested_item):
-            self.download_services.add_item_to_queue(requested_item)
+            self.download_services.add_item_to_queue(requested_item, requester=self.get_client_id())
+
+        @self.socketio.on("download_items")
+        def handle_download_items(bulk_req):
+            sid = request.sid
+            requester = self.get_client_id()
+
+            def import_in_background():
+                result = self.import_bulk_request(bulk_req or {}, requester)
+                self.socketio.emit("bulk_download_result", result, to=sid)
+
+            # Resolving thousands of entries takes a while, the handler returns at once
+            self.socketio.start_background_task(import_in_background)
+
+        @self.socketio.on("watch_item")
+        def handle_watch(watch_req):
+            if self.watch_scheduler.add_watch(watch_req, requester=self.get_client_id()) is None:
+                self.socketio.emit("toast", {"title": "Cannot Watch", "body": "Only playlists and artists can be watched"}, to=request.sid)
+                return
+            self.socketio.emit("toast", {"title": "Watching", "body": f"New songs in {watch_req.get('name')} are downloaded automatically"}, to=request.sid)
+            self.socketio.emit("watches", {"watches": self.watch_scheduler.get_watches()}, to=request.sid)
+
+        @self.socketio.on("unwatch_item")
+        def handle_unwatch(watch_req):
+            self.watch_scheduler.remove_watch(watch_req.get("url"))
+            self.socketio.emit("watches", {"watches": self.watch_scheduler.get_watches()}, to=request.sid)
+
+        @self.socketio.on("get_watches")
+        def handle_get_watches():
+            self.socketio.emit("watches", {"watches": self.watch_scheduler.get_watches()}, to=request.sid)
 
         @self.socketio.on("get_status")
-        def handle_get_status():
-            self.socketio.emit("update_status", {"history": list(self.download_history.values())})
+        def handle_get_status(status_req=None):
+            self.socketio.emit("update_status", self.status_broadcaster.get_status(status_req), to=request.sid)
+            self.socketio.emit("admission_status", self.download_services.get_admission_status(), to=request.sid)
+            for progress in self.download_services.get_active_progress():
+                self.socketio.emit("download_progress", progress, to=request.sid)
+
+        @self.socketio.on("get_scheduler_stats")
+        def handle_get_scheduler_stats():
+            self.socketio.emit("scheduler_stats", self.download_services.get_scheduler_stats(), to=request.sid)
 
         @self.socketio.on("cancel_all")
         def cancel_all():
             logging.info(f"Request to cancel all download recieved")
-            self.download_services.cancel_active_download()
-            self.download_services.cancel_pending_downloads()
+            self.download_services.cancel_active_download(requester=self.get_client_id())
+            self.download_services.cancel_pending_downloads(requester=self.get_client_id())
+
+        @self.socketio.on("get_failed_jobs")
+        def handle_get_failed_jobs():
+            failed_jobs = self.job_store.get_failed_jobs(self.config.status_page_size)
+            self.socketio.emit("failed_jobs", {"jobs": failed_jobs}, to=request.sid)
+
+        @self.socketio.on("retry_failed")
+        def retry_failed():
+            logging.info(f"Request to retry failed downloads recieved")
+            self.download_services.retry_failed_jobs(requester=self.get_client_id())
 
         @self.socketio.on("cancel_active")
         def cancel_active():
             logging.info(f"Request to cancel active download recieved")
-            self.download_services.cancel_active_download()
+            self.download_services.cancel_active_download(requester=self.get_client_id())
+
+    def import_bulk_request(self, bulk_req, requester):
+        if isinstance(bulk_req.get("urls"), list):
+            return self.bulk_importer.import_values(bulk_req["urls"], requester, bulk_req.get("priority"))
+        return self.bulk_importer.import_text(str(bulk_req.get("text") or ""), bulk_req.get("file_name"), requester, bulk_req.get("priority"))
+
+    def relay_node_events(self):
+        subscription = self.job_broker.subscribe("events")
+        while True:
+            try:
+                _, message = subscription.get(timeout=30)
+            except Exception as e:
+                logging.error(f"Job broker error: {e}")
+                self.socketio.sleep(self.config.broker_poll_interval)
+                continue
+            if message is not None:
+                self.socketio.emit(message["event"], message["data"])
 
     def start_download_thread(self):
+        if self.config.spotspot_role == "web":
+            # With a Socket.IO message queue the download nodes emit to the clients themselves
+            if not self.config.socketio_message_queue:
+                self.socketio.start_background_task(self.relay_node_events)
+            self.download_services.start()
+            return
+        self.library_index.start_scanner()
+        self.watch_scheduler.start()
         download_thread = threading.Thread(target=self.download_services.process_downloads, daemon=True)
         download_thread.start()
 
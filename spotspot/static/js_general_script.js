@@ -3,19 +3,19 @@ const searchButton = document.getElementById('search-button');
 const spinnerBorder = document.getElementById('spinner-border');
 const searchInput = document.getElementById('search-input');
 const searchDropdown = document.getElementById('search-dropdown');
+const loadMoreButton = document.getElementById('load-more-button');
 let selectedType = "track";
+let searchRequestId = 0;
+let suggestTimer = null;
+let currentSearch = null;
+let nextOffset = null;
 
 function changeUI(reqState) {
+    // Inputs stay enabled while busy so a new search can replace the one in flight
     if (reqState === "busy") {
-        searchInput.disabled = true;
-        searchButton.disabled = true;
-        searchDropdown.disabled = true;
         spinnerBorder.style.display = 'inline-block';
     } else {
         spinnerBorder.style.display = 'none';
-        searchInput.disabled = false;
-        searchButton.disabled = false;
-        searchDropdown.disabled = false;
     }
 }
 
@@ -25,9 +25,26 @@ function updateSelection(option) {
 }
 
 function initiateSearch() {
+    clearTimeout(suggestTimer);
     changeUI("busy");
-    const searchText = searchInput.value;
-    socket.emit('search', { query: searchText, type: selectedType });
+    currentSearch = { query: searchInput.value, type: selectedType };
+    searchRequestId += 1;
+    socket.emit('search', { ...currentSearch, request_id: searchRequestId });
+}
+
+function loadMore() {
+    if (!currentSearch || nextOffset === null) {
+        return;
+    }
+    changeUI("busy");
+    loadMoreButton.style.display = 'none';
+    searchRequestId += 1;
+    socket.emit('search', { ...currentSearch, offset: nextOffset, request_id: searchRequestId });
+}
+
+function setNextOffset(offset) {
+    nextOffset = offset === undefined ? null : offset;
+    loadMoreButton.style.display = nextOffset === null ? 'none' : 'inline-block';
 }
 
 function populateTemplate(type, data) {
@@ -48,6 +65,7 @@ function populateTemplate(type, data) {
     const clone = document.importNode(template.content, true);
 
     const downloadButton = clone.querySelector('.download');
+    const watchButton = clone.querySelector('.watch');
 
     if (type === 'track') {
         clone.querySelector('.track-img').src = data.image || 'https://picsum.photos/300';
@@ -64,7 +82,7 @@ function populateTemplate(type, data) {
     } else if (type === 'artist') {
         clone.querySelector('.artist-img').src = data.image || 'https://picsum.photos/300';
         clone.querySelector('.name').textContent = data.name;
-        clone.querySelector('.followers').textContent = `${data.followers} Followers`;
+        clone.querySelector('.followers').textContent = data.followers !== undefined ? `${data.followers} Followers` : '';
         clone.querySelector('.download').href = data.url;
         clone.querySelector('.download').setAttribute('data-url', data.url);
     } else if (type === 'playlist') {
@@ -82,6 +100,30 @@ function populateTemplate(type, data) {
         event.preventDefault();
         handleDownloadClick(event);
     });
+
+    if (watchButton) {
+        watchButton.href = data.url;
+        watchButton.setAttribute('data-url', data.url);
+        watchButton.addEventListener('click', function (event) {
+            event.preventDefault();
+            handleWatchClick(event, type, data);
+        });
+    }
+}
+
+function handleWatchClick(event, type, data) {
+    const button = event.target;
+
+    button.disabled = true;
+    button.classList.add('disabled');
+    button.innerText = 'Watching';
+
+    socket.emit('watch_item', {
+        type: type,
+        name: data.name,
+        artist: data.owner || null,
+        url: button.getAttribute('data-url')
+    });
 }
 
 function handleDownloadClick(event) {
@@ -118,26 +160,63 @@ searchInput.addEventListener('keydown', function (event) {
     }
 });
 
+searchInput.addEventListener('input', function () {
+    // Suggestions come from the server's local index, it only asks Spotify when it knows too little
+    clearTimeout(suggestTimer);
+    const searchText = searchInput.value;
+    if (!searchText.trim()) {
+        return;
+    }
+    suggestTimer = setTimeout(function () {
+        currentSearch = { query: searchText, type: selectedType };
+        searchRequestId += 1;
+        socket.emit('suggest', { ...currentSearch, request_id: searchRequestId });
+    }, 150);
+});
+
 searchButton.addEventListener('click', initiateSearch);
+loadMoreButton.addEventListener('click', loadMore);
 
-socket.on('search_results', function (data) {
-    changeUI("ready");
+function renderResults(results, append) {
     const resultsSection = document.getElementById('results-section');
-    resultsSection.innerHTML = '';
+    if (!append) {
+        resultsSection.innerHTML = '';
+    }
 
-    if (data && data.results) {
-        for (let category in data.results) {
-            let items = data.results[category];
+    if (results) {
+        for (let category in results) {
+            let items = results[category];
 
             if (Array.isArray(items) && items.length > 0) {
                 items.forEach(item => {
                     populateTemplate(item.type, item);
                 });
-            } else {
+            } else if (!append) {
                 const noResultsMessage = document.createElement('p');
                 noResultsMessage.textContent = 'No results found';
                 resultsSection.appendChild(noResultsMessage);
             }
         }
     }
+}
+
+socket.on('suggestions', function (data) {
+    if (data.request_id !== searchRequestId) {
+        return;
+    }
+    changeUI(data.searching ? "busy" : "ready");
+    setNextOffset(null);
+    if (!data.searching || Object.keys(data.results).length > 0) {
+        renderResults(data.results);
+    }
+});
+
+socket.on('search_results', function (data) {
+    if (data.request_id !== undefined && data.request_id !== null && data.request_id !== searchRequestId) {
+        return;
+    }
+    changeUI("ready");
+    // Later pages are added below the ones already shown
+    renderResults(data.results, data.offset > 0);
+    setNextOffset(data.next_offset);
 });
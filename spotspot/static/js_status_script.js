@@ -1,51 +1,216 @@
 const socket = io();
 const cancelActive = document.getElementById('cancel-active-button');
 const cancelAll = document.getElementById('cancel-all-button');
+const retryFailed = document.getElementById('retry-failed-button');
+const loadMore = document.getElementById('load-more-button');
+const admissionAlert = document.getElementById('admission-alert');
+const historyContainer = document.getElementById("history-body");
+const historyRows = new Map();
+const jobProgress = new Map();
+let lastVersion = null;
+let oldestId = null;
 
 window.onload = function () {
     socket.emit("get_status");
+    socket.emit("get_watches");
 };
 
+function formatTime(timestamp) {
+    return timestamp ? new Date(timestamp * 1000).toLocaleString() : "Never";
+}
+
+socket.on("watches", function (data) {
+    const watchesBody = document.getElementById("watches-body");
+    watchesBody.innerHTML = "";
+    document.getElementById("watches-container").style.display = data.watches.length ? "block" : "none";
+    data.watches.forEach(function (watch) {
+        const row = document.createElement("tr");
+        [watch.name || watch.url, watch.type, formatTime(watch.checked_at), formatTime(watch.changed_at)].forEach(function (text) {
+            const cell = document.createElement("td");
+            cell.textContent = text;
+            row.appendChild(cell);
+        });
+        const buttonCell = document.createElement("td");
+        const unwatchButton = document.createElement("button");
+        unwatchButton.type = "button";
+        unwatchButton.className = "btn btn-sm btn-outline-danger";
+        unwatchButton.textContent = "Unwatch";
+        unwatchButton.addEventListener("click", function () {
+            socket.emit("unwatch_item", { url: watch.url });
+        });
+        buttonCell.appendChild(unwatchButton);
+        row.appendChild(buttonCell);
+        watchesBody.appendChild(row);
+    });
+});
+
+socket.on("connect", function () {
+    if (lastVersion !== null) {
+        socket.emit("get_status", { since_version: lastVersion });
+    }
+});
+
+function createRow(item) {
+    const row = document.createElement("tr");
+    row.dataset.id = item.id;
+
+    const nameCell = document.createElement("td");
+    row.appendChild(nameCell);
+
+    const typeCell = document.createElement("td");
+    row.appendChild(typeCell);
+
+    const artistCell = document.createElement("td");
+    row.appendChild(artistCell);
+
+    const urlCell = document.createElement("td");
+    const urlLink = document.createElement("a");
+    urlLink.target = "_blank";
+    urlCell.appendChild(urlLink);
+    row.appendChild(urlCell);
+
+    const statusCell = document.createElement("td");
+    row.appendChild(statusCell);
+
+    return row;
+}
+
+function fillRow(row, item) {
+    row.dataset.version = item.version;
+    row.cells[0].textContent = item.name;
+    row.cells[1].textContent = item.type;
+    row.cells[2].textContent = item.artist;
+    row.cells[3].firstChild.href = item.url;
+    row.cells[3].firstChild.textContent = item.url;
+    row.dataset.status = item.status;
+    row.dataset.error = item.error || "";
+    if (item.status !== "Downloading...") {
+        jobProgress.delete(item.id);
+    }
+    renderStatus(row);
+}
+
+function formatSeconds(seconds) {
+    if (seconds < 60) {
+        return `${Math.round(seconds)}s`;
+    }
+    return `${Math.floor(seconds / 60)}m ${Math.round(seconds % 60)}s`;
+}
+
+function formatProgress(progress) {
+    const parts = [];
+    if (progress.total) {
+        parts.push(`${progress.completed}/${progress.total}`);
+    } else if (progress.completed) {
+        parts.push(`${progress.completed} done`);
+    }
+    if (progress.failed) {
+        parts.push(`${progress.failed} failed`);
+    }
+    if (progress.tracks_per_minute) {
+        parts.push(`${progress.tracks_per_minute} tracks/min`);
+    }
+    if (progress.eta_seconds !== null) {
+        parts.push(`ETA ${formatSeconds(progress.eta_seconds)}`);
+    }
+    if (progress.idle_seconds >= 60) {
+        parts.push(`idle ${formatSeconds(progress.idle_seconds)}`);
+    }
+    return parts.join(" · ");
+}
+
+function renderStatus(row) {
+    const progress = jobProgress.get(Number(row.dataset.id));
+    const status = row.dataset.status;
+    row.cells[4].textContent = progress && status === "Downloading..." ? `${status} ${formatProgress(progress)}` : status;
+    row.cells[4].title = row.dataset.error;
+}
+
+function insertRow(row, id) {
+    // Rows are kept in job id order, new jobs almost always go at the end
+    const lastRow = historyContainer.lastElementChild;
+    if (!lastRow || Number(lastRow.dataset.id) < id) {
+        historyContainer.appendChild(row);
+        return;
+    }
+    for (const existingRow of historyContainer.children) {
+        if (Number(existingRow.dataset.id) > id) {
+            historyContainer.insertBefore(row, existingRow);
+            return;
+        }
+    }
+    historyContainer.appendChild(row);
+}
+
+function applyJob(item) {
+    let row = historyRows.get(item.id);
+    if (row) {
+        if (Number(row.dataset.version) >= item.version) {
+            return;
+        }
+    } else {
+        row = createRow(item);
+        historyRows.set(item.id, row);
+        insertRow(row, item.id);
+    }
+    fillRow(row, item);
+    if (oldestId === null || item.id < oldestId) {
+        oldestId = item.id;
+    }
+}
+
+function updateEmptyMessage() {
+    document.getElementById("no-downloads-msg").style.display = historyRows.size === 0 ? "block" : "none";
+}
+
 socket.on("update_status", function (data) {
-    const historyContainer = document.getElementById("history-body");
-    historyContainer.innerHTML = "";
+    if (data.mode === "snapshot") {
+        historyContainer.innerHTML = "";
+        historyRows.clear();
+        oldestId = null;
+    }
+
+    data.jobs.forEach(applyJob);
+    updateEmptyMessage();
 
-    if (data.history.length === 0) {
-        document.getElementById("no-downloads-msg").style.display = "block";
+    if (data.mode === "changes") {
+        if (data.has_more) {
+            lastVersion = data.jobs[data.jobs.length - 1].version;
+            socket.emit("get_status", { since_version: lastVersion });
+        } else {
+            lastVersion = Math.max(lastVersion, data.version);
+        }
     } else {
-        document.getElementById("no-downloads-msg").style.display = "none";
-        data.history.forEach(function (item) {
-            const row = document.createElement("tr");
-
-            const nameCell = document.createElement("td");
-            nameCell.textContent = item.name;
-            row.appendChild(nameCell);
-
-            const typeCell = document.createElement("td");
-            typeCell.textContent = item.type;
-            row.appendChild(typeCell);
-
-            const artistCell = document.createElement("td");
-            artistCell.textContent = item.artist;
-            row.appendChild(artistCell);
-
-            const urlCell = document.createElement("td");
-            const urlLink = document.createElement("a");
-            urlLink.href = item.url;
-            urlLink.textContent = item.url;
-            urlLink.target = "_blank";
-            urlCell.appendChild(urlLink);
-            row.appendChild(urlCell);
-
-            const statusCell = document.createElement("td");
-            statusCell.textContent = item.status;
-            row.appendChild(statusCell);
-
-            historyContainer.appendChild(row);
-        });
+        if (data.mode === "snapshot") {
+            lastVersion = data.version;
+        }
+        loadMore.style.display = data.has_more ? "inline-block" : "none";
+    }
+});
+
+socket.on("status_delta", function (data) {
+    data.jobs.forEach(applyJob);
+    updateEmptyMessage();
+    lastVersion = Math.max(lastVersion || 0, data.version);
+});
+
+socket.on("download_progress", function (progress) {
+    jobProgress.set(progress.id, progress);
+    const row = historyRows.get(progress.id);
+    if (row) {
+        renderStatus(row);
     }
 });
 
+socket.on("admission_status", function (data) {
+    admissionAlert.textContent = data.paused ? `Downloads paused: ${data.reason}. They resume automatically.` : "";
+    admissionAlert.style.display = data.paused ? "block" : "none";
+});
+
+loadMore.addEventListener('click', function () {
+    socket.emit("get_status", { before_id: oldestId });
+});
+
 cancelActive.addEventListener('click', function () {
     socket.emit("cancel_active");
 });
@@ -53,3 +218,7 @@ cancelActive.addEventListener('click', function () {
 cancelAll.addEventListener('click', function () {
     socket.emit("cancel_all");
 });
+
+retryFailed.addEventListener('click', function () {
+    socket.emit("retry_failed");
+});
@@ -0,0 +1,48 @@
+import time
+import queue
+import logging
+from services import metrics
+from services.job_store import JobStore
+from services.config_service import ConfigService
+from services.spotfiy_service import SpotifyService
+from services.download_service import DownloadService
+from services.status_broadcaster import StatusBroadcaster
+from services.playlist_manager import PlaylistManager
+from services.media_refresh_scheduler import MediaRefreshScheduler
+from services.library_index import LibraryIndex
+from services.job_broker import create_job_broker
+from services.download_node import DownloadNode, create_event_emitter
+from services.watch_scheduler import WatchScheduler
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+
+def main():
+    # A download node without the web UI, started with SPOTSPOT_ROLE=worker
+    config = ConfigService()
+    job_broker = create_job_broker(config)
+    socketio = metrics.count_socket_emits(create_event_emitter(config, job_broker))
+    job_store = JobStore(config)
+    playlist_manager = PlaylistManager(config)
+    library_index = LibraryIndex(config)
+    spotify_service = SpotifyService(config)
+    download_service = DownloadService(
+        config,
+        playlist_manager,
+        socketio,
+        queue.Queue(),
+        job_store,
+        StatusBroadcaster(config, socketio, job_store),
+        MediaRefreshScheduler(config, playlist_manager),
+        spotify_service,
+        library_index,
+    )
+    library_index.start_scanner()
+    WatchScheduler(config, spotify_service, download_service).start()
+    DownloadNode(config, job_broker, download_service).start()
+    while True:
+        time.sleep(3600)
+
+
+if __name__ == "__main__":
+    main()
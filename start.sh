@@ -54,5 +54,10 @@ chown -R appuser:appgroup /config /data /home/appuser/.spotdl/.spotipy
 chmod -R 777 /config /home 
 
 # Start the application as appuser
+if [ "$SPOTSPOT_ROLE" = "worker" ]; then
+    echo "Starting SpotSpot download node..."
+    exec su-exec appuser:appgroup python spotspot/worker.py
+fi
+
 echo "Starting SpotSpot..."
 exec su-exec appuser:appgroup gunicorn spotspot.spotspot:app -c start_app.py
@@ -0,0 +1,129 @@
+import os
+import sys
+import queue
+import threading
+import pytest
+from types import SimpleNamespace
+from mutagen.id3 import ID3, WOAS
+
+tests_path = os.path.dirname(os.path.abspath(__file__))
+# The app imports its modules as services.*, the same way it runs from the spotspot directory
+sys.path.insert(0, os.path.join(os.path.dirname(tests_path), "spotspot"))
+
+from services.job_store import JobStore
+from services.download_service import DownloadService
+
+
+# One silent MPEG frame, enough for mutagen to read the file as an MP3
+mpeg_frame = b"\xff\xfb\x90\x64" + b"\x00" * 413
+
+
+def make_config(tmp_path, **overrides):
+    config = SimpleNamespace(
+        database_path=str(tmp_path / "spotspot.db"),
+        history_memory_limit=100,
+        max_track_downloads=1,
+        max_album_downloads=1,
+        max_playlist_downloads=1,
+        max_concurrent_downloads=1,
+        track_output=str(tmp_path / "music"),
+        progress_emit_interval=0.1,
+        cancel_grace_period=1,
+        format="mp3",
+        redownload=False,
+        overwrite="skip",
+        skip_existing_tracks=True,
+        spotdl_mode="subprocess",
+        download_retries=0,
+        retry_base_delay=0.1,
+        retry_max_delay=1,
+        rate_limit_cooldown=1,
+        min_free_disk_mb=0,
+        max_download_mbps=0,
+        admission_check_interval=1,
+        spotspot_role="all",
+        node_id="node-a",
+        broker_state_interval=2,
+        postprocess=False,
+        resume_unfinished_jobs=False,
+        track_priority=1,
+        collection_priority=0,
+        scheduler_aging_seconds=300,
+        scheduler_wait_samples=100,
+    )
+    config.__dict__.update(overrides)
+    return config
+
+
+class FakeLibraryIndex:
+    def __init__(self):
+        self.files = {}
+
+    def find_track(self, track_id, isrc=None):
+        return self.files.get(track_id)
+
+    def add_files(self, file_paths):
+        pass
+
+
+class FakeSpotifyService:
+    def __init__(self):
+        self.suggest_index = SimpleNamespace(add_download=lambda download_info: None)
+        self.collection_tracks = []
+
+    def get_collection_tracks(self, collection_type, collection_id):
+        return [dict(track) for track in self.collection_tracks]
+
+    def fill_track_isrcs(self, tracks):
+        return tracks
+
+
+class RecordingBroadcaster:
+    def __init__(self):
+        self.changes = []
+
+    def job_changed(self, download_info):
+        self.changes.append((download_info["id"], download_info["status"]))
+
+    def jobs_changed(self, download_infos):
+        for download_info in download_infos:
+            self.job_changed(download_info)
+
+
+@pytest.fixture
+def download_service_factory(tmp_path):
+    def create(**overrides):
+        config = make_config(tmp_path, **overrides)
+        os.makedirs(config.track_output, exist_ok=True)
+        return DownloadService(
+            config,
+            SimpleNamespace(add_downloaded_files=lambda file_paths: 0),
+            SimpleNamespace(emit=lambda *args, **kwargs: None),
+            queue.Queue(),
+            JobStore(config),
+            RecordingBroadcaster(),
+            SimpleNamespace(mark_dirty=lambda reason: None),
+            FakeSpotifyService(),
+            FakeLibraryIndex(),
+        )
+
+    return create
+
+
+def start_downloads(download_service):
+    threading.Thread(target=download_service.process_downloads, daemon=True).start()
+
+
+def write_tagged_mp3(file_path, track_id):
+    with open(file_path, "wb") as audio_file:
+        audio_file.write(mpeg_frame * 10)
+    tags = ID3()
+    tags.add(WOAS(url=f"https://open.spotify.com/track/{track_id}"))
+    tags.save(file_path)
+
+
+def spotdl_writing(file_name, track_id, display_name):
+    # Stands in for spotDL, which logs the first artist only but names the file after all of them
+    log_line = f'Downloaded "{display_name}": https://music.youtube.com/watch?v=x'
+    script = f"import sys; sys.path.insert(0, {tests_path!r}); from conftest import write_tagged_mp3; write_tagged_mp3({file_name!r}, {track_id!r}); print({log_line!r})"
+    return [sys.executable, "-c", script]
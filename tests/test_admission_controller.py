@@ -0,0 +1,48 @@
+import time
+from types import SimpleNamespace
+from services.admission_controller import AdmissionController
+from conftest import start_downloads
+from test_download_worker import fake_spotdl, wait_for_status
+
+
+def make_controller(**overrides):
+    config = SimpleNamespace(min_free_disk_mb=0, max_download_mbps=1, admission_check_interval=1)
+    config.__dict__.update(overrides)
+    return AdmissionController(config, SimpleNamespace(emit=lambda *args, **kwargs: None))
+
+
+def test_throughput_is_measured_between_checks_without_sleeping(monkeypatch):
+    controller = make_controller()
+    clock = [100.0]
+    received = [0]
+    monkeypatch.setattr(time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(controller, "_read_received_bytes", lambda: received[0])
+    assert controller.get_throughput() is None
+    clock[0] += 2
+    received[0] += 4 * 1024**2
+    assert controller.get_throughput() == 2 * 1024**2
+    # Checks within a second reuse the last rate
+    clock[0] += 0.5
+    received[0] += 100 * 1024**2
+    assert controller.get_throughput() == 2 * 1024**2
+    assert not controller.check_admission("/")
+    assert controller.get_status()["paused"]
+
+
+def test_paused_job_gives_up_its_slot_until_admitted(download_service_factory):
+    download_service = download_service_factory(min_free_disk_mb=10**12, admission_check_interval=0.1)
+    download_service._build_spotdl_command = fake_spotdl
+    start_downloads(download_service)
+    download_info = download_service.add_items_to_queue([{"url": "https://open.spotify.com/track/AAA", "type": "track"}], requester="R1")[0]
+    # The job waits in the retry heap, not in a worker slot
+    deadline = time.monotonic() + 5
+    delayed_count = 0
+    while not delayed_count and time.monotonic() < deadline:
+        time.sleep(0.02)
+        delayed_count = download_service.retry_policy.get_delayed_count()
+    assert delayed_count == 1
+    assert download_service.admission_controller.get_status()["paused"]
+    assert download_service.job_store.get_job(download_info["id"])["status"] == "Pending..."
+    download_service.config.min_free_disk_mb = 0
+    assert wait_for_status(download_service, download_info["id"], ("Complete",))["status"] == "Complete"
+    assert not download_service.admission_controller.get_status()["paused"]
@@ -0,0 +1,123 @@
+from types import SimpleNamespace
+from services.bulk_import import BulkImporter, parse_bulk_text
+
+track_ids = ["4uLU6hMCjMI75M1A2tKUQC", "7ouMYWpwJ422jRcDASZB7P", "2KHRENHQzTIQ001nlP9Gdc", "69kOkLUCkxIZYexIgSG8rq"]
+
+
+def test_exportify_csv_is_read_by_its_uri_column():
+    text = (
+        '\ufeff"Track URI","Track Name","Artist URI(s)","Artist Name(s)","Album Name"\n'
+        f'"spotify:track:{track_ids[0]}","Get Lucky","spotify:artist:4tZwfgrHOc3mvqYlEYSvVi","Daft Punk, Pharrell Williams","Random Access Memories"\n'
+        '"","Local Song","","Someone, Else",""\n'
+        f'"spotify:track:{track_ids[1]}","One More Time","","Daft Punk",""\n'
+    )
+    assert parse_bulk_text(text, "liked.csv") == [
+        {"type": "track", "id": track_ids[0], "source": f"spotify:track:{track_ids[0]}"},
+        {"query": "Someone Local Song", "source": "Someone - Local Song"},
+        {"type": "track", "id": track_ids[1], "source": f"spotify:track:{track_ids[1]}"},
+    ]
+
+
+def test_csv_without_links_is_searched_by_artist_and_title():
+    text = "title,artist\nGet Lucky,Daft Punk\n,Nobody\nHarder Better Faster Stronger,\n"
+    assert parse_bulk_text(text) == [
+        {"query": "Daft Punk Get Lucky", "source": "Daft Punk - Get Lucky"},
+        {"query": "Harder Better Faster Stronger", "source": "Harder Better Faster Stronger"},
+    ]
+
+
+def test_m3u_entries_are_searched_by_their_titles():
+    text = (
+        "#EXTM3U\n"
+        "#EXTINF:248,Daft Punk - Get Lucky\n"
+        "/music/Daft Punk/RAM/06 Get Lucky.mp3\n"
+        "C:\\Music\\Justice - D.A.N.C.E.flac\n"
+        "#EXTINF:320,Ignored For Links\n"
+        f"https://open.spotify.com/track/{track_ids[2]}\n"
+    )
+    assert parse_bulk_text(text, "party.m3u") == [
+        {"query": "Daft Punk Get Lucky", "source": "Daft Punk - Get Lucky"},
+        {"query": "Justice D.A.N.C.E", "source": "Justice - D.A.N.C.E"},
+        {"type": "track", "id": track_ids[2], "source": f"https://open.spotify.com/track/{track_ids[2]}"},
+    ]
+
+
+def test_links_and_uris_of_every_type_are_accepted():
+    text = "\n".join(
+        [
+            f"spotify:album:{track_ids[0]}",
+            f"https://open.spotify.com/intl-de/playlist/{track_ids[1]}?si=abc",
+            "# a comment",
+            "",
+            "https://open.spotify.com/track/tooShort",
+            "spotify:track:not-an-id",
+            f"spotify:artist:{track_ids[3]}",
+        ]
+    )
+    assert parse_bulk_text(text) == [
+        {"type": "album", "id": track_ids[0], "source": f"spotify:album:{track_ids[0]}"},
+        {"type": "playlist", "id": track_ids[1], "source": f"https://open.spotify.com/intl-de/playlist/{track_ids[1]}?si=abc"},
+        {"invalid": "https://open.spotify.com/track/tooShort"},
+        {"invalid": "spotify:track:not-an-id"},
+        {"type": "artist", "id": track_ids[3], "source": f"spotify:artist:{track_ids[3]}"},
+    ]
+
+
+class FakeSpotifyService:
+    def __init__(self):
+        self.lookups = []
+
+    def get_items(self, item_type, item_ids):
+        self.lookups.append((item_type, item_ids))
+        # The last id is not known to Spotify
+        return {item_id: {"url": f"https://open.spotify.com/{item_type}/{item_id}", "type": item_type} for item_id in item_ids if item_id != track_ids[3]}
+
+    def find_track(self, query):
+        return {"url": f"https://open.spotify.com/track/{query.replace(' ', '')}", "type": "track"} if query == "Daft Punk Get Lucky" else None
+
+
+class FakeDownloadService:
+    def __init__(self):
+        self.requests = []
+
+    def add_items_to_queue(self, items, requester=None):
+        self.requests.append((items, requester))
+        jobs = {}
+        return [
+            jobs.setdefault(item["url"], {"id": len(jobs) + 1, "status": "Already Downloaded" if item["url"].endswith(track_ids[1]) else "Pending..."})
+            for item in items
+        ]
+
+
+def test_import_counts_queued_known_unresolved_invalid_and_over_limit_entries():
+    spotify_service = FakeSpotifyService()
+    download_service = FakeDownloadService()
+    importer = BulkImporter(SimpleNamespace(bulk_import_limit=6, search_workers=2), spotify_service, download_service)
+    text = "\n".join(
+        [
+            f"spotify:track:{track_ids[0]}",
+            f"spotify:track:{track_ids[1]}",
+            f"https://open.spotify.com/track/{track_ids[0]}",
+            f"spotify:track:{track_ids[3]}",
+            "Daft Punk - Get Lucky",
+            "Nobody - Unknown Song",
+            "spotify:track:broken",
+            f"spotify:track:{track_ids[2]}",
+            f"spotify:album:{track_ids[2]}",
+        ]
+    )
+    result = importer.import_text(text, requester="R1", priority="high")
+    assert result == {
+        "requested": 9,
+        # The repeated track shares its job, the second one is already in the library
+        "queued": 2,
+        "already_downloaded": 1,
+        "unresolved": [f"spotify:track:{track_ids[3]}", "Nobody - Unknown Song"],
+        "invalid": ["spotify:track:broken"],
+        "over_limit": 2,
+    }
+    # Ids are looked up once each, in one call per type
+    assert spotify_service.lookups == [("track", [track_ids[0], track_ids[1], track_ids[3]])]
+    items, requester = download_service.requests[0]
+    assert requester == "R1"
+    assert [item["priority"] for item in items] == ["high"] * 4
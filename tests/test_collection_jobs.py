@@ -0,0 +1,34 @@
+from conftest import start_downloads
+from test_download_worker import wait_for_status
+
+
+def make_track(track_id):
+    return {"id": track_id, "name": f"Song {track_id}", "artist": "A", "url": f"https://open.spotify.com/track/{track_id}", "isrc": None}
+
+
+def test_playlist_of_downloaded_tracks_gets_its_m3u(download_service_factory, tmp_path):
+    download_service = download_service_factory(playlist_output=str(tmp_path / "music"))
+    music_path = tmp_path / "music"
+    for track_id, file_name in (("AAA", "A, B - Song AAA.mp3"), ("BBB", "A - Song BBB.mp3")):
+        (music_path / file_name).write_bytes(b"x")
+        download_service.library_index.files[track_id] = str(music_path / file_name)
+    download_service.spotify_service.collection_tracks = [make_track("BBB"), make_track("AAA")]
+    start_downloads(download_service)
+    download_info = download_service.add_items_to_queue([{"url": "https://open.spotify.com/playlist/PL", "type": "playlist", "name": "My List"}], requester="R1")[0]
+    assert wait_for_status(download_service, download_info["id"], ("Already Downloaded",))["status"] == "Already Downloaded"
+    child_jobs = download_service.job_store.get_children(download_info["id"])
+    assert [child_job["status"] for child_job in child_jobs] == ["Already Downloaded", "Already Downloaded"]
+    assert (music_path / "My List.m3u").read_text() == "#EXTM3U\nA - Song BBB.mp3\nA, B - Song AAA.mp3\n"
+
+
+def test_m3u_skips_stored_paths_that_no_longer_exist(download_service_factory, tmp_path):
+    download_service = download_service_factory()
+    music_path = tmp_path / "music"
+    (music_path / "Moved.mp3").write_bytes(b"x")
+    download_service.library_index.files["AAA"] = str(music_path / "Moved.mp3")
+    child_jobs = [
+        {"url": "https://open.spotify.com/track/AAA", "file_path": str(music_path / "Gone.mp3")},
+        {"url": "https://open.spotify.com/track/BBB", "file_path": str(music_path / "Missing.mp3")},
+    ]
+    download_service._write_playlist_m3u(str(music_path), {"type": "playlist", "name": "My List"}, child_jobs)
+    assert (music_path / "My List.m3u").read_text() == "#EXTM3U\nMoved.mp3\n"
@@ -0,0 +1,35 @@
+import os
+import pytest
+from services import config_service
+from services.config_service import ConfigService
+
+
+@pytest.fixture
+def env_file(tmp_path, monkeypatch):
+    env_file_path = tmp_path / "spotspot.env"
+    monkeypatch.setattr(config_service, "startup_environment", {"CONFIG_ENV_FILE": str(env_file_path), "FORMAT": "mp3"})
+    monkeypatch.setattr(ConfigService, "create_config_file", lambda self: False)
+    return env_file_path
+
+
+def test_env_file_overrides_the_startup_environment(env_file):
+    env_file.write_text('FORMAT="flac"\n# comment\nMAX_CONCURRENT_DOWNLOADS=3\n')
+    config = ConfigService()
+    assert config.format == "flac"
+    assert config.max_concurrent_downloads == 3
+
+
+def test_removed_key_falls_back_on_reload(env_file):
+    env_file.write_text("FORMAT=flac\n")
+    config = ConfigService()
+    assert config.format == "flac"
+    env_file.write_text("")
+    assert "format" in config.reload()
+    assert config.format == "mp3"
+
+
+def test_env_file_leaves_the_process_environment_alone(env_file):
+    env_file.write_text("SPOTSPOT_TEST_ONLY_KEY=1\nFORMAT=flac\n")
+    environment_before = dict(os.environ)
+    ConfigService().reload()
+    assert dict(os.environ) == environment_before
@@ -0,0 +1,33 @@
+def track_item(track_id):
+    return {"url": f"https://open.spotify.com/track/{track_id}", "type": "track", "name": f"Song {track_id}"}
+
+
+def get_statuses(download_service, jobs):
+    return [download_service.job_store.get_job(download_info["id"])["status"] for download_info in jobs]
+
+
+def test_cancel_pending_only_drops_the_requesters_jobs(download_service_factory):
+    download_service = download_service_factory()
+    first_jobs = download_service.add_items_to_queue([track_item("A"), track_item("B")], requester="R1")
+    second_jobs = download_service.add_items_to_queue([track_item("B"), track_item("C")], requester="R2")
+    # Queued by the watch scheduler, no client holds it
+    watched_jobs = download_service.add_items_to_queue([track_item("D")])
+    assert second_jobs[0] is first_jobs[1]
+
+    assert download_service.cancel_pending_downloads(requester="R1") == 1
+    assert get_statuses(download_service, first_jobs + second_jobs[1:] + watched_jobs) == ["Cancelled", "Pending...", "Pending...", "Pending..."]
+    assert download_service.cancel_pending_downloads(requester="R1") == 0
+    assert download_service.cancel_pending_downloads(requester="R2") == 2
+    assert get_statuses(download_service, watched_jobs) == ["Pending..."]
+
+
+def test_job_store_selects_pending_jobs_and_tracks_by_id(download_service_factory):
+    job_store = download_service_factory().job_store
+    parent_info = job_store.add_job({"url": "https://open.spotify.com/album/X", "type": "album", "status": "Downloading..."})
+    child_jobs = job_store.add_jobs(
+        [{"url": f"https://open.spotify.com/track/{track_id}", "type": "track", "status": status, "parent_id": parent_info["id"]} for track_id, status in (("A", "Pending..."), ("B", "Complete"), ("C", "Pending..."))]
+    )
+    other_info = job_store.add_job(track_item("D") | {"status": "Pending..."})
+    assert [download_info["id"] for download_info in job_store.get_pending_jobs({parent_info["id"]})] == [child_jobs[0]["id"], child_jobs[2]["id"]]
+    assert [download_info["id"] for download_info in job_store.cancel_pending_jobs({child_jobs[2]["id"], other_info["id"], child_jobs[1]["id"]})] == [child_jobs[2]["id"], other_info["id"]]
+    assert job_store.get_job(child_jobs[0]["id"])["status"] == "Pending..."
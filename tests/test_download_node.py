@@ -0,0 +1,208 @@
+import time
+import threading
+import pytest
+from types import SimpleNamespace
+from services.job_broker import LocalJobBroker
+from services.job_store import JobStore
+from services.job_coalescer import JobCoalescer
+from services.download_node import BrokerEmitter, DownloadNode, RemoteDownloadService
+
+
+def make_config(**overrides):
+    config = SimpleNamespace(broker_call_timeout=2, broker_poll_interval=0.01, broker_state_interval=0.05, node_id="node", resume_unfinished_jobs=False)
+    config.__dict__.update(overrides)
+    return config
+
+
+class FakeDownloadService:
+    def __init__(self, name, paused=False):
+        self.name = name
+        self.paused = paused
+        self.calls = []
+        self.coalescer = JobCoalescer()
+        self.job_store = SimpleNamespace(unfinished_statuses=JobStore.unfinished_statuses, record_heartbeat=lambda: None)
+        self.queued_jobs = []
+
+    def add_items_to_queue(self, items, requester=None):
+        self.calls.append(("add_items_to_queue", items, requester))
+        if self.queued_jobs:
+            return self.queued_jobs
+        jobs = [{"id": 1, "url": item["url"], "status": "Pending..."} for item in items]
+        for download_info in jobs:
+            self.coalescer.register(download_info, requester)
+        return jobs
+
+    def retry_failed_jobs(self, requester=None):
+        raise ValueError("nothing to retry")
+
+    def cancel_active_download(self, job_id=None, requester=None):
+        self.calls.append(("cancel_active_download", job_id, requester))
+
+    def cancel_pending_downloads(self, requester=None):
+        self.calls.append(("cancel_pending_downloads", requester))
+
+    def attach_requester(self, job_id, requester=None):
+        self.calls.append(("attach_requester", job_id, requester))
+
+    def get_active_progress(self):
+        return [{"id": self.name, "completed": 1}]
+
+    def get_scheduler_stats(self):
+        return {
+            "groups": {"track": {"pending": 2, "active": 1}},
+            "pending": 2,
+            "sessions": 1,
+            "oldest_wait_seconds": 3.0 if self.paused else 1.0,
+            "wait_seconds": {"samples": 4, "p50": 0.5, "p90": 2.0 if self.paused else 1.0, "p99": None, "max": 2.0},
+        }
+
+    def get_admission_status(self):
+        return {"paused": self.paused, "reason": "disk full" if self.paused else None}
+
+    def process_downloads(self):
+        pass
+
+
+def wait_for(condition, timeout=3):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.fixture
+def broker():
+    return LocalJobBroker()
+
+
+def start_node(config, broker, download_service):
+    node = DownloadNode(SimpleNamespace(**{**config.__dict__, "node_id": download_service.name}), broker, download_service)
+    node.start()
+    return node
+
+
+def test_command_round_trip(broker):
+    config = make_config()
+    download_service = FakeDownloadService("a")
+    start_node(config, broker, download_service)
+    remote = RemoteDownloadService(config, broker)
+    jobs = remote.add_items_to_queue([{"url": "https://open.spotify.com/track/x"}], requester="R1")
+    assert jobs == [{"id": 1, "url": "https://open.spotify.com/track/x", "status": "Pending..."}]
+    assert download_service.calls == [("add_items_to_queue", [{"url": "https://open.spotify.com/track/x"}], "R1")]
+
+
+def test_command_errors_reach_the_caller(broker):
+    config = make_config()
+    start_node(config, broker, FakeDownloadService("a"))
+    with pytest.raises(RuntimeError, match="nothing to retry"):
+        RemoteDownloadService(config, broker).retry_failed_jobs(requester="R1")
+
+
+def test_command_without_node_times_out(broker):
+    with pytest.raises(TimeoutError):
+        RemoteDownloadService(make_config(broker_call_timeout=0.1), broker).add_items_to_queue([{"url": "u"}])
+
+
+def test_cancel_reaches_every_node(broker):
+    config = make_config()
+    services = [FakeDownloadService("a"), FakeDownloadService("b")]
+    for download_service in services:
+        start_node(config, broker, download_service)
+    # The control subscriptions are opened by the node threads
+    assert wait_for(lambda: len(broker.subscriptions) == 2)
+    remote = RemoteDownloadService(config, broker)
+    remote.cancel_active_download(requester="R1")
+    remote.cancel_pending_downloads(requester="R1")
+    for download_service in services:
+        assert wait_for(lambda: len(download_service.calls) == 2)
+        assert download_service.calls == [("cancel_active_download", None, "R1"), ("cancel_pending_downloads", "R1")]
+
+
+def test_events_are_relayed_to_the_web_tier(broker):
+    subscription = broker.subscribe("events")
+    BrokerEmitter(broker).emit("download_progress", {"id": 4, "completed": 2})
+    assert subscription.get(timeout=1) == ("events", {"event": "download_progress", "data": {"id": 4, "completed": 2}})
+
+
+def test_node_states_are_merged(broker):
+    config = make_config()
+    start_node(config, broker, FakeDownloadService("a"))
+    start_node(config, broker, FakeDownloadService("b", paused=True))
+    remote = RemoteDownloadService(config, broker)
+    remote.start()
+    assert wait_for(lambda: len(remote.get_node_states()) == 2)
+    assert sorted(progress["id"] for progress in remote.get_active_progress()) == ["a", "b"]
+    stats = remote.get_scheduler_stats()
+    assert stats["groups"] == {"track": {"pending": 4, "active": 2}}
+    assert stats["pending"] == 4
+    assert stats["nodes"] == 2
+    assert stats["oldest_wait_seconds"] == 3.0
+    assert stats["wait_seconds"] == {"samples": 8, "p50": 0.5, "p90": 2.0, "p99": None, "max": 2.0}
+    assert remote.get_admission_status() == {"paused": True, "reason": "disk full"}
+
+
+def test_stale_node_states_expire():
+    remote = RemoteDownloadService(make_config(broker_state_interval=0.01), LocalJobBroker())
+    remote.add_node_state({"node": "gone", "progress": [{"id": 1}], "scheduler_stats": {}, "admission": {"paused": True, "reason": "x"}})
+    time.sleep(0.05)
+    assert remote.get_active_progress() == []
+    assert remote.get_admission_status() == {"paused": False, "reason": None}
+
+
+def test_joined_jobs_of_other_nodes_get_the_request(broker):
+    config = make_config()
+    joining_service = FakeDownloadService("a")
+    running_service = FakeDownloadService("b")
+    # Node b runs job 9, node a found it through the job database
+    joining_service.queued_jobs = [{"id": 9, "url": "u", "status": "Downloading..."}]
+    start_node(config, broker, joining_service)
+    # Node b only listens for control messages, so node a takes the command
+    threading.Thread(target=DownloadNode(config, broker, running_service)._serve_control, daemon=True).start()
+    assert wait_for(lambda: len(broker.subscriptions) == 2)
+    jobs = RemoteDownloadService(config, broker).add_items_to_queue([{"url": "u"}], requester="R2")
+    assert jobs[0]["id"] == 9
+    assert wait_for(lambda: ("attach_requester", 9, "R2") in running_service.calls)
+
+
+def test_job_store_claims_urls_across_nodes(tmp_path):
+    config = SimpleNamespace(database_path=str(tmp_path / "jobs.db"), spotspot_role="worker", history_memory_limit=10, node_id="a")
+    first_store, second_store = JobStore(config), JobStore(config)
+    first_job = {"url": "https://open.spotify.com/track/x", "type": "track", "status": "Pending..."}
+    assert first_store.add_claimed_jobs([first_job], ["track:x"]) == [first_job]
+    second_job = {"url": "https://open.spotify.com/track/x?si=1", "type": "track", "status": "Pending..."}
+    assert second_store.add_claimed_jobs([second_job], ["track:x"])[0]["id"] == first_job["id"]
+    assert "id" not in second_job
+    # A finished job no longer holds its URL
+    first_job["status"] = "Complete"
+    first_store.update_job(first_job)
+    assert second_store.add_claimed_jobs([second_job], ["track:x"]) == [second_job]
+    assert second_job["id"] != first_job["id"]
+
+
+def test_restarting_node_resumes_only_jobs_no_live_node_runs(tmp_path):
+    def node_store(node_id):
+        return JobStore(SimpleNamespace(database_path=str(tmp_path / "jobs.db"), spotspot_role="worker", history_memory_limit=10, node_id=node_id, broker_state_interval=0.05))
+
+    first_store, second_store = node_store("a"), node_store("b")
+    first_store.add_jobs([{"url": f"https://open.spotify.com/track/{number}", "type": "track", "status": status} for number, status in enumerate(("Downloading...", "Pending..."))])
+    first_store.record_heartbeat()
+    # Node a still reports, its jobs stay with it
+    assert second_store.claim_unfinished_jobs() == []
+    assert len(first_store.claim_unfinished_jobs()) == 2
+    # Node a stopped reporting, b takes its jobs over once
+    time.sleep(0.3)
+    assert [download_info["status"] for download_info in second_store.claim_unfinished_jobs(include_own=False)] == ["Downloading...", "Pending..."]
+    assert second_store.claim_unfinished_jobs(include_own=False) == []
+    assert first_store.claim_unfinished_jobs(include_own=False) == []
+
+
+def test_coalescer_attaches_by_id_only_for_its_own_jobs():
+    coalescer = JobCoalescer()
+    download_info = {"id": 5, "url": "https://open.spotify.com/track/x"}
+    coalescer.register(download_info, "R1")
+    assert coalescer.attach_id(5, "R2")
+    assert not coalescer.attach_id(6, "R2")
+    coalescer.release("R1")
+    assert coalescer.is_wanted(download_info)
@@ -0,0 +1,67 @@
+import pytest
+from services.download_progress import DownloadProgress, parse_spotdl_line
+
+# Lines as spotDL 4.4 and yt-dlp print them
+album_output = [
+    "Processing query: https://open.spotify.com/album/4m2880jivSbbyEGAKfITCa",
+    "Found 3 songs in Random Access Memories (Album)",
+    'Downloaded "Daft Punk - Give Life Back to Music": https://music.youtube.com/watch?v=IluRBvnYMoY',
+    "Skipping Daft Punk - The Game of Love (file already exists) ",
+    "ERROR: [youtube] h5EofwRzit0: Video unavailable. This video is not available",
+    "AudioProviderError: YT-DLP download error - https://music.youtube.com/watch?v=h5EofwRzit0",
+    # The --print-errors summary at the end of a playlist run
+    "https://open.spotify.com/track/2KHRENHQzTIQ001nlP9Gdc - AudioProviderError: YT-DLP download error - https://music.youtube.com/watch?v=h5EofwRzit0",
+]
+
+
+@pytest.mark.parametrize(
+    "line, event_type, fields",
+    [
+        ("Found 3 songs in Random Access Memories (Album)", "found", {"total": "3", "name": "Random Access Memories (Album)"}),
+        ('Downloaded "Daft Punk - Contact": https://music.youtube.com/watch?v=1ulk4GUTXJ4', "downloaded", {"name": "Daft Punk - Contact"}),
+        ("Skipping Daft Punk - Touch (file already exists) (duplicate)", "skipped", {"name": "Daft Punk - Touch", "reason": "file already exists"}),
+        ("LookupError: No results found for song: Daft Punk - Motherboard", "failed", {"error": "LookupError", "message": "No results found for song: Daft Punk - Motherboard"}),
+        ("  FFmpegError: Failed to convert Daft Punk - Fragments of Time  ", "failed", {"error": "FFmpegError", "message": "Failed to convert Daft Punk - Fragments of Time"}),
+    ],
+)
+def test_spotdl_lines_are_parsed(line, event_type, fields):
+    assert parse_spotdl_line(line) == (event_type, fields)
+
+
+@pytest.mark.parametrize(
+    "line",
+    [
+        "https://open.spotify.com/track/2KHRENHQzTIQ001nlP9Gdc - LookupError: No results found for song: Daft Punk - Motherboard",
+        "spotdl.providers.audio.base.AudioProviderError: YT-DLP download error - https://music.youtube.com/watch?v=h5EofwRzit0",
+        '    raise AudioProviderError(f"YT-DLP download error - {url}") from exception',
+        "yt_dlp.utils.DownloadError: ERROR: [youtube] h5EofwRzit0: Video unavailable",
+        "ERROR: [youtube] h5EofwRzit0: Video unavailable. This video is not available",
+        "Processing query: https://open.spotify.com/track/2KHRENHQzTIQ001nlP9Gdc",
+    ],
+)
+def test_repeated_errors_and_tracebacks_are_not_songs(line):
+    assert parse_spotdl_line(line) == (None, None)
+
+
+def test_each_song_of_an_album_is_counted_once():
+    progress = DownloadProgress({"id": 1, "type": "album"})
+    for line in album_output:
+        progress.handle_line(line)
+    assert progress.total == 3
+    assert progress.downloaded == ["Daft Punk - Give Life Back to Music"]
+    assert progress.skipped == ["Daft Punk - The Game of Love"]
+    assert progress.failed == ["YT-DLP download error - https://music.youtube.com/watch?v=h5EofwRzit0"]
+    assert progress.to_dict()["completed"] == 3
+
+
+def test_traceback_of_a_downloaded_track_is_not_a_failure():
+    progress = DownloadProgress({"id": 1, "type": "track"})
+    for line in (
+        "Traceback (most recent call last):",
+        '  File "/usr/local/lib/python3.12/site-packages/spotdl/utils/lrc.py", line 40, in generate_lrc',
+        "spotdl.providers.lyrics.base.LyricsProviderError: Lyrics not found",
+        'Downloaded "Daft Punk - Get Lucky": https://music.youtube.com/watch?v=5NV6Rdv1a3I',
+    ):
+        progress.handle_line(line)
+    assert progress.failed == []
+    assert progress.downloaded == ["Daft Punk - Get Lucky"]
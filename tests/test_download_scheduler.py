@@ -0,0 +1,86 @@
+from types import SimpleNamespace
+from services import download_scheduler
+from services.download_scheduler import DownloadScheduler
+
+
+def make_scheduler(**overrides):
+    config = SimpleNamespace(
+        max_track_downloads=1,
+        max_album_downloads=1,
+        max_playlist_downloads=1,
+        track_priority=1,
+        collection_priority=0,
+        scheduler_aging_seconds=300,
+        scheduler_wait_samples=100,
+    )
+    config.__dict__.update(overrides)
+    return DownloadScheduler(config)
+
+
+def run_jobs(scheduler, count):
+    urls = []
+    for _ in range(count):
+        group, url, download_info = scheduler.next_job()
+        urls.append(url)
+        scheduler.release(group)
+    return urls
+
+
+def test_sessions_are_forgotten_once_their_queue_is_empty():
+    scheduler = make_scheduler()
+    for number in range(100):
+        scheduler.submit(f"track-{number}", {"id": number, "type": "track"}, session=f"client-{number}")
+    run_jobs(scheduler, 100)
+    assert scheduler.session_last_served == {}
+    scheduler.submit("kept", {"id": 1, "type": "track"}, session="A")
+    scheduler.submit("cleared", {"id": 2, "type": "track"}, session="B")
+    scheduler.clear_pending({2})
+    assert list(scheduler.session_last_served) == ["A"]
+
+
+def test_sessions_take_turns():
+    scheduler = make_scheduler()
+    for number in range(3):
+        scheduler.submit(f"A{number}", {"id": number, "type": "track"}, session="A")
+    scheduler.submit("B0", {"id": 10, "type": "track"}, session="B")
+    scheduler.submit("C0", {"id": 20, "type": "track"}, session="C")
+    assert run_jobs(scheduler, 5) == ["A0", "B0", "C0", "A1", "A2"]
+
+
+def test_higher_priority_goes_first_within_a_session():
+    scheduler = make_scheduler()
+    scheduler.submit("playlist", {"id": 1, "type": "playlist"}, session="A")
+    scheduler.submit("low", {"id": 2, "type": "track", "priority": 0}, session="A")
+    scheduler.submit("high", {"id": 3, "type": "track"}, session="A")
+    # Tracks default to a higher priority than collections, equal priorities go in arrival order
+    assert run_jobs(scheduler, 3) == ["high", "playlist", "low"]
+
+
+def test_waiting_jobs_age_past_newer_higher_priority_jobs(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(download_scheduler.time, "monotonic", lambda: clock[0])
+    scheduler = make_scheduler(scheduler_aging_seconds=10)
+    scheduler.submit("old", {"id": 1, "type": "track", "priority": 0}, session="A")
+    # Two points of priority are made up after twenty seconds of waiting
+    clock[0] += 15
+    scheduler.submit("newer", {"id": 2, "type": "track", "priority": 2}, session="A")
+    clock[0] += 10
+    scheduler.submit("newest", {"id": 3, "type": "track", "priority": 2}, session="A")
+    assert run_jobs(scheduler, 3) == ["newer", "old", "newest"]
+    assert scheduler.get_stats()["wait_seconds"]["max"] == 25
+
+
+def test_full_groups_do_not_block_other_groups():
+    scheduler = make_scheduler()
+    scheduler.submit("album-1", {"id": 1, "type": "album"}, session="A")
+    scheduler.submit("artist", {"id": 2, "type": "artist"}, session="A")
+    scheduler.submit("track", {"id": 3, "type": "track"}, session="B")
+    first_group, first_url, _ = scheduler.next_job()
+    assert first_url == "album-1"
+    # Artists share the album slot, which is taken, so the track goes next
+    second_group, second_url, _ = scheduler.next_job()
+    assert second_url == "track"
+    assert scheduler.get_counts()["album"] == {"pending": 1, "active": 1}
+    scheduler.release(first_group)
+    scheduler.release(second_group)
+    assert run_jobs(scheduler, 1) == ["artist"]
@@ -0,0 +1,110 @@
+import os
+import time
+from services.download_progress import DownloadProgress
+from conftest import start_downloads, spotdl_writing, write_tagged_mp3
+
+
+def fake_spotdl(url, download_info):
+    track_id = url.rsplit("/", 1)[1]
+    return ["sh", "-c", f"echo 'Downloaded \"A - {track_id}\": x'; touch 'A - {track_id}.mp3'"]
+
+
+def wait_for_status(download_service, job_id, statuses, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        download_info = download_service.job_store.get_job(job_id)
+        if download_info["status"] in statuses:
+            return download_info
+        time.sleep(0.02)
+    return download_service.job_store.get_job(job_id)
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+
+def test_worker_survives_a_job_that_raises(download_service_factory):
+    download_service = download_service_factory()
+    download_service._build_spotdl_command = fake_spotdl
+    prepare_download_path = download_service._prepare_download_path
+
+    def broken_path(download_info):
+        if download_info["url"].endswith("/BROKEN"):
+            raise OSError("read-only file system")
+        return prepare_download_path(download_info)
+
+    download_service._prepare_download_path = broken_path
+    start_downloads(download_service)
+    broken_job, good_job = download_service.add_items_to_queue(
+        [{"url": "https://open.spotify.com/track/BROKEN", "type": "track"}, {"url": "https://open.spotify.com/track/GOOD", "type": "track"}],
+        requester="R1",
+    )
+    # The only worker thread runs the second job after the first one raised
+    assert wait_for_status(download_service, good_job["id"], ("Complete",))["status"] == "Complete"
+    broken_job = download_service.job_store.get_job(broken_job["id"])
+    assert broken_job["status"] == "Error"
+    assert "read-only file system" in broken_job["error"]
+    assert (broken_job["id"], "Error") in download_service.status_broadcaster.changes
+    assert download_service.coalescer.find_active(broken_job["url"]) is None
+    # The slot is given back after the job's last status change
+    assert wait_for(lambda: download_service.scheduler.get_counts()["track"]["active"] == 0)
+
+
+def test_finished_track_is_found_by_its_tags(download_service_factory, tmp_path):
+    download_service = download_service_factory()
+    music_path = tmp_path / "music"
+    # Another song in the shared folder, written while the job ran
+    write_tagged_mp3(str(music_path / "Other - Song.mp3"), "OTHER")
+    download_service._build_spotdl_command = lambda url, download_info: spotdl_writing("A, B - Song_.mp3", "AAA", "A - Song?")
+    start_downloads(download_service)
+    download_info = download_service.add_items_to_queue([{"url": "https://open.spotify.com/track/AAA", "type": "track"}], requester="R1")[0]
+    assert wait_for_status(download_service, download_info["id"], ("Complete",))["status"] == "Complete"
+    # The job is done once it leaves the coalescer, the status is set before the file is recorded
+    assert wait_for(lambda: download_service.coalescer.find_active(download_info["url"]) is None)
+    download_info = download_service.job_store.get_job(download_info["id"])
+    assert download_info["file_path"] == str(music_path / "A, B - Song_.mp3")
+
+
+def test_written_native_files_go_to_post_processing(download_service_factory, tmp_path):
+    download_service = download_service_factory(format="flac", postprocess=True)
+    music_path = tmp_path / "music"
+    write_tagged_mp3(str(music_path / "Left - Behind.mp3"), "AAA")
+    write_tagged_mp3(str(music_path / "Other - Song.mp3"), "OTHER")
+    # The test stands in MP3 for the native container, spotDL itself writes Opus or m4a
+    download_service.post_processor.get_download_format = lambda: "mp3"
+    download_service.post_processor.needs_processing = lambda: True
+    submitted = []
+
+    def submit(source_paths, on_done):
+        submitted.extend(source_paths)
+        assert download_service.processing_files == set(source_paths)
+        on_done([(source_path, source_path[: -len(".mp3")] + ".flac", None) for source_path in source_paths])
+
+    download_service.post_processor.submit = submit
+    download_service._build_spotdl_command = lambda url, download_info: spotdl_writing("A, B - Song_.mp3", "AAA", "A - Song?")
+    start_downloads(download_service)
+    download_info = download_service.add_items_to_queue([{"url": "https://open.spotify.com/track/AAA", "type": "track"}], requester="R1")[0]
+    assert wait_for_status(download_service, download_info["id"], ("Complete",))["status"] == "Complete"
+    assert submitted == [str(music_path / "A, B - Song_.mp3"), str(music_path / "Left - Behind.mp3")]
+    assert download_service.processing_files == set()
+
+
+def test_cancelled_job_removes_only_its_partial_files(download_service_factory, tmp_path):
+    download_service = download_service_factory()
+    music_path = tmp_path / "music"
+    download_info = {"id": 1, "url": "https://open.spotify.com/track/AAA", "type": "track"}
+    progress = DownloadProgress(download_info)
+    progress.current = "A - Song: Title"
+    write_tagged_mp3(str(music_path / "A - Finished.mp3"), "FIN")
+    (music_path / "A, B - Song_ Title.mp3").write_bytes(b"cut off")
+    (music_path / "Other - Writing.mp3").write_bytes(b"still being written")
+    (music_path / "x.webm.part").write_bytes(b"partial")
+    # The other job's song has no tags yet either, but its name does not match
+    download_service.running_jobs = {1: download_info, 2: {"id": 2, "url": "https://open.spotify.com/track/BBB"}}
+    download_service._cleanup_partial_files(str(music_path), download_info, progress)
+    assert sorted(os.listdir(music_path)) == ["A - Finished.mp3", "Other - Writing.mp3"]
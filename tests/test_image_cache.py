@@ -0,0 +1,120 @@
+import os
+import time
+import threading
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from werkzeug.datastructures import ETags
+from services.image_cache import ImageCache, select_image
+
+image_ids = ["ab" * 8 + str(number) for number in range(4)]
+
+
+@pytest.fixture
+def image_server():
+    # Stands in for the Spotify CDN, every id is a JPEG of about 400 KiB
+    served = []
+    delay = {"seconds": 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            image_id = self.path.rsplit("/", 1)[-1]
+            served.append(image_id)
+            time.sleep(delay["seconds"])
+            if image_id not in image_ids:
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            body = b"\xff\xd8\xff" + image_id.encode() * 25000
+            self.send_response(200)
+            self.send_header("Content-Type", "image/jpeg")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield SimpleNamespace(url=f"http://127.0.0.1:{server.server_port}/image/", served=served, delay=delay)
+    server.shutdown()
+
+
+def make_cache(tmp_path, image_server):
+    config = SimpleNamespace(
+        image_cache_path=str(tmp_path / "images"),
+        image_cache_size_mb=1,
+        image_cdn_url=image_server.url,
+        image_pool_size=4,
+        image_fetch_timeout=5,
+    )
+    return ImageCache(config)
+
+
+def test_image_is_fetched_once_then_served_from_disk(tmp_path, image_server):
+    image_cache = make_cache(tmp_path, image_server)
+    data = image_cache.get(image_ids[0])
+    assert data.startswith(b"\xff\xd8\xff")
+    assert image_cache.get(image_ids[0]) == data
+    assert image_server.served == [image_ids[0]]
+    # A restarted cache finds the file again
+    assert make_cache(tmp_path, image_server).get(image_ids[0]) == data
+    assert image_server.served == [image_ids[0]]
+
+
+def test_least_recently_served_image_is_evicted(tmp_path, image_server):
+    image_cache = make_cache(tmp_path, image_server)
+    image_cache.get(image_ids[0])
+    image_cache.get(image_ids[1])
+    image_cache.get(image_ids[0])
+    # A third picture passes the 1 MiB bound, the second one was served longest ago
+    image_cache.get(image_ids[2])
+    assert list(image_cache.entries) == [image_ids[0], image_ids[2]]
+    assert image_cache.total_bytes <= 1024 * 1024
+    assert not os.path.exists(image_cache.get_path(image_ids[1]))
+    image_cache.get(image_ids[0])
+    image_cache.get(image_ids[1])
+    assert image_server.served == [image_ids[0], image_ids[1], image_ids[2], image_ids[1]]
+
+
+def test_concurrent_requests_share_one_fetch(tmp_path, image_server):
+    image_cache = make_cache(tmp_path, image_server)
+    image_server.delay["seconds"] = 0.3
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(image_cache.get(image_ids[3]))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert image_server.served == [image_ids[3]]
+    assert len(results) == 5 and len(set(results)) == 1 and results[0] is not None
+
+
+def test_response_carries_an_etag_and_revalidation_gets_304(tmp_path, image_server):
+    image_cache = make_cache(tmp_path, image_server)
+    response = image_cache.get_response(image_ids[0], ETags())
+    assert response.status_code == 200
+    assert response.mimetype == "image/jpeg"
+    assert response.get_etag() == (image_ids[0], False)
+    assert response.cache_control.immutable
+    revalidated = image_cache.get_response(image_ids[0], ETags([image_ids[0]]))
+    assert revalidated.status_code == 304
+    assert revalidated.get_data() == b""
+    assert image_server.served == [image_ids[0]]
+
+
+def test_missing_image_is_a_404(tmp_path, image_server):
+    image_cache = make_cache(tmp_path, image_server)
+    assert image_cache.get_response("cd" * 8, ETags()).status_code == 404
+    assert image_cache.get_response("../etc/passwd", ETags()).status_code == 404
+    assert image_server.served == ["cd" * 8]
+
+
+def test_smallest_image_that_fills_the_thumbnail_is_picked():
+    images = [{"url": "large", "width": 640}, {"url": "medium", "width": 300}, {"url": "small", "width": 64}]
+    assert select_image(images, 300) == "medium"
+    assert select_image(images, 100) == "medium"
+    assert select_image(images, 1000) == "large"
+    assert select_image([], 300) is None
@@ -0,0 +1,82 @@
+from services.job_coalescer import JobCoalescer
+
+
+def make_job(job_id, url, parent_id=None):
+    return {"id": job_id, "url": url, "parent_id": parent_id}
+
+
+def test_url_key_ignores_locale_and_query():
+    coalescer = JobCoalescer()
+    assert coalescer.get_url_key("https://open.spotify.com/intl-de/track/AAA?si=1") == "track:AAA"
+    assert coalescer.get_url_key("https://open.spotify.com/track/AAA") == "track:AAA"
+    assert coalescer.get_url_key("https://example.com/song/?x=1") == "https://example.com/song"
+
+
+def test_first_job_per_url_stays_active_until_it_finishes():
+    coalescer = JobCoalescer()
+    first_job = make_job(1, "https://open.spotify.com/track/AAA")
+    coalescer.register(first_job, "R1")
+    coalescer.register(make_job(2, "https://open.spotify.com/track/AAA?si=2"), "R2")
+    assert coalescer.find_active("https://open.spotify.com/intl-fr/track/AAA") is first_job
+    coalescer.finish(first_job)
+    assert coalescer.find_active("https://open.spotify.com/track/AAA") is None
+    assert not coalescer.has_job(1)
+
+
+def test_job_is_wanted_while_any_requester_holds_it():
+    coalescer = JobCoalescer()
+    download_info = make_job(1, "https://open.spotify.com/track/AAA")
+    coalescer.register(download_info, "R1")
+    coalescer.attach(download_info, "R2")
+    assert coalescer.get_owner(download_info) == "R1"
+    coalescer.release("R1")
+    assert coalescer.is_wanted(download_info)
+    assert coalescer.get_owner(download_info) == "R2"
+    coalescer.release("R2", [1])
+    assert not coalescer.is_wanted(download_info)
+
+
+def test_collection_tracks_belong_to_the_collection_requester():
+    coalescer = JobCoalescer()
+    parent_job = make_job(1, "https://open.spotify.com/album/ALB")
+    child_job = make_job(2, "https://open.spotify.com/track/AAA", parent_id=1)
+    coalescer.register(parent_job, "R1")
+    coalescer.register(child_job)
+    assert coalescer.get_owner(child_job) == "R1"
+    assert coalescer.is_wanted(child_job)
+    coalescer.release("R1")
+    assert not coalescer.is_wanted(child_job)
+
+
+def test_followers_keep_a_job_wanted_and_are_handed_back_on_finish():
+    coalescer = JobCoalescer()
+    child_job = make_job(2, "https://open.spotify.com/track/AAA", parent_id=1)
+    follower_job = make_job(3, "https://open.spotify.com/track/AAA")
+    coalescer.register(child_job)
+    coalescer.register(follower_job, "R2")
+    coalescer.add_follower(child_job, follower_job)
+    assert coalescer.is_wanted(child_job)
+    assert coalescer.finish(child_job) == [follower_job]
+    assert coalescer.get_followers(child_job) == []
+
+
+def test_attach_id_only_joins_known_jobs():
+    coalescer = JobCoalescer()
+    coalescer.register(make_job(1, "https://open.spotify.com/track/AAA"))
+    assert coalescer.attach_id(1, "R1")
+    assert not coalescer.attach_id(99, "R1")
+    assert coalescer.get_owner({"id": 1}) == "R1"
+
+
+def test_duplicate_requests_share_one_job(download_service_factory):
+    download_service = download_service_factory()
+    first_job = download_service.add_items_to_queue([{"url": "https://open.spotify.com/track/AAA", "type": "track"}], requester="R1")[0]
+    # Repeated within one batch and from another client, both join the first job
+    jobs = download_service.add_items_to_queue(
+        [{"url": "https://open.spotify.com/track/AAA?si=1", "type": "track"}, {"url": "https://open.spotify.com/intl-de/track/AAA", "type": "track"}],
+        requester="R2",
+    )
+    assert [job["id"] for job in jobs] == [first_job["id"], first_job["id"]]
+    assert download_service.download_queue.qsize() == 1
+    download_service.coalescer.release("R1")
+    assert download_service.coalescer.is_wanted(first_job)
@@ -0,0 +1,38 @@
+def track_job(track_id, status):
+    return {"url": f"https://open.spotify.com/track/{track_id}", "type": "track", "name": f"Song {track_id}", "artist": "A", "status": status, "priority": 2}
+
+
+def test_jobs_survive_a_restart_and_unfinished_ones_are_resumed(download_service_factory):
+    download_service = download_service_factory()
+    job_store = download_service.job_store
+    pending_info, running_info, finished_info, failed_info = job_store.add_jobs(
+        [track_job("A", "Pending..."), track_job("B", "Pending..."), track_job("C", "Pending..."), track_job("D", "Pending...")]
+    )
+    running_info["status"] = "Downloading..."
+    finished_info.update(status="Complete", file_path="/music/A - Song C.mp3")
+    failed_info.update(status="Failed", error="LookupError: No results found")
+    job_store.update_jobs([running_info, finished_info, failed_info])
+    version = job_store.get_version()
+
+    # A second service on the same database stands in for the restarted process
+    restarted_service = download_service_factory()
+    restarted_store = restarted_service.job_store
+    assert restarted_store.get_version() == version
+    history = restarted_store.get_history()
+    assert [(download_info["name"], download_info["status"]) for download_info in history] == [
+        ("Song A", "Pending..."),
+        ("Song B", "Downloading..."),
+        ("Song C", "Complete"),
+        ("Song D", "Failed"),
+    ]
+    assert history[2]["file_path"] == "/music/A - Song C.mp3"
+    assert history[3]["error"] == "LookupError: No results found"
+    assert all(download_info["priority"] == 2 for download_info in history)
+
+    restarted_service.resume_unfinished_jobs()
+    queued_jobs = [restarted_service.download_queue.get_nowait()[1] for _ in range(restarted_service.download_queue.qsize())]
+    assert [download_info["id"] for download_info in queued_jobs] == [pending_info["id"], running_info["id"]]
+    assert restarted_store.get_job(running_info["id"])["status"] == "Pending..."
+    assert restarted_store.get_version() > version
+    # New jobs continue the id sequence
+    assert restarted_store.add_job(track_job("E", "Pending..."))["id"] == failed_info["id"] + 1
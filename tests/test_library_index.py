@@ -0,0 +1,80 @@
+import os
+from types import SimpleNamespace
+from mutagen.id3 import ID3, TSRC
+from services import library_index
+from services.library_index import LibraryIndex, parse_spotify_url
+from conftest import write_tagged_mp3
+
+
+def make_index(tmp_path):
+    music_path = tmp_path / "music"
+    config = SimpleNamespace(
+        library_index_path=str(tmp_path / "library_index.db"),
+        track_output=str(music_path / "singles" / "{artist} - {title}.{output-ext}"),
+        album_output=str(music_path / "{artist}" / "{album}" / "{artist} - {title}.{output-ext}"),
+        playlist_output=str(music_path / "{list-name}" / "{artist} - {title}.{output-ext}"),
+        artist_output=str(music_path / "{artist}" / "{album}" / "{artist} - {title}.{output-ext}"),
+        supported_formats={".mp3", ".flac", ".m4a", ".opus"},
+    )
+    return LibraryIndex(config)
+
+
+def write_track(file_path, track_id, isrc=None):
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    write_tagged_mp3(file_path, track_id)
+    if isrc:
+        tags = ID3(file_path)
+        tags.add(TSRC(text=[isrc]))
+        tags.save(file_path)
+    return str(file_path)
+
+
+def test_scanned_tracks_are_found_by_track_id_and_isrc(tmp_path):
+    single_path = write_track(tmp_path / "music" / "singles" / "A - Song.mp3", "4uLU6hMCjMI75M1A2tKUQC", "usrc17607839")
+    album_path = write_track(tmp_path / "music" / "A" / "Album" / "A - Other.mp3", "7ouMYWpwJ422jRcDASZB7P")
+    (tmp_path / "music" / "A" / "Album" / "cover.jpg").write_bytes(b"x")
+    index = make_index(tmp_path)
+    assert index.roots == [str(tmp_path / "music")]
+    index.scan()
+    assert index.find_track("4uLU6hMCjMI75M1A2tKUQC") == single_path
+    assert index.find_track("7ouMYWpwJ422jRcDASZB7P") == album_path
+    # A track relinked to another id is still found by its recording code
+    assert index.find_track("0000000000000000000000", isrc="usrc17607839") == single_path
+    assert index.find_track("0000000000000000000000") is None
+    assert len(index.file_entries) == 2
+
+
+def test_index_is_kept_between_runs_and_only_changed_files_are_read(tmp_path, monkeypatch):
+    track_path = write_track(tmp_path / "music" / "singles" / "A - Song.mp3", "4uLU6hMCjMI75M1A2tKUQC")
+    make_index(tmp_path).scan()
+    tag_reads = []
+    read_track_tags = library_index.read_track_tags
+    monkeypatch.setattr(library_index, "read_track_tags", lambda file_path: tag_reads.append(file_path) or read_track_tags(file_path))
+
+    index = make_index(tmp_path)
+    assert index.find_track("4uLU6hMCjMI75M1A2tKUQC") == track_path
+    index.scan()
+    assert tag_reads == []
+    write_track(tmp_path / "music" / "singles" / "A - Song.mp3", "7ouMYWpwJ422jRcDASZB7P")
+    os.utime(track_path, (1, 1))
+    index.scan()
+    assert tag_reads == [track_path]
+    assert index.find_track("4uLU6hMCjMI75M1A2tKUQC") is None
+    assert index.find_track("7ouMYWpwJ422jRcDASZB7P") == track_path
+
+
+def test_downloads_are_added_without_a_scan_and_deleted_files_are_dropped(tmp_path):
+    index = make_index(tmp_path)
+    track_path = write_track(tmp_path / "music" / "singles" / "A - Song.mp3", "4uLU6hMCjMI75M1A2tKUQC")
+    index.add_files([track_path, str(tmp_path / "music" / "missing.mp3")])
+    assert index.find_track("4uLU6hMCjMI75M1A2tKUQC") == track_path
+    os.remove(track_path)
+    assert index.find_track("4uLU6hMCjMI75M1A2tKUQC") is None
+    assert index.file_entries == {}
+
+
+def test_spotify_urls_are_parsed():
+    assert parse_spotify_url("https://open.spotify.com/intl-de/track/4uLU6hMCjMI75M1A2tKUQC?si=x") == ("track", "4uLU6hMCjMI75M1A2tKUQC")
+    assert parse_spotify_url("https://open.spotify.com/album/7ouMYWpwJ422jRcDASZB7P") == ("album", "7ouMYWpwJ422jRcDASZB7P")
+    assert parse_spotify_url("https://example.com/track/x") == (None, None)
+    assert parse_spotify_url(None) == (None, None)
@@ -0,0 +1,58 @@
+import time
+from types import SimpleNamespace
+from services import media_refresh_scheduler
+from services.media_refresh_scheduler import MediaRefreshScheduler
+
+
+class FakePlaylistManager:
+    def __init__(self):
+        self.refreshes = 0
+
+    def media_server_refresh_check(self):
+        self.refreshes += 1
+
+    def plex_playlist_import_needed(self):
+        return False
+
+
+def wait_for(condition, timeout=2):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+def test_steady_downloads_refresh_after_the_max_wait(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(media_refresh_scheduler.time, "monotonic", lambda: clock[0])
+    playlist_manager = FakePlaylistManager()
+    scheduler = MediaRefreshScheduler(SimpleNamespace(media_refresh_quiet_window=10, media_refresh_max_wait=30), playlist_manager)
+    # A new file every 8 seconds never leaves the 10 second quiet window
+    for _ in range(4):
+        scheduler.mark_dirty("download")
+        time.sleep(0.05)
+        assert playlist_manager.refreshes == 0
+        clock[0] += 8
+    scheduler.mark_dirty("download")
+    assert wait_for(lambda: playlist_manager.refreshes == 1)
+    assert scheduler.pending_events == 0 and scheduler.first_dirty_event is None
+
+
+def test_single_download_refreshes_after_the_quiet_window(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(media_refresh_scheduler.time, "monotonic", lambda: clock[0])
+    playlist_manager = FakePlaylistManager()
+    scheduler = MediaRefreshScheduler(SimpleNamespace(media_refresh_quiet_window=10, media_refresh_max_wait=30), playlist_manager)
+    scheduler.mark_dirty("download")
+    clock[0] += 9
+    # Wakes the thread so it reads the moved clock
+    with scheduler.condition:
+        scheduler.condition.notify_all()
+    time.sleep(0.05)
+    assert playlist_manager.refreshes == 0
+    clock[0] += 1
+    with scheduler.condition:
+        scheduler.condition.notify_all()
+    assert wait_for(lambda: playlist_manager.refreshes == 1)
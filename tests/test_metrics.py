@@ -0,0 +1,55 @@
+from types import SimpleNamespace
+from services import metrics
+from services.metrics import MetricsRegistry
+
+
+def test_counter_renders_each_label_set():
+    registry = MetricsRegistry()
+    counter = registry.counter("spotspot_test_total", "Test events", ("result",))
+    counter.inc(result="hit")
+    counter.inc(result="hit")
+    counter.inc(2.5, result='say "hi"\n')
+    assert registry.render() == (
+        "# HELP spotspot_test_total Test events\n"
+        "# TYPE spotspot_test_total counter\n"
+        'spotspot_test_total{result="hit"} 2\n'
+        'spotspot_test_total{result="say \\"hi\\"\\n"} 2.5\n'
+    )
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("spotspot_test_seconds", "Test latency", ("type",), buckets=(1, 5))
+    for value in (0.5, 1, 3, 60):
+        histogram.observe(value, type="track")
+    assert registry.render().splitlines() == [
+        "# HELP spotspot_test_seconds Test latency",
+        "# TYPE spotspot_test_seconds histogram",
+        'spotspot_test_seconds_bucket{type="track",le="1.0"} 2',
+        'spotspot_test_seconds_bucket{type="track",le="5.0"} 3',
+        'spotspot_test_seconds_bucket{type="track",le="+Inf"} 4',
+        'spotspot_test_seconds_sum{type="track"} 64.5',
+        'spotspot_test_seconds_count{type="track"} 4',
+    ]
+
+
+def test_histogram_times_a_block_and_gauge_reads_its_callback():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("spotspot_block_seconds", "Block time")
+    with histogram.time():
+        pass
+    registry.gauge("spotspot_queue_jobs", "Queued jobs", ("group",), callback=lambda: {("track",): 3, ("album",): 0})
+    lines = registry.render().splitlines()
+    assert "spotspot_block_seconds_count 1" in lines
+    assert 'spotspot_block_seconds_bucket{le="0.005"} 1' in lines
+    assert lines[-3:] == ["# TYPE spotspot_queue_jobs gauge", 'spotspot_queue_jobs{group="track"} 3', 'spotspot_queue_jobs{group="album"} 0']
+
+
+def test_socket_emits_are_counted():
+    emitted = []
+    socketio = metrics.count_socket_emits(SimpleNamespace(emit=lambda event, data=None, **kwargs: emitted.append((event, data))))
+    before = metrics.socket_emits_total.values.get(("test_event",), 0)
+    socketio.emit("test_event", {"id": 1}, to="S1")
+    assert emitted == [("test_event", {"id": 1})]
+    assert metrics.socket_emits_total.values[("test_event",)] == before + 1
+    assert 'spotspot_socket_emits_total{event="test_event"}' in metrics.registry.render()
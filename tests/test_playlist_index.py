@@ -0,0 +1,84 @@
+import os
+import stat
+from types import SimpleNamespace
+from services.playlist_index import PlaylistIndex, process_umask, write_file_atomically
+
+
+def get_mode(file_path):
+    return stat.S_IMODE(os.stat(file_path).st_mode)
+
+
+def make_index(tmp_path, sort_order="date_asc"):
+    music_path = tmp_path / "music"
+    music_path.mkdir(exist_ok=True)
+    config = SimpleNamespace(
+        absolute_server_path=str(music_path),
+        m3u_playlist_sort_order=sort_order,
+        playlist_index_path=str(tmp_path / "index.json"),
+        supported_formats={".mp3"},
+    )
+    return PlaylistIndex(config), music_path
+
+
+def write_song(file_path, content, mtime):
+    file_path.write_bytes(content)
+    os.utime(file_path, (mtime, mtime))
+
+
+def test_new_file_gets_the_umask_mode(tmp_path):
+    file_path = tmp_path / "list.m3u"
+    write_file_atomically(str(file_path), "a\n")
+    assert file_path.read_text() == "a\n"
+    assert get_mode(file_path) == 0o666 & ~process_umask
+
+
+def test_rewrite_keeps_the_existing_mode(tmp_path):
+    file_path = tmp_path / "list.m3u"
+    file_path.write_text("old\n")
+    os.chmod(file_path, 0o644)
+    write_file_atomically(str(file_path), "new\n")
+    assert file_path.read_text() == "new\n"
+    assert get_mode(file_path) == 0o644
+
+
+def test_sync_adds_and_removes_files(tmp_path):
+    playlist_index, music_path = make_index(tmp_path)
+    write_song(music_path / "a.mp3", b"a", 1000)
+    write_song(music_path / "b.mp3", b"b", 2000)
+    (music_path / "cover.jpg").write_bytes(b"x")
+    assert playlist_index.sync()
+    assert playlist_index.get_playlist_lines() == [str(music_path / "a.mp3"), str(music_path / "b.mp3")]
+    playlist_index.mark_written()
+    os.remove(music_path / "a.mp3")
+    assert playlist_index.sync()
+    assert playlist_index.get_playlist_lines() == [str(music_path / "b.mp3")]
+
+
+def test_sync_only_stats_new_files(tmp_path):
+    playlist_index, music_path = make_index(tmp_path)
+    write_song(music_path / "a.mp3", b"a", 1000)
+    playlist_index.sync()
+    playlist_index.mark_written()
+    write_song(music_path / "b.mp3", b"b", 2000)
+    # Known files keep their indexed size and mtime, they are not looked at again
+    write_song(music_path / "a.mp3", b"changed", 1500)
+    assert playlist_index.sync()
+    assert playlist_index.get_playlist_lines() == [str(music_path / "a.mp3"), str(music_path / "b.mp3")]
+    assert playlist_index.files[str(music_path / "a.mp3")] == (1, 1000)
+    playlist_index.mark_written()
+    assert not playlist_index.sync()
+
+
+def test_rewritten_download_is_updated_through_add_file(tmp_path):
+    playlist_index, music_path = make_index(tmp_path)
+    write_song(music_path / "a.mp3", b"a", 1000)
+    write_song(music_path / "b.mp3", b"b", 2000)
+    playlist_index.sync()
+    playlist_index.mark_written()
+    # Retagging rewrites the file without touching the folder
+    dir_mtime = os.stat(music_path).st_mtime_ns
+    write_song(music_path / "a.mp3", b"retagged", 3000)
+    os.utime(music_path, ns=(dir_mtime, dir_mtime))
+    assert not playlist_index.sync()
+    assert playlist_index.add_file(str(music_path / "a.mp3"))
+    assert playlist_index.get_playlist_lines() == [str(music_path / "b.mp3"), str(music_path / "a.mp3")]
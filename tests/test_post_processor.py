@@ -0,0 +1,30 @@
+from types import SimpleNamespace
+import pytest
+from services.post_processor import PostProcessor
+
+
+def make_post_processor(target_format, **overrides):
+    config = SimpleNamespace(format=target_format, postprocess=True, normalize_loudness=False, ffmpeg_args=None, bitrate="auto")
+    config.__dict__.update(overrides)
+    return PostProcessor(config)
+
+
+@pytest.mark.parametrize("target_format, download_format", [("opus", "opus"), ("m4a", "m4a"), ("mp3", "opus"), ("flac", "opus")])
+def test_download_format_matches_the_native_container(target_format, download_format):
+    assert make_post_processor(target_format).get_download_format() == download_format
+
+
+def test_native_target_only_needs_processing_for_filters():
+    assert not make_post_processor("m4a").needs_processing()
+    assert make_post_processor("m4a", normalize_loudness=True).needs_processing()
+    assert make_post_processor("mp3").needs_processing()
+
+
+def test_download_format_without_postprocessing_is_the_target():
+    assert make_post_processor("mp3", postprocess=False).get_download_format() == "mp3"
+
+
+def test_spotdl_downloads_m4a_targets_without_converting(download_service_factory):
+    download_service = download_service_factory(format="m4a", postprocess=True, normalize_loudness=False, ffmpeg_args=None, bitrate="auto")
+    command = download_service._build_spotdl_command("https://open.spotify.com/track/AAA", {"type": "track"})
+    assert command[command.index("--format") + 1] == "m4a"
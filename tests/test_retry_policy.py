@@ -0,0 +1,77 @@
+import time
+import threading
+from types import SimpleNamespace
+import pytest
+from services.retry_policy import RetryPolicy, classify_failure
+
+
+def make_policy(submit=None, **overrides):
+    config = SimpleNamespace(retry_base_delay=1, retry_max_delay=60, rate_limit_cooldown=10)
+    config.__dict__.update(overrides)
+    return RetryPolicy(config, submit or (lambda url, download_info: None))
+
+
+@pytest.mark.parametrize(
+    "output_lines, failure_class",
+    [
+        (["ConnectionError: reset", "ERROR: HTTP Error 429: Too Many Requests"], "rate_limited"),
+        (["LookupError: No results found for song"], "permanent"),
+        (["urllib3 ReadTimeoutError: timed out"], "transient"),
+        (["something unexpected"], "transient"),
+    ],
+)
+def test_classify_failure(output_lines, failure_class):
+    assert classify_failure(1, output_lines)[0] == failure_class
+
+
+def test_delay_doubles_with_full_jitter_up_to_the_cap():
+    policy = make_policy()
+    for attempt, full_delay in ((0, 1), (3, 8), (10, 60)):
+        for _ in range(20):
+            assert full_delay / 2 <= policy.get_delay(attempt) <= full_delay
+
+
+def test_cooldown_grows_per_strike_and_resets_on_success():
+    policy = make_policy()
+    policy.start_cooldown()
+    assert 9 < policy.get_cooldown_delay() <= 11
+    policy.start_cooldown()
+    assert 19 < policy.get_cooldown_delay() <= 21
+    policy.record_success()
+    policy.cooldown_until = 0
+    assert policy.get_cooldown_delay() == 0
+    policy.start_cooldown()
+    assert 9 < policy.get_cooldown_delay() <= 11
+
+
+def test_delayed_jobs_are_released_in_due_order():
+    released = []
+    all_released = threading.Event()
+
+    def submit(url, download_info):
+        released.append(url)
+        if len(released) == 3:
+            all_released.set()
+
+    policy = make_policy(submit)
+    policy.start()
+    policy.schedule("late", {"id": 1}, 0.3)
+    policy.schedule("early", {"id": 2}, 0.1)
+    policy.schedule("middle", {"id": 3}, 0.2)
+    assert policy.get_delayed_count() == 3
+    assert all_released.wait(5)
+    assert released == ["early", "middle", "late"]
+    assert policy.get_delayed_count() == 0
+
+
+def test_job_due_sooner_wakes_the_waiting_timer():
+    released = threading.Event()
+    policy = make_policy(lambda url, download_info: released.set() if url == "soon" else None)
+    policy.start()
+    policy.schedule("later", {"id": 1}, 60)
+    time.sleep(0.05)
+    started = time.monotonic()
+    policy.schedule("soon", {"id": 2}, 0.05)
+    assert released.wait(5)
+    assert time.monotonic() - started < 1
+    assert policy.get_delayed_count() == 1
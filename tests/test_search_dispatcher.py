@@ -0,0 +1,120 @@
+import time
+import threading
+from types import SimpleNamespace
+from services.search_dispatcher import SearchDispatcher
+
+
+class FakeSpotifyService:
+    def __init__(self):
+        self.searches = []
+        self.gates = {}
+
+    def get_search_key(self, search_req):
+        return (search_req["query"], search_req.get("type", "track"), self.get_search_offset(search_req))
+
+    def get_search_offset(self, search_req):
+        return int(search_req.get("offset") or 0)
+
+    def is_search_cached(self, search_req):
+        return False
+
+    def release(self, query, offset=0):
+        self.gates.setdefault((query, offset), threading.Event()).set()
+
+    def perform_spotify_search(self, search_req):
+        self.searches.append(self.get_search_key(search_req))
+        offset = self.get_search_offset(search_req)
+        # Each page waits until the test lets Spotify answer it
+        self.gates.setdefault((search_req["query"], offset), threading.Event()).wait(5)
+        return {"results": {"tracks": [f"{search_req['query']} {offset}"]}, "offset": offset, "next_offset": offset + 20}
+
+
+class RecordingSocketIO:
+    def __init__(self):
+        self.emits = []
+
+    def emit(self, event, data=None, to=None):
+        self.emits.append((event, data, to))
+
+    def start_background_task(self, target, *args):
+        threading.Thread(target=target, args=args, daemon=True).start()
+
+    def get_results(self):
+        return [(to, data["request_id"], data["results"]) for event, data, to in self.emits if event == "search_results"]
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+def make_dispatcher(search_prefetch=False):
+    config = SimpleNamespace(search_workers=2, search_timeout=5, search_prefetch=search_prefetch)
+    spotify_service = FakeSpotifyService()
+    socketio = RecordingSocketIO()
+    return SearchDispatcher(config, socketio, spotify_service), spotify_service, socketio
+
+
+def test_newer_search_supersedes_the_earlier_one():
+    dispatcher, spotify_service, socketio = make_dispatcher()
+    dispatcher.submit("S1", {"query": "daft", "request_id": 1})
+    assert wait_for(lambda: spotify_service.searches == [("daft", "track", 0)])
+    dispatcher.submit("S1", {"query": "daft punk", "request_id": 2})
+    spotify_service.release("daft punk")
+    assert wait_for(lambda: socketio.get_results() == [("S1", 2, {"tracks": ["daft punk 0"]})])
+    # The answer to the first query arrives late and is dropped
+    spotify_service.release("daft")
+    time.sleep(0.1)
+    assert socketio.get_results() == [("S1", 2, {"tracks": ["daft punk 0"]})]
+    assert dispatcher.in_flight == {} and dispatcher.client_requests == {}
+
+
+def test_superseded_search_that_has_not_started_is_cancelled():
+    dispatcher, spotify_service, socketio = make_dispatcher()
+    # Both workers are busy, the next search waits in the queue
+    dispatcher.submit("S2", {"query": "busy one", "request_id": 1})
+    dispatcher.submit("S3", {"query": "busy two", "request_id": 1})
+    dispatcher.submit("S1", {"query": "daft", "request_id": 1})
+    dispatcher.submit("S1", {"query": "daft punk", "request_id": 2})
+    for query in ("busy one", "busy two", "daft punk"):
+        spotify_service.release(query)
+    assert wait_for(lambda: len(socketio.get_results()) == 3)
+    assert ("daft", "track", 0) not in spotify_service.searches
+    assert ("S1", 2, {"tracks": ["daft punk 0"]}) in socketio.get_results()
+
+
+def test_clients_searching_the_same_query_share_one_call():
+    dispatcher, spotify_service, socketio = make_dispatcher()
+    dispatcher.submit("S1", {"query": "daft punk", "request_id": 1})
+    dispatcher.submit("S2", {"query": "daft punk", "request_id": 7})
+    spotify_service.release("daft punk")
+    assert wait_for(lambda: len(socketio.get_results()) == 2)
+    assert spotify_service.searches == [("daft punk", "track", 0)]
+    assert sorted(socketio.get_results()) == [("S1", 1, {"tracks": ["daft punk 0"]}), ("S2", 7, {"tracks": ["daft punk 0"]})]
+
+
+def test_cancelled_search_emits_nothing():
+    dispatcher, spotify_service, socketio = make_dispatcher()
+    dispatcher.submit("S1", {"query": "daft punk", "request_id": 1})
+    dispatcher.cancel("S1")
+    spotify_service.release("daft punk")
+    time.sleep(0.1)
+    assert socketio.get_results() == []
+
+
+def test_next_page_is_prefetched_once_and_joined_by_load_more():
+    dispatcher, spotify_service, socketio = make_dispatcher(search_prefetch=True)
+    spotify_service.release("daft punk")
+    dispatcher.submit("S1", {"query": "daft punk", "request_id": 1})
+    assert wait_for(lambda: ("daft punk", "track", 20) in spotify_service.searches)
+    # "Load more" joins the prefetch still running instead of asking Spotify again
+    dispatcher.submit("S1", {"query": "daft punk", "offset": 20, "request_id": 2})
+    spotify_service.release("daft punk", 20)
+    assert wait_for(lambda: len(socketio.get_results()) == 2)
+    assert socketio.get_results()[1] == ("S1", 2, {"tracks": ["daft punk 20"]})
+    assert spotify_service.searches.count(("daft punk", "track", 20)) == 1
+    spotify_service.release("daft punk", 40)
@@ -0,0 +1,102 @@
+import queue
+import threading
+import subprocess
+from services.spotdl_worker import SpotdlWorker, SpotdlWorkerPool
+
+
+class FakeProcess:
+    def __init__(self, alive=True):
+        self.alive = alive
+        self.killed = False
+
+    def is_alive(self):
+        return self.alive
+
+    def kill(self):
+        self.killed = True
+        self.alive = False
+
+
+def make_worker(pid, process=None):
+    worker = SpotdlWorker.__new__(SpotdlWorker)
+    worker.pid = pid
+    worker.process = process or FakeProcess()
+    worker.lock = threading.Lock()
+    worker.job_id = None
+    worker.poisoned = False
+    return worker
+
+
+def make_pool():
+    pool = SpotdlWorkerPool.__new__(SpotdlWorkerPool)
+    pool.idle_workers = queue.Queue()
+    pool.started = []
+
+    def start_worker():
+        replacement = make_worker(-1)
+        pool.started.append(replacement)
+        return replacement
+
+    pool._start_worker = start_worker
+    return pool
+
+
+def start_process_group():
+    return subprocess.Popen(["sleep", "30"], start_new_session=True)
+
+
+def test_signal_reaches_the_job_holding_the_worker():
+    proc = start_process_group()
+    worker = make_worker(proc.pid)
+    worker.job_id = 7
+    assert worker.signal_job(7)
+    assert proc.wait(timeout=5) != 0
+    assert worker.poisoned
+
+
+def test_signal_for_a_finished_job_leaves_the_next_job_alone():
+    proc = start_process_group()
+    try:
+        worker = make_worker(proc.pid)
+        worker.job_id = 7
+        assert not worker.finish_job()
+        # The pool handed the worker to the next job before the cancel thread ran
+        worker.job_id = 8
+        assert not worker.signal_job(7)
+        assert not worker.signal_job(7, force=True)
+        assert proc.poll() is None
+        assert not worker.poisoned
+    finally:
+        proc.kill()
+        proc.wait()
+
+
+def test_release_replaces_a_signalled_worker():
+    pool = make_pool()
+    process = FakeProcess()
+    worker = make_worker(123, process)
+    worker.job_id = 7
+    worker.poisoned = True
+    pool.release(worker)
+    assert process.killed
+    assert pool.idle_workers.get_nowait() is pool.started[0]
+
+
+def test_release_keeps_a_healthy_worker():
+    pool = make_pool()
+    worker = make_worker(123)
+    worker.job_id = 7
+    pool.release(worker)
+    assert worker.job_id is None
+    assert pool.idle_workers.get_nowait() is worker
+    assert not pool.started
+
+
+def test_pipe_read_waits_on_the_hub_under_gevent(monkeypatch):
+    waited = []
+    worker = make_worker(123)
+    worker.connection = type("Connection", (), {"fileno": lambda self: 42})()
+    monkeypatch.setattr("services.spotdl_worker.monkey.is_module_patched", lambda name: True)
+    monkeypatch.setattr("services.spotdl_worker.wait_read", waited.append)
+    worker._wait_readable()
+    assert waited == [42]
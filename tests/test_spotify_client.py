@@ -0,0 +1,49 @@
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from types import SimpleNamespace
+from services.spotfiy_service import SpotifyService
+
+
+def make_client():
+    spotify_service = SpotifyService.__new__(SpotifyService)
+    spotify_service.config = SimpleNamespace(client_id="id", client_secret="secret", spotify_pool_size=8)
+    spotify_service.sp = None
+    spotify_service.client_lock = threading.Lock()
+    return spotify_service.get_client()
+
+
+def test_client_session_retries_rate_limits():
+    client = make_client()
+    retry = client._session.get_adapter("https://api.spotify.com/v1/search").max_retries
+    assert retry.total == 3
+    assert 429 in retry.status_forcelist and 503 in retry.status_forcelist
+    assert retry.respect_retry_after_header
+    # The token request is a POST, it is retried as well
+    assert retry.is_retry("POST", 429)
+    assert client.auth_manager._session is client._session
+
+
+def test_rate_limited_request_is_retried_after_the_wait():
+    responses = [429, 200]
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(responses.pop(0))
+            self.send_header("Retry-After", "0")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        client = make_client()
+        # The pooled adapter is mounted for https, the test server speaks plain http
+        client._session.mount("http://", client._session.get_adapter("https://api.spotify.com"))
+        response = client._session.get(f"http://127.0.0.1:{server.server_port}/v1/search")
+        assert response.status_code == 200
+        assert responses == []
+    finally:
+        server.shutdown()
@@ -0,0 +1,26 @@
+from types import SimpleNamespace
+import pytest
+from services.job_store import JobStore
+from services.status_broadcaster import StatusBroadcaster
+from conftest import make_config
+
+
+@pytest.fixture
+def status_broadcaster(tmp_path):
+    config = make_config(tmp_path, status_page_size=50, status_emit_interval=0.1)
+    job_store = JobStore(config)
+    job_store.add_jobs([{"url": f"https://open.spotify.com/track/{number}", "type": "track", "status": "Pending..."} for number in range(3)])
+    return StatusBroadcaster(config, SimpleNamespace(emit=lambda *args, **kwargs: None), job_store)
+
+
+@pytest.mark.parametrize("status_req", [{"since_version": "abc"}, {"since_version": [1]}, {"before_id": "x"}, {"since_version": {}}])
+def test_malformed_cursor_gets_a_snapshot(status_broadcaster, status_req):
+    status = status_broadcaster.get_status(status_req)
+    assert status["mode"] == "snapshot"
+    assert len(status["jobs"]) == 3
+
+
+def test_since_version_returns_changes(status_broadcaster):
+    status = status_broadcaster.get_status({"since_version": "0"})
+    assert status["mode"] == "changes"
+    assert len(status["jobs"]) == 3
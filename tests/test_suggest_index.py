@@ -0,0 +1,44 @@
+from types import SimpleNamespace
+from services import suggest_index
+from services.suggest_index import SuggestIndex
+
+
+def make_index(tmp_path, size=100):
+    return SuggestIndex(SimpleNamespace(suggest_index_path=str(tmp_path / "suggest.db"), suggest_index_size=size))
+
+
+def make_track(track_id, name):
+    return {"type": "track", "name": name, "artist": "Artist", "album": "Album", "url": f"https://open.spotify.com/track/{track_id}", "image": None}
+
+
+def get_ranked_keys(index, item_type):
+    return [key for _, key in reversed(index.ranked_keys[item_type])]
+
+
+def test_ranked_keys_follow_hits_and_downloads(tmp_path):
+    index = make_index(tmp_path)
+    index.add_results({"tracks": [make_track("A", "Song A"), make_track("B", "Song B"), make_track("C", "Song C")]})
+    index.add_results({"tracks": [make_track("B", "Song B")]})
+    assert get_ranked_keys(index, "track")[0] == "track:B"
+    index.add_download({"type": "track", "url": "https://open.spotify.com/track/C", "name": "Song C"})
+    assert get_ranked_keys(index, "track") == ["track:C", "track:B", "track:A"]
+    expected_keys = sorted(index.entries, key=lambda key: index._get_rank(index.entries[key]), reverse=True)
+    assert get_ranked_keys(index, "track") == expected_keys
+
+
+def test_evicted_items_leave_the_ranking(tmp_path):
+    index = make_index(tmp_path, size=10)
+    index.add_results({"tracks": [make_track(str(number), f"Song {number}") for number in range(11)]})
+    assert len(index.entries) == 9
+    assert sorted(get_ranked_keys(index, "track")) == sorted(index.entries)
+
+
+def test_broad_prefix_scans_a_capped_number_of_ranked_items(tmp_path, monkeypatch):
+    monkeypatch.setattr(suggest_index, "max_candidates", 2)
+    monkeypatch.setattr(suggest_index, "max_ranked_scan", 3)
+    index = make_index(tmp_path)
+    index.add_results({"tracks": [make_track(str(number), f"Song {number}") for number in range(5)]})
+    index.add_results({"tracks": [make_track("4", "Song 4")]})
+    assert [item["url"] for item in index.suggest("so", "track")["tracks"]][0] == "https://open.spotify.com/track/4"
+    # Only the three best ranked tracks are looked at, none of them is called "song 0"
+    assert index.suggest("so 0", "track") == {}
@@ -0,0 +1,54 @@
+from services.watch_scheduler import WatchScheduler
+from conftest import start_downloads
+from test_download_worker import wait_for_status
+
+
+class FakePlaylistSpotify:
+    def __init__(self, spotify_service):
+        self.spotify_service = spotify_service
+        self.snapshot_id = "s1"
+
+    def get_playlist_snapshot(self, playlist_id):
+        return {"snapshot_id": self.snapshot_id, "name": "My List", "owner": {"display_name": "me"}}
+
+    def get_collection_tracks(self, collection_type, collection_id):
+        return self.spotify_service.get_collection_tracks(collection_type, collection_id)
+
+
+def make_track(track_id):
+    return {"id": track_id, "name": track_id, "artist": "A", "url": f"https://open.spotify.com/track/{track_id}", "isrc": None}
+
+
+def test_unchanged_playlist_retries_tracks_that_failed(download_service_factory, tmp_path):
+    download_service = download_service_factory(playlist_output=str(tmp_path / "music"), watch_sync_interval=3600, watch_check_interval=60)
+    failing_ids = {"BBB"}
+    attempts = []
+
+    def flaky_spotdl(url, download_info):
+        track_id = url.rsplit("/", 1)[1]
+        attempts.append(track_id)
+        if track_id in failing_ids:
+            return ["sh", "-c", "exit 1"]
+        return ["sh", "-c", f"echo 'Downloaded \"A - {track_id}\": x'; touch 'A - {track_id}.mp3'"]
+
+    download_service._build_spotdl_command = flaky_spotdl
+    download_service.spotify_service.collection_tracks = [make_track("AAA"), make_track("BBB")]
+    start_downloads(download_service)
+    watch_scheduler = WatchScheduler(download_service.config, FakePlaylistSpotify(download_service.spotify_service), download_service)
+    watch_scheduler.add_watch({"url": "https://open.spotify.com/playlist/PL", "name": "My List"})
+
+    watch_scheduler.sync_due_watches()
+    first_update = download_service.job_store.find_jobs_by_url("https://open.spotify.com/playlist/PL")[-1]
+    assert wait_for_status(download_service, first_update["id"], ("Failed",))["status"] == "Failed"
+    assert sorted(attempts) == ["AAA", "BBB"]
+
+    # Same snapshot, AAA is in the library now and only BBB is fetched again
+    download_service.library_index.files["AAA"] = str(tmp_path / "music" / "A - AAA.mp3")
+    failing_ids.clear()
+    attempts.clear()
+    watch_scheduler._save("playlist:PL", next_sync_at=0)
+    watch_scheduler.sync_due_watches()
+    second_update = download_service.job_store.find_jobs_by_url("https://open.spotify.com/playlist/PL")[-1]
+    assert second_update["id"] != first_update["id"]
+    assert wait_for_status(download_service, second_update["id"], ("Complete",))["status"] == "Complete"
+    assert attempts == ["BBB"]